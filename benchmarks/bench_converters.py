@@ -0,0 +1,115 @@
+"""Compare testing path segments with the regex of the built-in
+converters and with their ``part_matcher``, on its own and as used by
+the ``StateMachineMatcher``. The matcher also takes the values of rules
+whose converters are whole segments from the path instead of running
+the rule's regex, that is disabled along with the ``part_matcher``.
+
+Run from the repository root with Werkzeug installed::
+
+    python benchmarks/bench_converters.py
+"""
+import random
+import re
+import timeit
+from contextlib import ExitStack
+from functools import partial
+from unittest import mock
+
+from werkzeug.routing import AnyConverter
+from werkzeug.routing import BaseConverter
+from werkzeug.routing import IntegerConverter
+from werkzeug.routing import Map
+from werkzeug.routing import Rule
+from werkzeug.routing import StateMachineMatcher
+from werkzeug.routing import UnicodeConverter
+
+CONVERTERS = [
+    ("string", UnicodeConverter, (), ["some-page", ""]),
+    ("string(length=2)", UnicodeConverter, (2,), ["en", "eng"]),
+    ("any", AnyConverter, ("about", "help", "imprint"), ["imprint", "contact"]),
+    ("int", IntegerConverter, (), ["12345", "12a45"]),
+]
+
+
+def bench_part(number):
+    print(f"{'converter':<20} {'value':<40} {'regex (ns)':>10} {'part (ns)':>10}")
+
+    for name, converter_class, args, values in CONVERTERS:
+        converter = converter_class(Map(), *args)
+        regex = re.compile(converter.regex).fullmatch
+        part = converter.part_matcher()
+
+        for value in values:
+            times = [
+                min(timeit.repeat(partial(test, value), number=number, repeat=3))
+                for test in (regex, part)
+            ]
+            print(
+                f"{name:<20} {value or repr(value):<40}"
+                + "".join(f" {t / number * 1e9:>10.0f}" for t in times)
+            )
+
+
+def make_rules(size):
+    """Rules where each converter is a whole segment."""
+    return [
+        Rule(f"/<any(en, de, fr):lang>/items{i}/<int:id>/<slug>", endpoint=f"item{i}")
+        for i in range(size)
+    ]
+
+
+def match_all(matcher, paths):
+    for path in paths:
+        next(matcher.match("", path, "GET"))
+
+
+def make_matcher(size):
+    url_map = Map(make_rules(size), matcher_class=StateMachineMatcher)
+    # the matcher is created and asks for the part matchers here
+    url_map.update()
+    return url_map._snapshot.matcher
+
+
+def bench_matcher(size, number):
+    rng = random.Random(0)
+    paths = [f"/de/items{rng.randrange(size)}/123/some-item" for _ in range(200)]
+
+    with ExitStack() as stack:
+        for converter_class in (BaseConverter, *(c[1] for c in CONVERTERS)):
+            if "part_matcher" in vars(converter_class):
+                stack.enter_context(
+                    mock.patch.object(
+                        converter_class, "part_matcher", lambda self: None
+                    )
+                )
+
+        stack.enter_context(
+            mock.patch.object(StateMachineMatcher, "_add_direct", lambda *args: None)
+        )
+        regex_matcher = make_matcher(size)
+
+    times = []
+
+    for matcher in (regex_matcher, make_matcher(size)):
+        run = partial(match_all, matcher, paths)
+        run()
+        times.append(min(timeit.repeat(run, number=number, repeat=5)))
+
+    count = number * len(paths)
+    print(
+        f"StateMachineMatcher, {size} rules:"
+        f" regex {times[0] / count * 1e6:.2f} us,"
+        f" segments {times[1] / count * 1e6:.2f} us per match"
+    )
+
+
+def main():
+    bench_part(100000)
+    print()
+
+    for size in (100, 1000, 10000):
+        bench_matcher(size, 50)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""Benchmark parsing generated form bodies with each parser
+configuration.
+
+Reports the throughput, the peak RSS while parsing, and the peak memory
+traced by :mod:`tracemalloc` for each MB of the body. Each measurement
+runs in a new process, so that the peak RSS of one doesn't hide the
+next. The bodies are generated from a fixed seed, so runs can be
+compared after changing the parser.
+
+Run from the repository root with Werkzeug installed::
+
+    python benchmarks/bench_formparser.py
+    python benchmarks/bench_formparser.py --body files --size 100
+    python benchmarks/bench_formparser.py --config lines --config readinto
+"""
+import argparse
+import base64
+import gc
+import io
+import multiprocessing
+import random
+import sys
+import timeit
+import tracemalloc
+
+from werkzeug.formparser import MultiPartParser
+from werkzeug.formparser import parse_form_data
+from werkzeug.urls import url_decode_stream
+from werkzeug.urls import url_encode
+
+try:
+    import resource
+except ImportError:
+    resource = None  # type: ignore
+
+BOUNDARY = b"----WerkzeugBenchmarkBoundary"
+
+
+def random_bytes(size, rng):
+    return rng.getrandbits(size * 8).to_bytes(size, "little")
+
+
+def encode_multipart(parts):
+    """Encode a list of ``(headers, data)`` parts. The headers are a
+    list of lines without line breaks.
+    """
+    out = []
+
+    for headers, data in parts:
+        out.append(b"--" + BOUNDARY + b"\r\n")
+        out.extend(line + b"\r\n" for line in headers)
+        out.append(b"\r\n")
+        out.append(data)
+        out.append(b"\r\n")
+
+    out.append(b"--" + BOUNDARY + b"--\r\n")
+    return "multipart/form-data", b"".join(out)
+
+
+def file_headers(name, *extra):
+    disposition = f'form-data; name="{name}"; filename="{name}.bin"'
+    return [
+        f"Content-Disposition: {disposition}".encode(),
+        b"Content-Type: application/octet-stream",
+        *extra,
+    ]
+
+
+def fields_body(size, rng):
+    """Many small form fields."""
+    parts = []
+
+    for i in range(size // 80):
+        value = "".join(rng.choices("abcdefghijklmnopqrstuvwxyz ", k=20))
+        headers = [f'Content-Disposition: form-data; name="field{i}"'.encode()]
+        parts.append((headers, value.encode()))
+
+    return encode_multipart(parts)
+
+
+def files_body(size, rng):
+    """Two large files of random binary data."""
+    return encode_multipart(
+        [(file_headers(f"file{i}"), random_bytes(size // 2, rng)) for i in range(2)]
+    )
+
+
+#: maps a quarter of the byte values to CR and LF
+_crlf_table = bytes(13 if i < 32 else 10 if i < 64 else i for i in range(256))
+
+
+def crlf_body(size, rng):
+    """A file of binary data with many CR and LF bytes."""
+    data = random_bytes(size, rng).translate(_crlf_table)
+    return encode_multipart([(file_headers("file"), data)])
+
+
+def no_crlf_body(size, rng):
+    """A file of binary data without any CR and LF bytes."""
+    data = random_bytes(size + size // 64, rng).translate(None, b"\r\n")
+    return encode_multipart([(file_headers("file"), data[:size])])
+
+
+def base64_body(size, rng):
+    """A file with a ``base64`` transfer encoding in lines of 76
+    characters.
+    """
+    data = base64.encodebytes(random_bytes(size * 3 // 4, rng))
+    headers = file_headers("file", b"Content-Transfer-Encoding: base64")
+    return encode_multipart([(headers, data.replace(b"\n", b"\r\n"))])
+
+
+def boundary_body(size, rng):
+    """A file full of lines that start like the boundary."""
+    chunk = b"\r\n--" + BOUNDARY[:-1] + b"x" + random_bytes(16, rng)
+    data = chunk * (size // len(chunk))
+    return encode_multipart([(file_headers("file"), data)])
+
+
+def urlencoded_body(size, rng):
+    """Many small URL encoded fields."""
+    values = [
+        (f"field{i}", "".join(rng.choices("abcdefghijklmnopqrstuvwxyz &=", k=20)))
+        for i in range(size // 40)
+    ]
+    return "application/x-www-form-urlencoded", url_encode(values).encode("ascii")
+
+
+BODIES = {
+    "fields": fields_body,
+    "files": files_body,
+    "crlf": crlf_body,
+    "no-crlf": no_crlf_body,
+    "base64": base64_body,
+    "boundary": boundary_body,
+    "urlencoded": urlencoded_body,
+}
+
+
+def close_files(files):
+    for file in files.values():
+        file.close()
+
+
+def parse_environ(mimetype, data):
+    content_type = mimetype
+
+    if mimetype.startswith("multipart/"):
+        content_type += f"; boundary={BOUNDARY.decode()}"
+
+    environ = {
+        "REQUEST_METHOD": "POST",
+        "CONTENT_TYPE": content_type,
+        "CONTENT_LENGTH": str(len(data)),
+        "wsgi.input": io.BytesIO(data),
+    }
+    _, _, files = parse_form_data(environ)
+    close_files(files)
+
+
+def multipart_parser(**kwargs):
+    def parse(mimetype, data):
+        parser = MultiPartParser(**kwargs)
+        _, files = parser.parse(io.BytesIO(data), BOUNDARY, len(data))
+        close_files(files)
+
+    return parse
+
+
+def parse_url_decode_stream(mimetype, data):
+    url_decode_stream(io.BytesIO(data), limit=len(data))
+
+
+#: The configurations to parse with, and the mimetypes they parse.
+CONFIGS = {
+    "parse_form_data": (
+        {"multipart/form-data", "application/x-www-form-urlencoded"},
+        parse_environ,
+    ),
+    "lines": ({"multipart/form-data"}, multipart_parser()),
+    "scan_boundary": ({"multipart/form-data"}, multipart_parser(scan_boundary=True)),
+    "readinto": ({"multipart/form-data"}, multipart_parser(readinto=True)),
+    "url_decode_stream": (
+        {"application/x-www-form-urlencoded"},
+        parse_url_decode_stream,
+    ),
+}
+
+
+def reset_peak_rss():
+    """Reset the peak RSS of the process if the platform allows it,
+    otherwise the peak while generating the body may hide the peak
+    while parsing it.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss():
+    """The peak RSS of the process in bytes, or ``None`` if it is not
+    available.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    if resource is None:
+        return None
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def measure(body, config, size, seed, repeat):
+    """Run in a new process to generate a body and measure parsing it."""
+    mimetype, data = BODIES[body](size, random.Random(seed))
+    parse = CONFIGS[config][1]
+    result = {"size": len(data)}
+
+    gc.collect()
+    reset_peak_rss()
+    base = peak_rss()
+    parse(mimetype, data)
+    peak = peak_rss()
+
+    if base is not None:
+        result["rss"] = peak - base
+
+    seconds = min(timeit.repeat(lambda: parse(mimetype, data), number=1, repeat=repeat))
+    result["rate"] = len(data) / seconds / 2 ** 20
+
+    tracemalloc.start()
+    parse(mimetype, data)
+    result["traced"] = tracemalloc.get_traced_memory()[1] / len(data) * 2 ** 20
+    tracemalloc.stop()
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--body",
+        action="append",
+        choices=list(BODIES),
+        help="Kind of body to generate. Can be given more than once. Default"
+        " is all kinds.",
+    )
+    parser.add_argument(
+        "--config",
+        action="append",
+        choices=list(CONFIGS),
+        help="Parser configuration. Can be given more than once. Default is"
+        " all configurations.",
+    )
+    parser.add_argument("--size", type=int, default=4, help="Size of the bodies in MB.")
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Number of timed runs, the best is reported.",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+    args = parser.parse_args(argv)
+    size = args.size * 2 ** 20
+    # a new process for each measurement, which doesn't inherit the
+    # memory of this one
+    context = multiprocessing.get_context("spawn")
+    print(
+        f"{'body':<12} {'config':<18} {'MB/s':>8} {'peak RSS MiB':>12}"
+        f" {'traced KiB/MB':>13}"
+    )
+
+    for body in args.body or BODIES:
+        mimetype = BODIES[body](0, random.Random(args.seed))[0]
+
+        for config in args.config or CONFIGS:
+            if mimetype not in CONFIGS[config][0]:
+                continue
+
+            with context.Pool(1) as pool:
+                result = pool.apply(
+                    measure, (body, config, size, args.seed, args.repeat)
+                )
+
+            rss = result.get("rss")
+            print(
+                f"{body:<12} {config:<18} {result['rate']:>8.1f}"
+                + (f" {rss / 2 ** 20:>12.1f}" if rss is not None else f" {'-':>12}")
+                + f" {result['traced'] / 1024:>13.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+"""Benchmark routing on generated maps of different sizes and shapes.
+
+Measures creating a map, adding a rule to it, matching paths that hit,
+miss, or redirect, and building URLs, and the memory used by the map.
+The maps and paths are generated from a fixed seed, so runs can be
+compared after changing the routing code.
+
+Run from the repository root with Werkzeug installed::
+
+    python benchmarks/bench_routing.py
+    python benchmarks/bench_routing.py --shape static --size 100000
+    python benchmarks/bench_routing.py --matcher all
+"""
+import argparse
+import gc
+import random
+import sys
+import timeit
+import tracemalloc
+from collections import namedtuple
+
+from werkzeug.routing import CombinedRegexMatcher
+from werkzeug.routing import EndpointPrefix
+from werkzeug.routing import Map
+from werkzeug.routing import NotFound
+from werkzeug.routing import RequestRedirect
+from werkzeug.routing import Rule
+from werkzeug.routing import StateMachineMatcher
+from werkzeug.routing import Submount
+from werkzeug.routing import Subdomain
+from werkzeug.routing import TableMatcher
+
+MATCHERS = [TableMatcher, StateMachineMatcher, CombinedRegexMatcher]
+SIZES = [10, 1000, 10000]
+
+
+class Case(
+    namedtuple(
+        "Case", ("path", "endpoint", "values", "server_name", "subdomain", "scheme")
+    )
+):
+    """A request for a rule of a generated map, and the values to build
+    the URL again.
+    """
+
+    __slots__ = ()
+
+    # namedtuple only takes defaults on Python >= 3.7
+    def __new__(
+        cls,
+        path,
+        endpoint,
+        values,
+        server_name="example.org",
+        subdomain=None,
+        scheme="http",
+    ):
+        return super().__new__(
+            cls, path, endpoint, values, server_name, subdomain, scheme
+        )
+
+
+def make_rules(size):
+    """Generate a mix of static rules, rules with converters and
+    branch rules, roughly a third of each.
+    """
+    rules = []
+
+    for i in range(size):
+        kind = i % 3
+
+        if kind == 0:
+            rules.append(Rule(f"/static/page{i}", endpoint=f"static{i}"))
+        elif kind == 1:
+            rules.append(Rule(f"/items{i}/<int:id>", endpoint=f"item{i}"))
+        else:
+            rules.append(Rule(f"/users{i}/<name>/posts/", endpoint=f"posts{i}"))
+
+    return rules
+
+
+def make_cases(size, rng):
+    cases = []
+
+    for i in range(size):
+        kind = i % 3
+
+        if kind == 0:
+            cases.append(Case(f"/static/page{i}", f"static{i}", {}))
+        elif kind == 1:
+            value = rng.randrange(10000)
+            cases.append(Case(f"/items{i}/{value}", f"item{i}", {"id": value}))
+        else:
+            cases.append(
+                Case(f"/users{i}/someone/posts/", f"posts{i}", {"name": "someone"})
+            )
+
+    return cases
+
+
+def static_shape(size, rng):
+    """Only static rules in nested sections."""
+    rules = []
+    cases = []
+
+    for i in range(size):
+        path = f"/section{i % 50}/page{i}/"
+        rules.append(Rule(path, endpoint=f"page{i}"))
+        cases.append(Case(path, f"page{i}", {}))
+
+    return {}, rules, cases
+
+
+def converter_shape(size, rng):
+    """Rules with several converters of different types each."""
+    rules = []
+    cases = []
+
+    for i in range(size):
+        kind = i % 4
+
+        if kind == 0:
+            rules.append(Rule(f"/items{i}/<int:id>/<slug>/", endpoint=f"item{i}"))
+            values = {"id": rng.randrange(10000), "slug": "some-item"}
+            path = f"/items{i}/{values['id']}/some-item/"
+        elif kind == 1:
+            rules.append(Rule(f"/files{i}/<path:name>", endpoint=f"file{i}"))
+            values = {"name": "docs/index.html"}
+            path = f"/files{i}/docs/index.html"
+        elif kind == 2:
+            rules.append(Rule(f"/prices{i}/<float:price>", endpoint=f"price{i}"))
+            values = {"price": 1.5}
+            path = f"/prices{i}/1.5"
+        else:
+            rules.append(Rule(f"/objects{i}/<uuid:id>", endpoint=f"object{i}"))
+            id = "12345678-1234-5678-1234-567812345678"
+            values = {"id": id}
+            path = f"/objects{i}/{id}"
+
+        cases.append(Case(path, rules[-1].endpoint, values))
+
+    return {}, rules, cases
+
+
+def factory_shape(size, rng):
+    """Rules grouped by ``Subdomain``, ``Submount``, and
+    ``EndpointPrefix`` factories, two rules per group.
+    """
+    rules = []
+    cases = []
+
+    for i in range(size // 2):
+        subdomain = f"s{i % 10}"
+        rules.append(
+            Subdomain(
+                subdomain,
+                [
+                    Submount(
+                        f"/app{i}",
+                        [
+                            EndpointPrefix(
+                                f"app{i}.",
+                                [
+                                    Rule("/", endpoint="index"),
+                                    Rule("/<int:id>", endpoint="show"),
+                                ],
+                            )
+                        ],
+                    )
+                ],
+            )
+        )
+        cases.append(Case(f"/app{i}/", f"app{i}.index", {}, subdomain=subdomain))
+        cases.append(
+            Case(f"/app{i}/{i}", f"app{i}.show", {"id": i}, subdomain=subdomain)
+        )
+
+    return {}, rules, cases
+
+
+def host_shape(size, rng):
+    """Rules matched by host, with a static and a dynamic rule for
+    each host.
+    """
+    rules = []
+    cases = []
+
+    for i in range(size // 2):
+        host = f"h{i}.example.org"
+        rules.append(Rule("/about/", endpoint=f"about{i}", host=host))
+        rules.append(Rule("/<int:id>", endpoint=f"show{i}", host=host))
+        cases.append(Case("/about/", f"about{i}", {}, host))
+        cases.append(Case(f"/{i}", f"show{i}", {"id": i}, host))
+
+    return {"host_matching": True}, rules, cases
+
+
+def websocket_shape(size, rng):
+    """Pairs of HTTP and WebSocket rules."""
+    rules = []
+    cases = []
+
+    for i in range(size // 2):
+        rules.append(Rule(f"/rooms{i}/", endpoint=f"room{i}"))
+        rules.append(Rule(f"/rooms{i}/<name>", endpoint=f"ws{i}", websocket=True))
+        cases.append(Case(f"/rooms{i}/", f"room{i}", {}))
+        cases.append(Case(f"/rooms{i}/chat", f"ws{i}", {"name": "chat"}, scheme="ws"))
+
+    return {}, rules, cases
+
+
+def mixed_shape(size, rng):
+    """A mix of static rules, rules with converters and branch rules,
+    roughly a third of each.
+    """
+    return {}, make_rules(size), make_cases(size, rng)
+
+
+SHAPES = {
+    "mixed": mixed_shape,
+    "static": static_shape,
+    "converter": converter_shape,
+    "factory": factory_shape,
+    "host": host_shape,
+    "websocket": websocket_shape,
+}
+
+
+class Adapters(dict):
+    """Bind an adapter for each server name, subdomain, and scheme of the
+    cases.
+    """
+
+    def __init__(self, url_map):
+        super().__init__()
+        self.url_map = url_map
+
+    def __missing__(self, key):
+        server_name, subdomain, scheme = key
+        adapter = self[key] = self.url_map.bind(
+            server_name, subdomain=subdomain, url_scheme=scheme
+        )
+        return adapter
+
+
+def per_second(func, count, number):
+    """Call ``func`` ``number`` times, three times, and return the best
+    rate of operations per second, where one call does ``count``
+    operations.
+    """
+    # warm up caches and lazily built tables before timing
+    func()
+    return count * number / min(timeit.repeat(func, number=number, repeat=3))
+
+
+def bench(shape, size, matcher_class, seed, kwargs):
+    rng = random.Random(seed)
+    map_kwargs, _, cases = SHAPES[shape](size, rng)
+    map_kwargs = {**map_kwargs, **kwargs, "matcher_class": matcher_class}
+    sample = rng.sample(cases, min(len(cases), 200))
+    redirects = [case for case in sample if case.path.endswith("/")]
+    number = max(1, 2000 // size)
+    result = {}
+
+    # generate the same rules again, so that they are part of the memory
+    # used by the map
+    def make_map():
+        return Map(SHAPES[shape](size, random.Random(seed))[1], **map_kwargs)
+
+    gc.collect()
+    tracemalloc.start()
+    url_map = make_map()
+    adapters = Adapters(url_map)
+
+    def adapter(case):
+        return adapters[case.server_name, case.subdomain, case.scheme]
+
+    case = sample[0]
+    adapter(case).match(case.path)
+    result["memory"] = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    result["construct"] = 1 / min(
+        timeit.repeat(lambda: make_map().update(), number=1, repeat=3)
+    )
+    counter = iter(range(sys.maxsize))
+
+    def update():
+        i = next(counter)
+        url_map.add(Rule(f"/added/rule{i}", endpoint=f"added{i}"))
+        url_map.update()
+
+    result["update"] = per_second(update, 1, number)
+
+    def match():
+        for case in sample:
+            adapter(case).match(case.path)
+
+    result["hit"] = per_second(match, len(sample), number)
+
+    def miss():
+        for case in sample:
+            try:
+                adapter(case).match(f"/missing{case.path}")
+            except NotFound:
+                pass
+
+    result["miss"] = per_second(miss, len(sample), number)
+
+    if redirects:
+
+        def redirect():
+            for case in redirects:
+                try:
+                    adapter(case).match(case.path[:-1])
+                except RequestRedirect:
+                    pass
+
+        result["redirect"] = per_second(redirect, len(redirects), number)
+
+    def build():
+        for case in sample:
+            adapter(case).build(case.endpoint, case.values)
+
+    result["build"] = per_second(build, len(sample), number)
+    return result
+
+
+COLUMNS = [
+    ("construct", "maps/s"),
+    ("update", "updates/s"),
+    ("hit", "hits/s"),
+    ("miss", "misses/s"),
+    ("redirect", "redir/s"),
+    ("build", "builds/s"),
+]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--shape",
+        action="append",
+        choices=list(SHAPES),
+        help="Shape of the generated map. Can be given more than once."
+        " Default is all shapes.",
+    )
+    parser.add_argument(
+        "--size",
+        action="append",
+        type=int,
+        help="Number of rules. Can be given more than once. Default is"
+        f" {', '.join(map(str, SIZES))}.",
+    )
+    parser.add_argument(
+        "--matcher",
+        default=TableMatcher.__name__,
+        choices=[m.__name__ for m in MATCHERS] + ["all"],
+        help="Matcher class to use, or all to compare them.",
+    )
+    parser.add_argument(
+        "--match-cache-size", type=int, help="Enable the map's match cache."
+    )
+    parser.add_argument(
+        "--build-cache-size", type=int, help="Enable the map's build cache."
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+    args = parser.parse_args(argv)
+    matchers = [m for m in MATCHERS if args.matcher in {"all", m.__name__}]
+    kwargs = {
+        "match_cache_size": args.match_cache_size,
+        "build_cache_size": args.build_cache_size,
+    }
+    print(
+        f"{'shape':<10} {'rules':>6} {'matcher':<20} {'memory KiB':>10}"
+        + "".join(f" {label:>10}" for _, label in COLUMNS)
+    )
+
+    for shape in args.shape or SHAPES:
+        for size in args.size or SIZES:
+            for matcher_class in matchers:
+                result = bench(shape, size, matcher_class, args.seed, kwargs)
+                print(
+                    f"{shape:<10} {size:>6} {matcher_class.__name__:<20}"
+                    f" {result['memory'] / 1024:>10.0f}"
+                    + "".join(
+                        f" {result[key]:>10.0f}" if key in result else f" {'-':>10}"
+                        for key, _ in COLUMNS
+                    )
+                )
+
+
+if __name__ == "__main__":
+    main()
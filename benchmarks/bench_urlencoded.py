@@ -0,0 +1,70 @@
+"""Compare decoding ``application/x-www-form-urlencoded`` data with
+:func:`~werkzeug.urls.url_decode`, which decodes the whole data at
+once, with the per-pair decoding it used before and with
+:func:`~werkzeug.urls.url_decode_stream`, which the form parser used
+before.
+
+Run from the repository root with Werkzeug installed::
+
+    python benchmarks/bench_urlencoded.py
+"""
+import io
+import timeit
+from functools import partial
+
+from werkzeug.datastructures import MultiDict
+from werkzeug.urls import _url_decode_impl
+from werkzeug.urls import url_decode
+from werkzeug.urls import url_decode_stream
+from werkzeug.urls import url_encode
+
+
+def make_data(size, escaped):
+    """Encode ``size`` fields. If ``escaped`` is true, the values have
+    spaces and non-ASCII characters that are quoted.
+    """
+    value = "some value \N{SNOWMAN}" if escaped else "some-value"
+    return url_encode(
+        MultiDict([(f"field{i}", f"{value} {i}") for i in range(size)])
+    ).encode("ascii")
+
+
+def decode_pairs(data):
+    return MultiDict(_url_decode_impl(data.split(b"&"), "utf-8", True, "replace"))
+
+
+def decode_stream(data):
+    return url_decode_stream(io.BytesIO(data), limit=len(data))
+
+
+DECODERS = [
+    ("url_decode_stream", decode_stream),
+    ("per pair", decode_pairs),
+    ("url_decode", url_decode),
+]
+
+
+def main():
+    print(f"{'fields':>8} {'escaped':<8}" + "".join(f" {n:>18}" for n, _ in DECODERS))
+
+    for size in (10, 1000, 50000):
+        for escaped in (False, True):
+            data = make_data(size, escaped)
+            number = max(1, 100000 // size)
+            expect = decode_pairs(data)
+            rates = []
+
+            for _, decode in DECODERS:
+                assert decode(data) == expect
+                run = partial(decode, data)
+                best = min(timeit.repeat(run, number=number, repeat=3))
+                rates.append(len(data) * number / best / 2 ** 20)
+
+            print(
+                f"{size:>8} {str(escaped):<8}"
+                + "".join(f" {rate:>13.1f} MB/s" for rate in rates)
+            )
+
+
+if __name__ == "__main__":
+    main()
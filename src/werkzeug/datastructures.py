@@ -3075,6 +3075,13 @@ class FileStorage:
     attributes of the wrapper stream are proxied by the file storage so
     it's possible to do ``storage.read()`` instead of the long form
     ``storage.stream.read()``.
+
+    :param digests: Hash objects of the file's data by algorithm name.
+        See :attr:`digests`.
+
+    .. versionchanged:: 2.0
+        Added the ``digests`` parameter and attribute.
+        :attr:`content_length` can be set.
     """
 
     def __init__(
@@ -3087,9 +3094,12 @@ class FileStorage:
         content_type: Optional[str] = None,
         content_length: None = None,
         headers: Optional[Headers] = None,
+        digests: Optional[Dict[str, Any]] = None,
     ) -> None:
         self.name = name
         self.stream = stream or BytesIO()
+        self.digests = {} if digests is None else digests
+        self._content_length: Optional[int] = None
 
         # if no filename is provided we can attempt to get the filename
         # from the stream object passed.  There we have to be careful to
@@ -3127,10 +3137,20 @@ class FileStorage:
         return self.headers.get("content-type")
 
     @property
-    def content_length(self):
-        """The content-length sent in the header.  Usually not available"""
+    def content_length(self) -> int:
+        """The content-length sent in the header.  Usually not available,
+        but if the file was parsed from form data this is the number of
+        bytes that were written to the file.
+        """
+        if self._content_length is not None:
+            return self._content_length
+
         return int(self.headers.get("content-length") or 0)
 
+    @content_length.setter
+    def content_length(self, value: int) -> None:
+        self._content_length = value
+
     @property
     def mimetype(self) -> str:
         """Like :attr:`content_type`, but without parameters (eg, without
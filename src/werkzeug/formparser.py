@@ -1,18 +1,27 @@
-import codecs
+import binascii
+import hashlib
+import io
+import os
 import re
+from collections import deque
 from functools import update_wrapper
 from io import BytesIO
 from itertools import chain
 from itertools import repeat
 from itertools import tee
+from tempfile import TemporaryFile
+from threading import Lock
 from typing import Any
 from typing import AnyStr
 from typing import BinaryIO
 from typing import Callable
+from typing import Deque
 from typing import Dict
+from typing import Generator
 from typing import Iterable
 from typing import Iterator
 from typing import List
+from typing import NamedTuple
 from typing import Optional
 from typing import Tuple
 from typing import Type
@@ -24,24 +33,24 @@ from ._internal import _to_str
 from .datastructures import FileStorage
 from .datastructures import Headers
 from .datastructures import MultiDict
+from .datastructures import OrderedMultiDict
 from .http import parse_options_header
-from .urls import url_decode_stream
+from .urls import url_decode
+from .wsgi import _make_chunk_iter
 from .wsgi import get_content_length
 from .wsgi import get_input_stream
+from .wsgi import LimitedStream
 from .wsgi import make_line_iter
 from werkzeug.types import WSGIEnvironment
 
 if TYPE_CHECKING:
     from werkzeug.datastructures import ImmutableMultiDict  # noqa: F401
-    from werkzeug.wsgi import LimitedStream  # noqa: F401
 
 # there are some platforms where SpooledTemporaryFile is not available.
 # In that case we need to provide a fallback.
 try:
     from tempfile import SpooledTemporaryFile
 except ImportError:
-    from tempfile import TemporaryFile
-
     SpooledTemporaryFile = None  # type: ignore
 
 
@@ -56,14 +65,21 @@ _multipart_boundary_re = re.compile("^[ -~]{0,200}[!-~]$")
 _supported_multipart_encodings = frozenset(["base64", "quoted-printable"])
 
 
+#: the number of bytes of a file that are kept in memory by default
+_default_max_part_memory = 1024 * 500
+
+
 def default_stream_factory(
     total_content_length: int,
     content_type: Optional[str],
     filename: str,
     content_length: Optional[int] = None,
 ) -> BinaryIO:
-    """The stream factory that is used per default."""
-    max_size = 1024 * 500
+    """The stream factory that is used per default. Use a
+    :class:`SpoolingStrategy` to configure how much data is kept in
+    memory.
+    """
+    max_size = _default_max_part_memory
     # because these are opened in binary mode, `BytesIO` is an appropriate return type
     if SpooledTemporaryFile is not None:
         return SpooledTemporaryFile(max_size=max_size, mode="wb+")  # type: ignore
@@ -72,6 +88,229 @@ def default_stream_factory(
     return BytesIO()
 
 
+class SpoolingStrategy:
+    """A stream factory that keeps uploaded files in memory up to a
+    budget for each file and for all files together, then moves them
+    to a file. It counts how much data was kept in memory and how much
+    was written to files.
+
+    Pass it as the ``stream_factory`` of :class:`FormDataParser` or
+    :func:`parse_form_data`, or set it as
+    :attr:`~werkzeug.wrappers.BaseRequest.spooling_strategy`. The
+    budgets and counts apply to every parser that uses the same
+    instance, so use one for the whole process to limit its memory
+    use under concurrent uploads.
+
+    .. code-block:: python
+
+        class Request(werkzeug.wrappers.Request):
+            spooling_strategy = SpoolingStrategy(
+                max_part_memory=1024 * 1024,
+                max_memory=64 * 1024 * 1024,
+                memfd=True,
+            )
+
+    The files it returns are closed, and their memory is released,
+    when the :class:`~werkzeug.datastructures.FileStorage` is closed or
+    garbage collected.
+
+    :param max_part_memory: The number of bytes of a file to keep in
+        memory before moving it to a file.
+    :param max_memory: The number of bytes to keep in memory for all
+        files together. A file that would go over this moves to a file
+        instead. ``None`` means no limit.
+    :param memfd: Move files to anonymous memory files created with
+        :func:`os.memfd_create` instead of temporary files. They are
+        not limited by ``max_memory``, but don't need a file system.
+        Uses ``tmp_dir`` if ``memfd_create`` is not available.
+    :param tmp_dir: The directory to create temporary files in, for
+        example a ``tmpfs`` mount such as ``/dev/shm``. Defaults to the
+        directory of :func:`tempfile.TemporaryFile`.
+
+    .. versionadded:: 2.0
+    """
+
+    def __init__(
+        self,
+        max_part_memory: int = _default_max_part_memory,
+        max_memory: Optional[int] = None,
+        memfd: bool = False,
+        tmp_dir: Optional[str] = None,
+    ) -> None:
+        self.max_part_memory = max_part_memory
+        self.max_memory = max_memory
+        self.memfd = memfd
+        self.tmp_dir = tmp_dir
+        self._lock = Lock()
+        #: The number of bytes currently kept in memory.
+        self.memory_in_use = 0
+        self.reset()
+
+    def reset(self) -> None:
+        """Set all counts back to zero, except :attr:`memory_in_use`."""
+        with self._lock:
+            #: The most bytes that were kept in memory at the same time.
+            self.memory_peak = self.memory_in_use
+            #: The number of bytes written to memory.
+            self.memory_bytes = 0
+            #: The number of bytes written to files, including data that
+            #: was moved from memory.
+            self.file_bytes = 0
+            #: The number of streams that were created.
+            self.streams = 0
+            #: The number of streams that were moved from memory to a
+            #: file.
+            self.rollovers = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        """Get the counts as a dict."""
+        with self._lock:
+            return {
+                "memory_in_use": self.memory_in_use,
+                "memory_peak": self.memory_peak,
+                "memory_bytes": self.memory_bytes,
+                "file_bytes": self.file_bytes,
+                "streams": self.streams,
+                "rollovers": self.rollovers,
+            }
+
+    def __call__(
+        self,
+        total_content_length: Optional[int],
+        content_type: Optional[str],
+        filename: Optional[str],
+        content_length: Optional[int] = None,
+    ) -> BinaryIO:
+        with self._lock:
+            self.streams += 1
+
+        in_memory = not content_length or content_length <= self.max_part_memory
+        return _SpooledFile(self, in_memory)  # type: ignore
+
+    def open_file(self) -> BinaryIO:
+        """Open the file that a stream is moved to when it doesn't fit
+        in memory.
+        """
+        if self.memfd and hasattr(os, "memfd_create"):
+            fd = os.memfd_create("werkzeug-upload", os.MFD_CLOEXEC)
+            return open(fd, "wb+")  # type: ignore
+
+        return TemporaryFile("wb+", dir=self.tmp_dir)  # type: ignore
+
+    def _reserve(self, size: int) -> bool:
+        with self._lock:
+            in_use = self.memory_in_use + size
+
+            if self.max_memory is not None and in_use > self.max_memory:
+                return False
+
+            self.memory_in_use = in_use
+            self.memory_peak = max(self.memory_peak, in_use)
+            return True
+
+    def _count(
+        self, memory: int = 0, file: int = 0, release: int = 0, rollovers: int = 0
+    ) -> None:
+        with self._lock:
+            self.memory_bytes += memory
+            self.file_bytes += file
+            self.memory_in_use -= release
+            self.rollovers += rollovers
+
+
+class _SpooledFile(io.IOBase):
+    """The stream returned by :class:`SpoolingStrategy`. Writes to a
+    :class:`~io.BytesIO` while it fits in the strategy's budgets, then
+    moves the data to a file.
+    """
+
+    def __init__(self, strategy: SpoolingStrategy, in_memory: bool) -> None:
+        self._strategy = strategy
+        self._rolled = not in_memory
+        self._reserved = 0
+        self._file = BytesIO() if in_memory else strategy.open_file()
+
+    def rollover(self) -> None:
+        """Move the data from memory to a file."""
+        if self._rolled:
+            return
+
+        data = self._file.getvalue()  # type: ignore
+        pos = self._file.tell()
+        self._file = self._strategy.open_file()
+        self._file.write(data)
+        self._file.seek(pos)
+        self._rolled = True
+        self._strategy._count(file=len(data), release=self._reserved, rollovers=1)
+        self._reserved = 0
+
+    def write(self, data: bytes) -> int:  # type: ignore
+        if not self._rolled:
+            end = self._file.tell() + len(data)
+            growth = end - self._reserved
+
+            if growth <= 0:
+                self._strategy._count(memory=len(data))
+                return self._file.write(data)
+
+            if end <= self._strategy.max_part_memory and self._strategy._reserve(
+                growth
+            ):
+                self._reserved = end
+                self._strategy._count(memory=len(data))
+                return self._file.write(data)
+
+            self.rollover()
+
+        self._strategy._count(file=len(data))
+        return self._file.write(data)
+
+    def close(self) -> None:
+        if self.closed:
+            return
+
+        if not self._rolled:
+            self._strategy._count(release=self._reserved)
+            self._reserved = 0
+
+        super().close()
+        self._file.close()
+
+    def fileno(self) -> int:
+        self.rollover()
+        return self._file.fileno()
+
+    def read(self, size: int = -1) -> bytes:
+        return self._file.read(size)
+
+    def readinto(self, buffer: Union[bytearray, memoryview]) -> int:
+        return self._file.readinto(buffer)  # type: ignore
+
+    def readline(self, size: Optional[int] = -1) -> bytes:
+        return self._file.readline(size)  # type: ignore
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        return self._file.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+    def truncate(self, size: Optional[int] = None) -> int:
+        return self._file.truncate(size)
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def readable(self) -> bool:
+        return True
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+
 def parse_form_data(
     environ: WSGIEnvironment,
     stream_factory: None = None,
@@ -81,6 +320,7 @@ def parse_form_data(
     max_content_length: None = None,
     cls: None = None,
     silent: bool = True,
+    digests: Optional[Iterable[str]] = None,
 ) -> Tuple[BinaryIO, Type[dict], Type[dict]]:
     """Parse the form data in the environ and return it as tuple in the form
     ``(stream, form, files)``.  You should only call this method if the
@@ -120,7 +360,13 @@ def parse_form_data(
     :param cls: an optional dict class to use.  If this is not specified
                        or `None` the default :class:`MultiDict` is used.
     :param silent: If set to False parsing errors will not be caught.
+    :param digests: Names of :mod:`hashlib` algorithms to compute for
+        each uploaded file while it is written. See
+        :class:`FormDataParser`.
     :return: A tuple in the form ``(stream, form, files)``.
+
+    .. versionchanged:: 2.0
+        Added the ``digests`` parameter.
     """
     return FormDataParser(
         stream_factory,
@@ -130,9 +376,26 @@ def parse_form_data(
         max_content_length,
         cls,
         silent,
+        digests=digests,
     ).parse_from_environ(environ)
 
 
+def _check_digests(digests: Optional[Iterable[str]]) -> Tuple[str, ...]:
+    """Make a tuple of the algorithm names, and raise a
+    :exc:`ValueError` for unknown ones before parsing starts, where it
+    would be silenced.
+    """
+    if digests is None:
+        return ()
+
+    digests = tuple(digests)
+
+    for name in digests:
+        hashlib.new(name)
+
+    return digests
+
+
 def exhaust_stream(f):
     """Helper decorator for methods that exhausts the stream on return."""
 
@@ -178,6 +441,24 @@ class FormDataParser:
     :param cls: an optional dict class to use.  If this is not specified
                        or `None` the default :class:`MultiDict` is used.
     :param silent: If set to False parsing errors will not be caught.
+    :param scan_boundary: Parse multipart data by reading it in chunks
+        and searching for the boundary, instead of line by line. See
+        :class:`MultiPartParser`.
+    :param readinto: Read multipart data into a reused buffer and write
+        file parts from it without copying. Implies ``scan_boundary``.
+        See :class:`MultiPartParser`.
+    :param digests: Names of :mod:`hashlib` algorithms, like
+        ``["sha256"]``. Each uploaded file's digests are computed while
+        it is written, and stored in :attr:`FileStorage.digests
+        <werkzeug.datastructures.FileStorage.digests>`, so the data
+        doesn't have to be read again.
+    :param lazy_decode: Decode the values of multipart form fields when
+        they are first read from the form instead of while parsing. See
+        :class:`MultiPartParser`.
+
+    .. versionchanged:: 2.0
+        Added ``scan_boundary``, ``readinto``, ``digests``, and
+        ``lazy_decode``.
     """
 
     def __init__(
@@ -189,6 +470,10 @@ class FormDataParser:
         max_content_length: Optional[int] = None,
         cls: Optional[Type[dict]] = None,
         silent: bool = True,
+        scan_boundary: bool = False,
+        readinto: bool = False,
+        digests: Optional[Iterable[str]] = None,
+        lazy_decode: bool = False,
     ) -> None:
         if stream_factory is None:
             stream_factory = default_stream_factory
@@ -201,6 +486,10 @@ class FormDataParser:
             cls = MultiDict
         self.cls = cls
         self.silent = silent
+        self.scan_boundary = scan_boundary
+        self.readinto = readinto
+        self.digests = _check_digests(digests)
+        self.lazy_decode = lazy_decode
 
     def get_parse_func(
         self, mimetype: str, options: Dict[str, str]
@@ -270,6 +559,10 @@ class FormDataParser:
             self.errors,
             max_form_memory_size=self.max_form_memory_size,
             cls=self.cls,
+            scan_boundary=self.scan_boundary,
+            readinto=self.readinto,
+            digests=self.digests,
+            lazy_decode=self.lazy_decode,
         )
         boundary = options.get("boundary")
         if boundary is None:
@@ -293,7 +586,11 @@ class FormDataParser:
             and content_length > self.max_form_memory_size
         ):
             raise exceptions.RequestEntityTooLarge()
-        form = url_decode_stream(stream, self.charset, errors=self.errors, cls=self.cls)
+        # Decoding all the data at once is faster than decoding each
+        # pair of a stream.
+        form = url_decode(
+            stream.read(), self.charset, errors=self.errors, cls=self.cls
+        )
         return stream, form, self.cls()  # type: ignore
 
     #: mapping of mimetypes to parsing functions
@@ -356,7 +653,773 @@ _cont = "cont"
 _end = "end"
 
 
+class PartHeaders(NamedTuple):
+    """Event of a :class:`MultipartDecoder` for the start of a part,
+    after its headers were parsed. Parts without a ``filename`` are
+    form fields.
+
+    .. versionadded:: 2.0
+    """
+
+    name: Optional[str]
+    filename: Optional[str]
+    headers: Headers
+    #: The ``Content-Transfer-Encoding`` that the data is decoded from.
+    transfer_encoding: Optional[str]
+
+
+class PartData(NamedTuple):
+    """Event of a :class:`MultipartDecoder` with the next chunk of the
+    current part's data. A part's data may be split into any number of
+    chunks.
+
+    .. versionadded:: 2.0
+    """
+
+    data: bytes
+
+
+class PartEnd:
+    """Event of a :class:`MultipartDecoder` after all the data of the
+    current part.
+
+    .. versionadded:: 2.0
+    """
+
+    __slots__ = ()
+
+
+class Epilogue(NamedTuple):
+    """Event of a :class:`MultipartDecoder` after the closing boundary,
+    with the data following it. It's emitted when the closing boundary
+    is found and for each chunk of data fed after that, which is usually
+    empty.
+
+    .. versionadded:: 2.0
+    """
+
+    data: bytes
+
+
+class NeedData:
+    """Event of a :class:`MultipartDecoder` if the data fed so far has
+    been processed and more is needed.
+
+    .. versionadded:: 2.0
+    """
+
+    __slots__ = ()
+
+
+class Complete:
+    """Event of a :class:`MultipartDecoder` after the end of the input
+    was fed and processed.
+
+    .. versionadded:: 2.0
+    """
+
+    __slots__ = ()
+
+
+#: The :class:`NeedData` event.
+NEED_DATA = NeedData()
+#: The :class:`Complete` event.
+COMPLETE = Complete()
+_part_end = PartEnd()
+
+_preamble = "preamble"
+_headers = "headers"
+_data = "data"
+_boundary_line = "boundary_line"
+_epilogue = "epilogue"
+_complete = "complete"
+
+#: the bytes that are not part of the base64 alphabet or padding, they
+#: are ignored like :func:`binascii.a2b_base64` does
+_base64_ignored = bytes(
+    set(range(256)).difference(
+        b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/="
+    )
+)
+
+
+class _Base64Decoder:
+    """Decode base64 data that is split into chunks at any position.
+    Characters after the last complete group of four are kept for the
+    next chunk, so that lines and chunks don't need to be aligned.
+    """
+
+    __slots__ = ("_rest",)
+
+    def __init__(self) -> None:
+        self._rest = b""
+
+    def decode(self, data: Union[bytes, memoryview]) -> bytes:
+        data = self._rest + bytes(data).translate(None, _base64_ignored)
+        end = len(data) - len(data) % 4
+        self._rest = data[end:]
+        return self._decode(data, end)
+
+    def flush(self) -> bytes:
+        rest = self._rest
+        self._rest = b""
+        return self._decode(rest, len(rest))
+
+    def _decode(self, data: bytes, end: int) -> bytes:
+        # a2b_base64 stops at padding, decode the groups following it
+        # separately like they were on their own line
+        pos = 0
+        index = data.find(b"=", 0, end)
+
+        if index == -1:
+            chunks = [data[:end]]
+        else:
+            chunks = []
+
+            while index != -1:
+                index += 4 - index % 4
+                chunks.append(data[pos:index])
+                pos = index
+                index = data.find(b"=", pos, end)
+
+            chunks.append(data[pos:end])
+
+        try:
+            return b"".join(map(binascii.a2b_base64, chunks))
+        except binascii.Error:
+            raise ValueError("could not decode transfer encoded chunk") from None
+
+
+class _QuotedPrintableDecoder:
+    """Decode quoted-printable data that is split into chunks at any
+    position. The data is decoded up to the last line break, or the
+    last escape if a line is longer than a chunk, and the rest is kept
+    for the next chunk.
+    """
+
+    __slots__ = ("_rest",)
+
+    def __init__(self) -> None:
+        self._rest = b""
+
+    def decode(self, data: Union[bytes, memoryview]) -> bytes:
+        data = self._rest + bytes(data)
+        end = data.rfind(b"\n") + 1
+
+        if not end:
+            # Don't split an escape or a soft line break. "=\r" skips the
+            # rest of the line up to the next "\n".
+            end = data.find(b"=\r")
+
+            if end == -1:
+                end = data.find(b"=", len(data) - 2)
+
+            if end == -1:
+                end = len(data)
+
+            # "=" at the end of the data is a soft line break
+            while end and data[end - 1] == 61:
+                end -= 1
+
+        self._rest = data[end:]
+        return binascii.a2b_qp(data[:end])
+
+    def flush(self) -> bytes:
+        rest = self._rest
+        self._rest = b""
+        return binascii.a2b_qp(rest)
+
+
+_transfer_decoders = {
+    "base64": _Base64Decoder,
+    "quoted-printable": _QuotedPrintableDecoder,
+}
+
+
+class MultipartDecoder:
+    """Decodes ``multipart/form-data`` incrementally without doing any
+    I/O. Pass data to :meth:`feed` as it arrives, then call
+    :meth:`next_event` until it returns :data:`NEED_DATA`. This can be
+    used to process parts while they are being received, or from an
+    event loop.
+
+    .. code-block:: python
+
+        decoder = MultipartDecoder(boundary)
+
+        while True:
+            event = decoder.next_event()
+
+            if event is NEED_DATA:
+                decoder.feed(stream.read(64 * 1024))
+            elif isinstance(event, PartHeaders):
+                ...
+            elif isinstance(event, PartData):
+                ...
+            elif isinstance(event, (Epilogue, Complete)):
+                break
+
+    Events are :class:`PartHeaders`, followed by any number of
+    :class:`PartData` and :class:`PartEnd` for each part, then
+    :class:`Epilogue` after the closing boundary, and :class:`Complete`
+    once the end of the input was fed. The data is split like
+    :class:`MultiPartParser` does, so the results are the same.
+
+    Invalid data raises :exc:`ValueError`. Exceeding a limit raises
+    :exc:`~werkzeug.exceptions.RequestEntityTooLarge`.
+
+    :param boundary: The boundary from the ``Content-Type`` header.
+    :param max_form_memory_size: The maximum number of bytes of data
+        in parts without a ``filename``, which are usually kept in
+        memory.
+    :param max_content_length: The maximum number of bytes that may be
+        fed.
+    :param buffer_size: Lines of the preamble and headers are split at
+        this length, which limits the size of headers.
+
+    .. versionadded:: 2.0
+    """
+
+    def __init__(
+        self,
+        boundary: bytes,
+        max_form_memory_size: Optional[int] = None,
+        max_content_length: Optional[int] = None,
+        buffer_size: int = 64 * 1024,
+    ) -> None:
+        self.boundary = boundary
+        self.max_form_memory_size = max_form_memory_size
+        self.max_content_length = max_content_length
+        self.buffer_size = buffer_size
+        self._next_part = b"--" + boundary
+        self._last_part = self._next_part + b"--"
+        # A boundary split over two chunks can start this many bytes
+        # before the end of the data, with the line break before it.
+        self._keep = len(self._next_part) + 1
+        self._state = _preamble
+        self._events: Deque[Any] = deque()
+        # the data fed so far that wasn't consumed is _buffer[_pos:_end]
+        self._buffer = bytearray()
+        self._view = memoryview(self._buffer)
+        self._pos = 0
+        self._end = 0
+        self._share = False
+        self._eof = False
+        self._received = 0
+        self._in_memory = 0
+        self._header_lines: List[bytes] = []
+        self._is_form = False
+        self._terminator = b""
+        # where the part's data starts, -1 once some of it was emitted,
+        # and where to search for the boundary next
+        self._start = 0
+        self._search = 0
+        self._transfer_decoder: Optional[
+            Union[_Base64Decoder, _QuotedPrintableDecoder]
+        ] = None
+
+    def feed(self, data: bytes) -> None:
+        """Add the next chunk of input. Feed an empty chunk to signal
+        the end of the input.
+        """
+        if self._add_received(len(data)):
+            self._reserve(len(data))
+            self._view[self._end : self._end + len(data)] = data
+            self._end += len(data)
+
+    def get_buffer(self, size_hint: int = -1) -> memoryview:
+        """Get a writable buffer to read the next chunk of input into,
+        for example with ``stream.readinto(buffer)``. Then call
+        :meth:`buffer_updated` with the number of bytes written. This
+        avoids copying the input into the decoder like :meth:`feed`.
+
+        The same memory is reused for each chunk. Once this was called,
+        the :class:`PartData` events of parts with a ``filename`` are
+        :class:`memoryview` slices of it instead of :class:`bytes`,
+        which are only valid until the next call.
+
+        :param size_hint: The size of the buffer to get. Defaults to
+            ``buffer_size``.
+
+        .. versionadded:: 2.0
+        """
+        size = self.buffer_size if size_hint < 1 else size_hint
+        self._share = True
+        self._reserve(size)
+        return self._view[self._end : self._end + size]
+
+    def buffer_updated(self, nbytes: int) -> None:
+        """Add the ``nbytes`` that were written to the buffer returned
+        by :meth:`get_buffer` as the next chunk of input. Pass ``0`` to
+        signal the end of the input.
+
+        .. versionadded:: 2.0
+        """
+        if self._add_received(nbytes):
+            self._end += nbytes
+
+    def _add_received(self, size: int) -> bool:
+        if not size:
+            self._eof = True
+            return False
+
+        if self._eof:
+            raise ValueError("Data fed after the end of the input.")
+
+        self._received += size
+
+        if (
+            self.max_content_length is not None
+            and self._received > self.max_content_length
+        ):
+            raise exceptions.RequestEntityTooLarge()
+
+        return True
+
+    def _reserve(self, size: int) -> None:
+        """Move the data that wasn't consumed to the start of the buffer
+        and make room for ``size`` more bytes after it.
+        """
+        shift = self._pos
+        length = self._end - shift
+
+        if length + size > len(self._buffer):
+            # Use a new buffer instead of resizing, memoryviews of the
+            # old one may still exist.
+            buffer = bytearray(max(length + size, 2 * len(self._buffer)))
+            buffer[:length] = self._view[shift : self._end]
+            self._buffer = buffer
+            self._view = memoryview(buffer)
+        elif shift:
+            self._view[:length] = self._view[shift : self._end]
+
+        self._pos = 0
+        self._end = length
+        self._search = max(self._search - shift, 0)
+
+        if self._start != -1:
+            self._start -= shift
+
+    def next_event(self) -> Any:
+        """Get the next event, or :data:`NEED_DATA` if more data must
+        be fed first.
+        """
+        events = self._events
+
+        while not events:
+            state = self._state
+
+            if state == _data:
+                done = self._scan_data()
+            elif state == _headers:
+                done = self._parse_headers()
+            elif state == _boundary_line:
+                done = self._end_boundary_line()
+            elif state == _preamble:
+                done = self._find_terminator()
+            elif state == _epilogue:
+                done = self._read_epilogue()
+            else:
+                return COMPLETE
+
+            if not done:
+                break
+
+        if events:
+            return events.popleft()
+
+        return NEED_DATA
+
+    def _add_slice(self, start: int, end: int) -> None:
+        if self._transfer_decoder is not None:
+            self._add_data(self._transfer_decoder.decode(self._view[start:end]))
+        elif self._share and not self._is_form:
+            self._add_data(self._view[start:end])
+        else:
+            self._add_data(self._view[start:end].tobytes())
+
+    def _add_data(self, data: Union[bytes, memoryview]) -> None:
+        if not data:
+            return
+
+        if self._is_form and self.max_form_memory_size is not None:
+            self._in_memory += len(data)
+
+            if self._in_memory > self.max_form_memory_size:
+                raise exceptions.RequestEntityTooLarge()
+
+        self._events.append(PartData(data))
+
+    def _read_line(self) -> Optional[bytes]:
+        """Read a line including its line ending like
+        :func:`~werkzeug.wsgi.make_line_iter` with ``cap_at_buffer``.
+        Returns an empty string at the end of the input, or ``None`` if
+        more data is needed.
+        """
+        data = self._buffer
+        pos = self._pos
+        size = self._end
+        cr = data.find(b"\r", pos, size)
+        lf = data.find(b"\n", pos, size)
+        end = lf if cr == -1 or -1 < lf < cr else cr
+
+        if end != -1 and end - pos < self.buffer_size:
+            if end == cr and end + 1 == size and not self._eof:
+                # the \n of a \r\n may be in the next chunk
+                return None
+
+            if end == cr and end + 1 < size and data[end + 1] == 10:
+                end += 1
+
+            self._pos = end + 1
+        elif size - pos >= self.buffer_size:
+            self._pos = pos + self.buffer_size
+        elif self._eof:
+            self._pos = size
+        else:
+            return None
+
+        return self._view[pos : self._pos].tobytes()
+
+    def _find_terminator(self) -> bool:
+        # The first boundary may have whitespace and blank lines before
+        # it. There is at least one application that sends additional
+        # newlines before headers (the python setuptools package).
+        while True:
+            line = self._read_line()
+
+            if line is None:
+                return False
+
+            terminator = line.strip()
+
+            if terminator or not line:
+                break
+
+        if terminator == self._last_part:
+            self._start_epilogue()
+        elif terminator != self._next_part:
+            raise ValueError("Expected boundary at start of multipart data")
+        else:
+            self._state = _headers
+
+        return True
+
+    def _parse_headers(self) -> bool:
+        lines = self._header_lines
+
+        while True:
+            line = self._read_line()
+
+            if line is None:
+                return False
+
+            lines.append(line)
+
+            # parse_multipart_headers stops at the blank line and raises
+            # an error at the end of the input or for a capped line
+            if line in (b"\r\n", b"\n", b"\r") or _line_parse(line)[0] == line:
+                break
+
+        headers = parse_multipart_headers(lines)
+        self._header_lines = []
+        disposition = headers.get("content-disposition")
+
+        if disposition is None:
+            raise ValueError("Missing Content-Disposition header")
+
+        disposition, extra = parse_options_header(disposition)
+        transfer_encoding = headers.get("content-transfer-encoding")
+
+        if transfer_encoding not in _supported_multipart_encodings:
+            transfer_encoding = None
+
+        name = extra.get("name")
+        filename = extra.get("filename")
+        self._is_form = filename is None
+
+        if transfer_encoding is None:
+            self._transfer_decoder = None
+        else:
+            self._transfer_decoder = _transfer_decoders[transfer_encoding]()
+
+        self._start = self._search = self._pos
+        self._state = _data
+        self._events.append(PartHeaders(name, filename, headers, transfer_encoding))
+        return True
+
+    def _scan_data(self) -> bool:
+        data = self._buffer
+        pos = self._pos
+        size = self._end
+        start = self._start
+        next_part = self._next_part
+
+        while True:
+            index = data.find(next_part, self._search, size)
+
+            if index == -1:
+                break
+
+            self._search = index + 1
+            end = index + len(next_part)
+
+            # The boundary must be at the start of a line, and only be
+            # followed by "--", whitespace, and a line break or the end
+            # of the data.
+            if index != start and (
+                index == 0 or data[index - 1 : index] not in b"\r\n"
+            ):
+                continue
+
+            if end + 2 > size and not self._eof:
+                # the rest of the line may be in the next chunk
+                self._search = index
+                break
+
+            if end + 2 <= size and data[end : end + 2] == b"--":
+                end += 2
+
+            while end < size and data[end] in b" \t\x0b\x0c":
+                end += 1
+
+            if end == size and not self._eof:
+                self._search = index
+                break
+
+            if end < size and data[end] not in b"\r\n":
+                continue
+
+            # don't emit the line break before the boundary
+            cutoff = index
+
+            if index != start:
+                if index - 2 >= pos and data[index - 2 : index] == b"\r\n":
+                    cutoff -= 2
+                else:
+                    cutoff -= 1
+
+            if cutoff > pos:
+                self._add_slice(pos, cutoff)
+
+            if self._transfer_decoder is not None:
+                self._add_data(self._transfer_decoder.flush())
+
+            self._events.append(_part_end)
+            self._terminator = bytes(data[index:end]).rstrip()
+            self._pos = end
+            self._state = _boundary_line
+            return True
+
+        if self._eof:
+            raise ValueError("unexpected end of stream")
+
+        # Emit the data that can't be part of a boundary, keeping the
+        # line break before a possible boundary.
+        if index == -1:
+            limit = size - self._keep
+            self._search = max(limit, pos)
+        else:
+            limit = index - 2
+
+        if limit > pos:
+            self._add_slice(pos, limit)
+            self._pos = limit
+            self._start = -1
+
+        return False
+
+    def _end_boundary_line(self) -> bool:
+        if self._read_line() is None:
+            return False
+
+        self._after_boundary()
+        return True
+
+    def _after_boundary(self) -> None:
+        if self._terminator == self._last_part:
+            self._start_epilogue()
+        else:
+            self._state = _headers
+
+    def _start_epilogue(self) -> None:
+        self._state = _epilogue
+        self._add_epilogue()
+
+    def _add_epilogue(self) -> None:
+        self._events.append(Epilogue(self._view[self._pos : self._end].tobytes()))
+        self._pos = self._end
+
+    def _read_epilogue(self) -> bool:
+        if self._pos < self._end:
+            self._add_epilogue()
+            return True
+
+        if self._eof:
+            self._state = _complete
+            return True
+
+        return False
+
+
+class _LazyField:
+    """The raw data of a form field and how to decode it."""
+
+    __slots__ = ("data", "charset", "errors")
+
+    def __init__(self, data: bytes, charset: str, errors: str) -> None:
+        self.data = data
+        self.charset = charset
+        self.errors = errors
+
+    def decode(self) -> str:
+        return self.data.decode(self.charset, self.errors)
+
+
+class _LazyList(list):
+    """The list of values of a key in a :class:`MultiDict`, which decodes
+    the :class:`_LazyField` values when the list is first read.
+    """
+
+    __slots__ = ("_decoded",)
+
+    def __init__(self, values: Iterable[Any]) -> None:
+        super().__init__(values)
+        self._decoded = False
+
+    def _decode(self) -> None:
+        if self._decoded:
+            return
+
+        for index, value in enumerate(list.__iter__(self)):
+            if isinstance(value, _LazyField):
+                list.__setitem__(self, index, value.decode())
+
+        self._decoded = True
+
+    def decodes_first(name: str):  # type: ignore # noqa: B902
+        method = getattr(list, name)
+
+        def decoding(self, *args, **kwargs):
+            self._decode()
+
+            # list operations read the items of another list directly
+            for arg in args:
+                if isinstance(arg, _LazyList):
+                    arg._decode()
+
+            return method(self, *args, **kwargs)
+
+        decoding.__name__ = name
+        return decoding
+
+    # Every method that reads the items. Functions that read the items
+    # of a list directly in C, such as str.join and json.dumps, still
+    # see undecoded values, but MultiDict only passes out copies made
+    # by iterating, except for listvalues.
+    __getitem__ = decodes_first("__getitem__")
+    __iter__ = decodes_first("__iter__")
+    __reversed__ = decodes_first("__reversed__")
+    __contains__ = decodes_first("__contains__")
+    __eq__ = decodes_first("__eq__")
+    __ne__ = decodes_first("__ne__")
+    __lt__ = decodes_first("__lt__")
+    __le__ = decodes_first("__le__")
+    __gt__ = decodes_first("__gt__")
+    __ge__ = decodes_first("__ge__")
+    __repr__ = decodes_first("__repr__")
+    __add__ = decodes_first("__add__")
+    __iadd__ = decodes_first("__iadd__")
+    __mul__ = decodes_first("__mul__")
+    __rmul__ = decodes_first("__rmul__")
+    __imul__ = decodes_first("__imul__")
+    index = decodes_first("index")
+    count = decodes_first("count")
+    pop = decodes_first("pop")
+    remove = decodes_first("remove")
+    copy = decodes_first("copy")
+    sort = decodes_first("sort")
+    extend = decodes_first("extend")
+    del decodes_first
+
+    def __radd__(self, other: Any) -> Any:
+        # called before list.__add__ of the left list, which would read
+        # the items of this one directly
+        if not isinstance(other, list):
+            return NotImplemented
+
+        self._decode()
+        return list.__add__(other, self)
+
+
+def _lazy_form(cls: Type[dict], items: Iterable[Tuple[str, _LazyField]]) -> dict:
+    """Create the form with the values of each key in a
+    :class:`_LazyList`. Values are decoded right away if ``cls`` doesn't
+    keep them in lists.
+    """
+    if not issubclass(cls, MultiDict) or issubclass(cls, OrderedMultiDict):
+        return cls((key, value.decode()) for key, value in items)
+
+    rv = cls(items)
+
+    for key, values in list(dict.items(rv)):
+        dict.__setitem__(rv, key, _LazyList(values))
+
+    return rv
+
+
+def _can_readinto(file: Any) -> bool:
+    """Check if a stream can read into a buffer without copying. A
+    :class:`~werkzeug.wsgi.LimitedStream` always has ``readinto``, but
+    only avoids the copy if the stream it wraps does.
+    """
+    while isinstance(file, LimitedStream):
+        readinto = file._readinto
+
+        if readinto is None:
+            return False
+
+        file = getattr(readinto, "__self__", None)
+
+        if file is None:
+            return True
+
+    return hasattr(file, "readinto")
+
+
 class MultiPartParser:
+    """Parses multipart form data into form fields and files.
+
+    :param scan_boundary: Use :meth:`parse_chunks` instead of
+        :meth:`parse_lines`, which reads the data in chunks of
+        ``buffer_size`` and searches for the boundary instead of
+        iterating over every line. It's faster for large parts,
+        especially binary files with few or many line breaks, and gives
+        the same results.
+    :param readinto: Like ``scan_boundary``, but read the data with the
+        stream's ``readinto`` method into a buffer that is reused for
+        each chunk. The data of file parts is passed to the ``write``
+        method of the file from the stream factory as
+        :class:`memoryview` slices of the buffer, so it is not copied
+        before it is written. Falls back to ``scan_boundary`` if the
+        stream has no ``readinto`` method.
+    :param digests: Names of :mod:`hashlib` algorithms to compute for
+        the data of each file part while it is written. The hash objects
+        are stored in :attr:`FileStorage.digests
+        <werkzeug.datastructures.FileStorage.digests>`.
+    :param lazy_decode: Keep the data of form fields as bytes, and only
+        decode the values of a key when they are first read from the
+        form. Fields that are never read are never decoded. Values are
+        decoded right away if ``cls`` is not a :class:`MultiDict` or is
+        an :class:`~werkzeug.datastructures.OrderedMultiDict`.
+
+    .. versionchanged:: 2.0
+        Added ``scan_boundary``, ``readinto``, ``digests``, and
+        ``lazy_decode``. The
+        :attr:`~werkzeug.datastructures.FileStorage.content_length` of
+        files is the number of bytes written.
+    """
+
     def __init__(
         self,
         stream_factory: Optional[Union[Callable, int]] = None,
@@ -367,6 +1430,10 @@ class MultiPartParser:
             Union[Type["ImmutableMultiDict"], Type[dict], Type["MultiDict"]]
         ] = None,
         buffer_size: int = 64 * 1024,
+        scan_boundary: bool = False,
+        readinto: bool = False,
+        digests: Optional[Iterable[str]] = None,
+        lazy_decode: bool = False,
     ) -> None:
         self.charset = charset
         self.errors = errors
@@ -384,6 +1451,10 @@ class MultiPartParser:
         assert buffer_size >= 1024, "buffer size has to be at least 1KB"
 
         self.buffer_size = buffer_size
+        self.scan_boundary = scan_boundary
+        self.readinto = readinto
+        self.digests = _check_digests(digests)
+        self.lazy_decode = lazy_decode
 
     def _fix_ie_filename(self, filename: str) -> str:
         """Internet Explorer 6 transmits the full file name if a file is
@@ -507,86 +1578,184 @@ class MultiPartParser:
 
         while terminator != last_part:
             headers = parse_multipart_headers(iterator)
+            event, transfer_encoding = self._begin_part(headers)
+            yield event
+            terminator = yield from self._parse_part_lines(
+                iterator, next_part, last_part, transfer_encoding
+            )
+            yield _end, None
 
-            disposition = headers.get("content-disposition")
-            if disposition is None:
-                self.fail("Missing Content-Disposition header")
-            disposition, extra = parse_options_header(disposition)
-            transfer_encoding = self.get_part_encoding(headers)
-            name = extra.get("name")
-            filename = extra.get("filename")
-
-            # if no content type is given we stream into memory.  A list is
-            # used as a temporary container.
-            if filename is None:
-                yield _begin_form, (headers, name)
-
-            # otherwise we parse the rest of the headers and ask the stream
-            # factory for something we can write in.
-            else:
-                yield _begin_file, (headers, name, filename)
+    def _begin_part(self, headers: Headers) -> Tuple[Any, Optional[str]]:
+        """Get the ``begin_form`` or ``begin_file`` item for a part and
+        its transfer encoding.
+        """
+        disposition = headers.get("content-disposition")
+        if disposition is None:
+            self.fail("Missing Content-Disposition header")
+        disposition, extra = parse_options_header(disposition)
+        transfer_encoding = self.get_part_encoding(headers)
+        name = extra.get("name")
+        filename = extra.get("filename")
+
+        # if no content type is given we stream into memory.  A list is
+        # used as a temporary container.
+        if filename is None:
+            return (_begin_form, (headers, name)), transfer_encoding
+
+        # otherwise we parse the rest of the headers and ask the stream
+        # factory for something we can write in.
+        return (_begin_file, (headers, name, filename)), transfer_encoding
+
+    def _parse_part_lines(
+        self,
+        iterator: Iterator[bytes],
+        next_part: bytes,
+        last_part: bytes,
+        transfer_encoding: Optional[str],
+    ) -> Generator[Tuple[str, bytes], None, bytes]:
+        """Generate the ``cont`` items of a part's lines, and return the
+        boundary that ended the part. The lines of a transfer encoded
+        part are collected up to ``buffer_size`` and decoded together.
+        """
+        lines = self._split_part_lines(iterator, next_part, last_part)
 
-            buf = b""
-            for line in iterator:
-                if not line:
-                    self.fail("unexpected end of stream")
+        if transfer_encoding is None:
+            return (yield from lines)
 
-                if line[:2] == b"--":  # type: ignore
-                    terminator = line.rstrip()
-                    if terminator in (next_part, last_part):  # type: ignore
-                        break
+        decoder = _transfer_decoders[transfer_encoding]()
+        pending: List[bytes] = []
+        size = 0
 
-                if transfer_encoding is not None:
-                    if transfer_encoding == "base64":
-                        transfer_encoding = "base64_codec"
-                    try:
-                        line = codecs.decode(line, transfer_encoding)  # type: ignore
-                    except Exception:
-                        self.fail("could not decode transfer encoded chunk")
-
-                # we have something in the buffer from the last iteration.
-                # this is usually a newline delimiter.
-                if buf:
-                    yield _cont, buf
-                    buf = b""
-
-                # If the line ends with windows CRLF we write everything except
-                # the last two bytes.  In all other cases however we write
-                # everything except the last byte.  If it was a newline, that's
-                # fine, otherwise it does not matter because we will write it
-                # the next iteration.  this ensures we do not write the
-                # final newline into the stream.  That way we do not have to
-                # truncate the stream.  However we do have to make sure that
-                # if something else than a newline is in there we write it
-                # out.
-                if line[-2:] == b"\r\n":  # type: ignore
-                    buf = b"\r\n"
-                    cutoff = -2
-                else:
-                    buf = line[-1:]  # type: ignore
-                    cutoff = -1
-                yield _cont, line[:cutoff]
+        while True:
+            try:
+                _, data = next(lines)
+            except StopIteration as e:
+                terminator = e.value
+                break
 
-            else:
-                raise ValueError("unexpected end of part")
+            pending.append(data)
+            size += len(data)
+
+            if size >= self.buffer_size:
+                yield _cont, decoder.decode(b"".join(pending))
+                pending = []
+                size = 0
 
-            # if we have a leftover in the buffer that is not a newline
-            # character we have to flush it, otherwise we will chop of
-            # certain values.
-            if buf not in (b"", b"\r", b"\n", b"\r\n"):
+        yield _cont, decoder.decode(b"".join(pending)) + decoder.flush()
+        return terminator
+
+    def _split_part_lines(
+        self, iterator: Iterator[bytes], next_part: bytes, last_part: bytes
+    ) -> Generator[Tuple[str, bytes], None, bytes]:
+        buf = b""
+        for line in iterator:
+            if not line:
+                self.fail("unexpected end of stream")
+
+            if line[:2] == b"--":
+                terminator = line.rstrip()
+                if terminator in (next_part, last_part):
+                    break
+
+            # we have something in the buffer from the last iteration.
+            # this is usually a newline delimiter.
+            if buf:
                 yield _cont, buf
+                buf = b""
+
+            # If the line ends with windows CRLF we write everything except
+            # the last two bytes.  In all other cases however we write
+            # everything except the last byte.  If it was a newline, that's
+            # fine, otherwise it does not matter because we will write it
+            # the next iteration.  this ensures we do not write the
+            # final newline into the stream.  That way we do not have to
+            # truncate the stream.  However we do have to make sure that
+            # if something else than a newline is in there we write it
+            # out.
+            if line[-2:] == b"\r\n":
+                buf = b"\r\n"
+                cutoff = -2
+            else:
+                buf = line[-1:]
+                cutoff = -1
+            yield _cont, line[:cutoff]
 
-            yield _end, None
+        else:
+            raise ValueError("unexpected end of part")
+
+        # if we have a leftover in the buffer that is not a newline
+        # character we have to flush it, otherwise we will chop of
+        # certain values.
+        if buf not in (b"", b"\r", b"\n", b"\r\n"):
+            yield _cont, buf
+
+        return terminator
+
+    def parse_chunks(
+        self, file: BinaryIO, boundary: bytes, content_length: int
+    ) -> Iterator[Tuple[str, Any]]:
+        """Generate the same items as :meth:`parse_lines`, but read the
+        data in chunks of ``buffer_size`` and pass them to a
+        :class:`MultipartDecoder`, which searches for the boundary with
+        :meth:`bytes.find`. Each ``cont`` item is a large slice of the
+        part's data instead of a line.
+
+        If :attr:`readinto` is enabled and the stream supports it, the
+        data is read into the decoder's buffer with
+        :meth:`MultipartDecoder.get_buffer`, and the ``cont`` items of
+        file parts are :class:`memoryview` slices of it that are only
+        valid until the next item.
+
+        .. versionadded:: 2.0
+        """
+        decoder = MultipartDecoder(boundary, buffer_size=self.buffer_size)
+        readinto = None
+
+        if self.readinto and _can_readinto(file):
+            if not isinstance(file, LimitedStream) and content_length is not None:
+                file = LimitedStream(file, content_length)  # type: ignore
+
+            readinto = file.readinto
+        else:
+            chunks = _make_chunk_iter(file, content_length, self.buffer_size)
+
+        while True:
+            event = decoder.next_event()
+
+            if event is NEED_DATA:
+                if readinto is None:
+                    decoder.feed(next(chunks, b""))
+                else:
+                    decoder.buffer_updated(readinto(decoder.get_buffer()))
+            elif isinstance(event, PartData):
+                yield _cont, event.data
+            elif isinstance(event, PartHeaders):
+                if event.filename is None:
+                    yield _begin_form, (event.headers, event.name)
+                else:
+                    yield _begin_file, (event.headers, event.name, event.filename)
+            elif isinstance(event, PartEnd):
+                yield _end, None
+            else:
+                return
 
     def parse_parts(
         self, file: BinaryIO, boundary: bytes, content_length: int
     ) -> Iterator[Union[Tuple[str, Tuple[str, Union[str, FileStorage]]]]]:
         """Generate ``('file', (name, val))`` and
         ``('form', (name, val))`` parts.
+
+        If :attr:`lazy_decode` is enabled, the form values are not
+        decoded yet. :meth:`parse` decodes them when they are read.
         """
         in_memory = 0
 
-        for ellt, ell in self.parse_lines(file, boundary, content_length):
+        if self.scan_boundary or self.readinto:
+            items = self.parse_chunks(file, boundary, content_length)
+        else:
+            items = self.parse_lines(file, boundary, content_length)
+
+        for ellt, ell in items:
             if ellt == _begin_file:
                 headers, name, filename = ell  # type: ignore
                 is_file = True
@@ -595,6 +1764,9 @@ class MultiPartParser:
                     filename, headers, content_length  # type: ignore
                 )
                 _write = container.write
+                size = 0
+                digests = {alg: hashlib.new(alg) for alg in self.digests}
+                updates = [digest.update for digest in digests.values()]
 
             elif ellt == _begin_form:
                 headers, name = ell  # type: ignore
@@ -605,6 +1777,13 @@ class MultiPartParser:
 
             elif ellt == _cont:
                 _write(ell)  # type: ignore
+
+                if is_file:
+                    size += len(ell)
+
+                    for update in updates:
+                        update(ell)
+
                 # if we write into memory and there is a memory size limit we
                 # count the number of bytes in memory and raise an exception if
                 # there is too much data in memory.
@@ -616,24 +1795,25 @@ class MultiPartParser:
             elif ellt == _end:
                 if is_file:
                     container.seek(0)
-                    yield (  # type: ignore
-                        "file",
-                        (
-                            name,
-                            FileStorage(
-                                container,
-                                filename,
-                                name,  # type: ignore
-                                headers=headers,  # type: ignore
-                            ),
-                        ),
+                    storage = FileStorage(
+                        container,
+                        filename,
+                        name,  # type: ignore
+                        headers=headers,  # type: ignore
+                        digests=digests,
                     )
+                    storage.content_length = size
+                    yield "file", (name, storage)  # type: ignore
                 else:
                     part_charset = self.get_part_charset(headers)  # type: ignore
-                    yield (  # type: ignore
-                        "form",
-                        (name, b"".join(container).decode(part_charset, self.errors),),
-                    )
+                    data = b"".join(container)
+
+                    if self.lazy_decode:
+                        value = _LazyField(data, part_charset, self.errors)
+                    else:
+                        value = data.decode(part_charset, self.errors)
+
+                    yield "form", (name, value)  # type: ignore
 
     def parse(
         self, file: BinaryIO, boundary: bytes, content_length: int
@@ -643,4 +1823,8 @@ class MultiPartParser:
         )
         form = (p[1] for p in formstream if p[0] == "form")
         files = (p[1] for p in filestream if p[0] == "file")
+
+        if self.lazy_decode:
+            return _lazy_form(self.cls, form), self.cls(files)  # type: ignore
+
         return self.cls(form), self.cls(files)  # type: ignore
@@ -106,24 +106,41 @@ routing tried to match a ``POST`` request) a ``MethodNotAllowed``
 exception is raised.
 """
 import ast
+import bisect
+import builtins
 import difflib
+import hashlib
+import heapq
+import itertools
+import marshal
+import os
 import posixpath
 import re
+import threading
 import uuid
 import warnings
+from collections import OrderedDict
+from copy import copy
 from pprint import pformat
 from string import Template
 from threading import Lock
+from time import perf_counter
+from types import FunctionType
+from typing import AbstractSet
 from typing import Any
 from typing import Callable
 from typing import Dict
+from typing import FrozenSet
 from typing import Hashable
+from typing import Iterable
 from typing import Iterator
 from typing import List
+from typing import NamedTuple
 from typing import Optional
 from typing import Pattern
 from typing import Set
 from typing import Tuple
+from typing import Type
 from typing import TYPE_CHECKING
 from typing import Union
 
@@ -184,6 +201,11 @@ _converter_args_re = re.compile(
 
 
 _PYTHON_CONSTANTS = {"None": None, "True": True, "False": False}
+# Values of these types are immutable, URLs built from them and matches
+# that return them can be cached.
+_BUILD_CACHE_TYPES = {str, int, float, bool, bytes, uuid.UUID}
+# Increment when the data written by Map.save_compile_cache changes.
+_COMPILE_CACHE_FORMAT = 2
 
 
 def _pythonize(value: str) -> Optional[Union[bool, str, float, int]]:
@@ -289,8 +311,11 @@ class RequestPath(RoutingException):
 class RequestAliasRedirect(RoutingException):  # noqa: B903
     """This rule is an alias and wants to redirect to the canonical URL."""
 
-    def __init__(self, matched_values: Dict[Any, Any]) -> None:
+    def __init__(
+        self, matched_values: Dict[Any, Any], endpoint: Optional[str] = None
+    ) -> None:
         self.matched_values = matched_values
+        self.endpoint = endpoint
 
 
 class BuildError(RoutingException, LookupError):
@@ -316,6 +341,15 @@ class BuildError(RoutingException, LookupError):
         return self.closest_rule(self.adapter)
 
     def closest_rule(self, adapter: "MapAdapter") -> Optional["Rule"]:
+        """Find the rule that was most likely meant to be built. Only the
+        rules of the endpoints with the most similar names are compared,
+        so this takes about the same time for maps of any size.
+
+        .. versionchanged:: 2.0
+            Looks up similar endpoint names in an index instead of
+            comparing to every rule.
+        """
+
         def _score_rule(rule):
             return sum(
                 [
@@ -328,8 +362,19 @@ class BuildError(RoutingException, LookupError):
                 ]
             )
 
-        if adapter and adapter.map._rules:
-            return max(adapter.map._rules, key=_score_rule)
+        if adapter is None:
+            return None
+
+        adapter.map.update()
+        snapshot = adapter.map._snapshot
+        rules = [
+            rule
+            for endpoint in snapshot.similar_endpoints(self.endpoint)
+            for rule in snapshot.rules_by_endpoint[endpoint]
+        ]
+
+        if rules:
+            return max(rules, key=_score_rule)
 
         return None
 
@@ -684,6 +729,8 @@ class Rule(RuleFactory):
     _static_weights: Optional[List[Any]]
     _argument_weights: Optional[List[Any]]
     _regex: Optional[Pattern]
+    _regex_pattern: Optional[str]
+    _combined_batch: Optional[Tuple[str, Pattern]]
 
     def __init__(
         self,
@@ -738,6 +785,10 @@ class Rule(RuleFactory):
         else:
             self.arguments = set()
         self._trace = self._converters = self._regex = self._argument_weights = None
+        self._regex_pattern = None
+        # the combined regex of the CombinedRegexMatcher batch that
+        # starts with this rule, reused by the next snapshot of the map
+        self._combined_batch = None
 
     def empty(self) -> "Rule":
         """
@@ -804,6 +855,14 @@ class Rule(RuleFactory):
             self.merge_slashes = map.merge_slashes
         if self.subdomain is None:
             self.subdomain = map.default_subdomain
+
+        # Count the rules tried only if the map collects stats, instead
+        # of checking for every rule in match.
+        if map.stats is not None:
+            self.match = self._match_counted  # type: ignore
+        else:
+            self.__dict__.pop("match", None)
+
         self.compile()
 
     def get_converter(
@@ -835,6 +894,14 @@ class Rule(RuleFactory):
         """Compiles the regular expression and stores it."""
         assert self.map is not None, "rule not bound"
 
+        if self.map._compile_cache is not None:
+            compiled = self.map._compile_cache.get(self._compile_key())
+
+            if compiled is not None and self._load_compiled(compiled):
+                return
+
+            self.map._compile_cache_changed = True
+
         if self.map.host_matching:
             domain_rule = self.host or ""
         else:
@@ -842,6 +909,7 @@ class Rule(RuleFactory):
 
         self._trace = []
         self._converters = {}
+        self._converter_specs = {}
         self._static_weights = []
         self._argument_weights = []
         regex_parts: List[Any] = []
@@ -873,6 +941,7 @@ class Rule(RuleFactory):
                     convobj = self.get_converter(variable, converter, c_args, c_kwargs)
                     regex_parts.append(f"(?P<{variable}>{convobj.regex})")
                     self._converters[variable] = convobj
+                    self._converter_specs[variable] = (converter, c_args, c_kwargs)
                     self._trace.append((True, variable))
                     self._argument_weights.append(convobj.weight)
                     self.arguments.add(str(variable))
@@ -885,10 +954,12 @@ class Rule(RuleFactory):
         if not self.is_leaf:
             self._trace.append((False, "/"))
 
-        self._build = self._compile_builder(False).__get__(self, None)  # type: ignore
-        self._build_unknown = self._compile_builder(True).__get__(  # type: ignore
-            self, None
-        )
+        self._regex = self._regex_pattern = None
+
+        if self.map.lazy_compile:
+            self._build = self._build_unknown = None
+        else:
+            self._compile_builders()
 
         if self.build_only:
             return
@@ -899,8 +970,108 @@ class Rule(RuleFactory):
         else:
             tail = ""
 
-        regex = f"^{''.join(regex_parts)}{tail}$"
-        self._regex = re.compile(regex)
+        self._regex_pattern = f"^{''.join(regex_parts)}{tail}$"
+
+        if not self.map.lazy_compile:
+            self._regex = re.compile(self._regex_pattern)
+
+    def _compile_builders(self) -> None:
+        """Compile the functions used by :meth:`build`. Called by
+        :meth:`compile`, or on the first build if the map compiles rules
+        lazily.
+
+        :internal:
+        """
+        self._build = self._compile_builder(False).__get__(self, None)  # type: ignore
+        self._build_unknown = self._compile_builder(True).__get__(  # type: ignore
+            self, None
+        )
+
+    def _compile_key(self) -> str:
+        """A fingerprint of everything the result of :meth:`compile`
+        depends on, other than the configuration of the map. Used to
+        look the rule up in the map's compile cache.
+
+        :internal:
+        """
+        definition = (
+            f"{type(self).__module__}.{type(self).__qualname__}",
+            self.rule,
+            self.host if self.map.host_matching else self.subdomain,
+            sorted(self.defaults.items()) if self.defaults else None,
+            self.build_only,
+            self.strict_slashes,
+            self.merge_slashes,
+        )
+        return hashlib.sha1(repr(definition).encode("utf-8")).hexdigest()
+
+    def _dump_compiled(self) -> tuple:
+        """Get the result of :meth:`compile` as data that can be
+        serialized with :mod:`marshal`.
+
+        :internal:
+        """
+        if self._build is None:
+            self._compile_builders()
+
+        builders = tuple(
+            (f.__func__.__code__, f.__func__.__defaults__)  # type: ignore
+            for f in (self._build, self._build_unknown)  # type: ignore
+        )
+        return (
+            self._trace,
+            self._converter_specs,
+            tuple(c.regex for c in self._converters.values()),
+            self._static_weights,
+            self._argument_weights,
+            self._regex_pattern,
+            builders,
+        )
+
+    def _load_compiled(self, compiled: tuple) -> bool:
+        """Restore the result of :meth:`compile` from the data returned
+        by :meth:`_dump_compiled`. Returns ``False`` if the regex or
+        weight of a converter changed since the data was dumped, the
+        rule must be compiled again then.
+
+        :internal:
+        """
+        (
+            self._trace,
+            self._converter_specs,
+            regexes,
+            self._static_weights,
+            self._argument_weights,
+            self._regex_pattern,
+            builders,
+        ) = compiled
+        self._converters = {}
+
+        for variable, (converter, c_args, c_kwargs) in self._converter_specs.items():
+            convobj = self.get_converter(variable, converter, c_args, c_kwargs)
+            self._converters[variable] = convobj
+            self.arguments.add(str(variable))
+
+        # the regex and the sort key of the rule depend on the converters
+        if tuple(c.regex for c in self._converters.values()) != regexes:
+            return False
+
+        if [c.weight for c in self._converters.values()] != self._argument_weights:
+            return False
+
+        build, build_unknown = (
+            FunctionType(code, {"__builtins__": builtins}, code.co_name, defaults)
+            for code, defaults in builders
+        )
+        self._build = build.__get__(self, None)  # type: ignore
+        self._build_unknown = build_unknown.__get__(self, None)  # type: ignore
+
+        if self._regex_pattern is None or self.map.lazy_compile:
+            self._regex = None
+        else:
+            self._regex = re.compile(self._regex_pattern)
+
+        return True
 
     def match(self, path: str, method: Optional[str] = None) -> Optional[dict]:
         """Check if the rule matches a given path. Path is a string in the
@@ -914,59 +1085,81 @@ class Rule(RuleFactory):
         :internal:
         """
         if not self.build_only:
-            require_redirect = False
+            if self._regex is None:
+                self._regex = re.compile(self._regex_pattern)
 
             m = self._regex.search(path)
             if m is not None:
-                groups = m.groupdict()
-                # we have a folder like part of the url without a trailing
-                # slash and strict slashes enabled. raise an exception that
-                # tells the map to redirect to the same url but with a
-                # trailing slash
-                if (
-                    self.strict_slashes
-                    and not self.is_leaf
-                    and not groups.pop("__suffix__")
-                    and (
-                        method is None or self.methods is None or method in self.methods
-                    )
-                ):
-                    path += "/"
-                    require_redirect = True
-                # if we are not in strict slashes mode we have to remove
-                # a __suffix__
-                elif not self.strict_slashes:
-                    del groups["__suffix__"]
-
-                result = {}
-                for name, value in groups.items():
-                    try:
-                        value = self._converters[name].to_python(value)
-                    except ValidationError:
-                        return None
-                    result[str(name)] = value
-                if self.defaults:
-                    result.update(self.defaults)
-
-                if self.merge_slashes:
-                    new_path = "|".join(self.build(result, False))
-                    if path.endswith("/") and not new_path.endswith("/"):
-                        new_path += "/"
-                    if new_path.count("/") < path.count("/"):
-                        path = new_path
-                        require_redirect = True
-
-                if require_redirect:
-                    path = path.split("|", 1)[1]
-                    raise RequestPath(path)
-
-                if self.alias and self.map.redirect_defaults:
-                    raise RequestAliasRedirect(result)
-
-                return result
+                return self._match_groups(m.groupdict(), path, method)
 
         return None
 
+    def _match_counted(self, path: str, method: Optional[str] = None) -> Optional[dict]:
+        """Replaces :meth:`match` if the map collects stats, to record
+        that the rule was tried.
+
+        :internal:
+        """
+        if not self.build_only:
+            self.map.stats._rule_tried(self)  # type: ignore
+
+        return type(self).match(self, path, method)
+
+    def _match_groups(
+        self, groups: Dict[str, Optional[str]], path: str, method: Optional[str]
+    ) -> Optional[dict]:
+        """Convert the groups of a successful regex match of the path
+        to the values returned by :meth:`match`. Split from
+        :meth:`match` so matchers can run the regex in another way.
+
+        :internal:
+        """
+        require_redirect = False
+
+        # we have a folder like part of the url without a trailing
+        # slash and strict slashes enabled. raise an exception that
+        # tells the map to redirect to the same url but with a
+        # trailing slash
+        if (
+            self.strict_slashes
+            and not self.is_leaf
+            and not groups.pop("__suffix__")
+            and (method is None or self.methods is None or method in self.methods)
+        ):
+            path += "/"
+            require_redirect = True
+        # if we are not in strict slashes mode we have to remove
+        # a __suffix__
+        elif not self.strict_slashes:
+            del groups["__suffix__"]
+
+        result = {}
+        for name, value in groups.items():
+            try:
+                value = self._converters[name].to_python(value)
+            except ValidationError:
+                return None
+            result[str(name)] = value
+        if self.defaults:
+            result.update(self.defaults)
+
+        if self.merge_slashes:
+            new_path = "|".join(self.build(result, False))
+            if path.endswith("/") and not new_path.endswith("/"):
+                new_path += "/"
+            if new_path.count("/") < path.count("/"):
+                path = new_path
+                require_redirect = True
+
+        if require_redirect:
+            path = path.split("|", 1)[1]
+            raise RequestPath(path)
+
+        if self.alias and self.map.redirect_defaults:
+            raise RequestAliasRedirect(result, self.endpoint)
+
+        return result
+
     @staticmethod
     def _get_func_code(code: Any, name: Any) -> Any:
         globs: Dict[Any, Any] = {}
@@ -1076,6 +1269,9 @@ class Rule(RuleFactory):
 
         :internal:
         """
+        if self._build is None:
+            self._compile_builders()
+
         try:
             if append_unknown:
                 return self._build_unknown(**values)
@@ -1102,6 +1298,18 @@ class Rule(RuleFactory):
     ) -> bool:
         """Check if the dict of values has enough data for url generation.
 
+        :internal:
+        """
+        return self._suitable_for_keys(values, method) and self._defaults_match(
+            values
+        )
+
+    def _suitable_for_keys(
+        self, keys: Union[Dict[str, Any], AbstractSet[str]], method: Optional[str]
+    ) -> bool:
+        """The part of :meth:`suitable_for` that only depends on the
+        method and the names of the values, not on the values.
+
         :internal:
         """
         # if a method was given explicitly and that method is not supported
@@ -1118,13 +1326,20 @@ class Rule(RuleFactory):
         # all arguments required must be either in the defaults dict or
         # the value dictionary otherwise it's not suitable
         for key in self.arguments:
-            if key not in defaults and key not in values:
+            if key not in defaults and key not in keys:
                 return False
 
+        return True
+
+    def _defaults_match(self, values: Dict[str, Any]) -> bool:
+        """The part of :meth:`suitable_for` that checks the values.
+
+        :internal:
+        """
         # in case defaults are given we ensure that either the value was
         # skipped or the value is the same as the default value.
-        if defaults:
-            for key, value in defaults.items():
+        if self.defaults:
+            for key, value in self.defaults.items():
                 if key in values and value != values[key]:
                     return False
 
@@ -1199,15 +1414,134 @@ class Rule(RuleFactory):
         return f"<{type(self).__name__} {parts!r}{methods} -> {self.endpoint}>"
 
 
+#: escapes that may match a slash, either a class or an escaped code
+_slash_escapes = frozenset("DSWxuUN01234567/")
+
+
+def _class_matches_slash(items: str) -> bool:
+    """Check if the contents of a non-negated character class may
+    match a slash, literally, by a range, or by an escape.
+
+    :internal:
+    """
+    i = 0
+    chars = []
+
+    while i < len(items):
+        char = items[i]
+
+        if char == "\\":
+            if items[i + 1 : i + 2] in _slash_escapes:
+                return True
+
+            char = items[i : i + 2]
+            i += 2
+        else:
+            i += 1
+
+        if (
+            char == "-"
+            and chars
+            and i < len(items)
+            and len(chars[-1]) == 1
+            and items[i] != "\\"
+            and chars[-1] <= "/" <= items[i]
+        ):
+            return True
+
+        chars.append(char)
+
+    return "/" in chars
+
+
+def _matches_slash(regex: str) -> bool:
+    """Check if a converter regex may match a slash. Returns ``True``
+    unless it's certain it can't, so only classes such as ``[^/]``,
+    classes without a slash, and literals other than a slash are
+    allowed. ``.``, ``\\S``, ``\\W``, ``\\D``, escaped codes, and
+    negated classes that don't exclude the slash may match one.
+
+    :internal:
+    """
+    i = 0
+
+    while i < len(regex):
+        char = regex[i]
+
+        if char == "\\":
+            if regex[i + 1 : i + 2] in _slash_escapes:
+                return True
+
+            i += 2
+        elif char == "[":
+            # a "]" right after the opening bracket is part of the class
+            end = regex.find("]", i + (3 if regex[i + 1 : i + 2] == "^" else 2))
+
+            while end != -1 and regex[end - 1] == "\\":
+                end = regex.find("]", end + 1)
+
+            if end == -1:
+                return True
+
+            items = regex[i + 1 : end]
+
+            if items[:1] == "^":
+                if "/" not in items:
+                    return True
+            elif _class_matches_slash(items):
+                return True
+
+            i = end + 1
+        elif char in "./":
+            return True
+        else:
+            i += 1
+
+    return False
+
+
 class BaseConverter:
-    """Base class for all converters."""
+    """Base class for all converters.
+
+    .. versionchanged:: 2.0
+        Added ``part_isolating`` and :meth:`part_matcher`.
+    """
 
     regex = "[^/]+"
     weight = 100
+    #: Whether the converter only ever matches within a single path
+    #: segment. The :class:`StateMachineMatcher` relies on this to split
+    #: paths on slashes. If not set by a subclass, it is disabled when
+    #: the ``regex`` may match a slash.
+    part_isolating = True
+    _part_isolating_declared = False
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)  # type: ignore
+
+        if "part_isolating" in cls.__dict__:
+            cls._part_isolating_declared = True
+        elif "regex" in cls.__dict__:
+            cls.part_isolating = not _matches_slash(cls.regex)
+            cls._part_isolating_declared = False
 
     def __init__(self, map: "Map") -> None:
         self.map = map
 
+    def part_matcher(self) -> Optional[Callable[[str], bool]]:
+        """Get a function that checks if a whole path segment, which
+        doesn't contain a slash, matches :attr:`regex`, without using
+        the regex. The :class:`StateMachineMatcher` uses it to test
+        segments that consist of only this converter. Return ``None``
+        to use the regex.
+
+        The function must give the same result as matching the regex,
+        :meth:`to_python` still validates the value afterwards.
+
+        .. versionadded:: 2.0
+        """
+        return None
+
     def to_python(self, value: str) -> str:
         return value
 
@@ -1244,14 +1578,35 @@ class UnicodeConverter(BaseConverter):
     ) -> None:
         BaseConverter.__init__(self, map)
         if length is not None:
+            minlength = maxlength = int(length)
             length = f"{{{int(length)}}}"  # type: ignore
         else:
+            minlength = int(minlength)
             if maxlength is None:
                 maxlength = ""  # type: ignore
             else:
                 maxlength = int(maxlength)
-            length = f"{{{int(minlength)},{maxlength}}}"  # type: ignore
+            length = f"{{{minlength},{maxlength}}}"  # type: ignore
         self.regex = f"[^/]{length}"
+        self._lengths = (self.regex, minlength, maxlength if maxlength != "" else None)
+
+    def part_matcher(self) -> Optional[Callable[[str], bool]]:
+        # A subclass may have changed the regex, or not called
+        # __init__, use the regex then.
+        lengths = getattr(self, "_lengths", None)
+
+        if lengths is None or self.regex != lengths[0]:
+            return None
+
+        _, minlength, maxlength = lengths
+
+        if maxlength is None:
+            if minlength == 1:
+                return bool
+
+            return lambda value: len(value) >= minlength
+
+        return lambda value: minlength <= len(value) <= maxlength
 
 
 class AnyConverter(BaseConverter):
@@ -1268,6 +1623,16 @@ class AnyConverter(BaseConverter):
     def __init__(self, map: "Map", *items) -> None:
         BaseConverter.__init__(self, map)
         self.regex = f"(?:{'|'.join([re.escape(x) for x in items])})"
+        self.part_isolating = not any("/" in x for x in items)
+        self._items = (self.regex, frozenset(items))
+
+    def part_matcher(self) -> Optional[Callable[[str], bool]]:
+        items = getattr(self, "_items", None)
+
+        if items is None or self.regex != items[0]:
+            return None
+
+        return items[1].__contains__
 
 
 class PathConverter(BaseConverter):
@@ -1282,6 +1647,7 @@ class PathConverter(BaseConverter):
 
     regex = "[^/].*?"
     weight = 200
+    part_isolating = False
 
 
 class NumberConverter(BaseConverter):
@@ -1354,6 +1720,14 @@ class IntegerConverter(NumberConverter):
     regex = r"\d+"
     num_convert = int
 
+    def part_matcher(self) -> Optional[Callable[[str], bool]]:
+        # str.isdecimal accepts the same characters as \d, signed
+        # values and subclasses with a different regex use the regex
+        if self.regex == IntegerConverter.regex:
+            return str.isdecimal
+
+        return None
+
 
 class FloatConverter(NumberConverter):
     """This converter only accepts floating point values::
@@ -1415,120 +1789,1175 @@ DEFAULT_CONVERTERS = {
     "float": FloatConverter,
     "uuid": UUIDConverter,
 }
+_builtin_converters = frozenset(DEFAULT_CONVERTERS.values())
 
 
-class Map:
-    """The map class stores all the URL rules and some configuration
-    parameters.  Some of the configuration values are only stored on the
-    `Map` instance since those affect all rules, others are just defaults
-    and can be overridden for each rule.  Note that you have to specify all
-    arguments besides the `rules` as keyword arguments!
+class CacheInfo(NamedTuple):
+    """Statistics of a routing cache, returned by
+    :meth:`Map.match_cache_info` and :meth:`Map.build_cache_info`.
+    Works like the result of
+    :func:`functools.lru_cache`'s ``cache_info()``.
 
-    :param rules: sequence of url rules for this map.
-    :param default_subdomain: The default subdomain for rules without a
-                              subdomain defined.
-    :param charset: charset of the url. defaults to ``"utf-8"``
-    :param strict_slashes: If a rule ends with a slash but the matched
-        URL does not, redirect to the URL with a trailing slash.
-    :param merge_slashes: Merge consecutive slashes when matching or
-        building URLs. Matches will redirect to the normalized URL.
-        Slashes in variable parts are not merged.
-    :param redirect_defaults: This will redirect to the default rule if it
-                              wasn't visited that way. This helps creating
-                              unique URLs.
-    :param converters: A dict of converters that adds additional converters
-                       to the list of converters. If you redefine one
-                       converter this will override the original one.
-    :param sort_parameters: If set to `True` the url parameters are sorted.
-                            See `url_encode` for more details.
-    :param sort_key: The sort key function for `url_encode`.
-    :param encoding_errors: the error method to use for decoding
-    :param host_matching: if set to `True` it enables the host matching
-                          feature and disables the subdomain one.  If
-                          enabled the `host` parameter to rules is used
-                          instead of the `subdomain` one.
+    .. versionadded:: 2.0
+    """
 
-    .. versionchanged:: 1.0
-        If ``url_scheme`` is ``ws`` or ``wss``, only WebSocket rules
-        will match.
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
 
-    .. versionchanged:: 1.0
-        Added ``merge_slashes``.
 
-    .. versionchanged:: 0.7
-        Added ``encoding_errors`` and ``host_matching``.
+class _LRUCache:
+    """A thread safe mapping that discards the least recently used
+    items once it holds ``maxsize`` items, and counts hits and misses.
 
-    .. versionchanged:: 0.5
-        Added ``sort_parameters`` and ``sort_key``.
+    :internal:
     """
 
-    #: A dict of default converters to be used.
-    default_converters = ImmutableDict(DEFAULT_CONVERTERS)
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        #: Incremented by :meth:`clear`, so results computed before the
+        #: cache was cleared can be discarded by :meth:`set`.
+        self.generation = 0
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: Hashable) -> Any:
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, generation: int) -> None:
+        with self._lock:
+            if generation != self.generation:
+                return
 
-    #: The type of lock to use when updating.
-    #:
-    #: .. versionadded:: 1.0
-    lock_class = Lock
+            self._data[key] = value
+            self._data.move_to_end(key)
 
-    def __init__(
-        self,
-        rules: Optional[Union[List[RuleTemplateFactory], List[Rule]]] = None,
-        default_subdomain: str = "",
-        charset: str = "utf-8",
-        strict_slashes: bool = True,
-        merge_slashes: bool = True,
-        redirect_defaults: bool = True,
-        converters: None = None,
-        sort_parameters: bool = False,
-        sort_key: Optional[Callable] = None,
-        encoding_errors: str = "replace",
-        host_matching: bool = False,
-    ) -> None:
-        self._rules: List[Any] = []
-        self._rules_by_endpoint: Dict[Hashable, Any] = {}
-        self._remap = True
-        self._remap_lock = self.lock_class()
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
 
-        self.default_subdomain = default_subdomain
-        self.charset = charset
-        self.encoding_errors = encoding_errors
-        self.strict_slashes = strict_slashes
-        self.merge_slashes = merge_slashes
-        self.redirect_defaults = redirect_defaults
-        self.host_matching = host_matching
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.generation += 1
 
-        self.converters = self.default_converters.copy()
-        if converters:
-            self.converters.update(converters)
+    def info(self) -> CacheInfo:
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize, len(self._data))
 
-        self.sort_parameters = sort_parameters
-        self.sort_key = sort_key
 
-        for rulefactory in rules or ():
-            self.add(rulefactory)
+class RoutingStats:
+    """Counts how often each rule of a :class:`Map` matches, how many
+    rules are tried to find a match, and how long matching and building
+    URLs takes. Pass ``collect_stats=True`` to the map to create an
+    instance of :attr:`Map.stats_class` as :attr:`Map.stats`.
 
-    def is_endpoint_expecting(self, endpoint, *arguments):
-        """Iterate over all rules and check if the endpoint expects
-        the arguments provided.  This is for example useful if you have
-        some URLs that expect a language code and others that do not and
-        you want to wrap the builder a bit so that the current language
-        code is automatically added if not provided but endpoints expect
-        it.
+    :meth:`as_dict` exports the statistics as plain data, including
+    the rules that never matched. To send each measurement somewhere
+    else, override :meth:`record_match` and :meth:`record_build` in a
+    subclass and set it as the map's :attr:`~Map.stats_class`.
 
-        :param endpoint: the endpoint to check.
-        :param arguments: this function accepts one or more arguments
-                          as positional arguments.  Each one of them is
-                          checked.
-        """
-        self.update()
-        arguments = set(arguments)
-        for rule in self._rules_by_endpoint[endpoint]:
-            if arguments.issubset(rule.arguments):
-                return True
-        return False
+    :param map: The map to collect statistics for.
 
-    def iter_rules(self, endpoint=None):
-        """Iterate over all rules or the rules of an endpoint.
+    .. versionadded:: 2.0
+    """
+
+    #: Upper bounds in seconds of the buckets of the latency
+    #: histograms. Longer times are counted in an extra bucket.
+    buckets: Tuple[float, ...] = (
+        0.00001,
+        0.000025,
+        0.00005,
+        0.0001,
+        0.00025,
+        0.0005,
+        0.001,
+        0.0025,
+        0.005,
+        0.01,
+    )
+
+    def __init__(self, map: "Map") -> None:
+        self.map = map
+        self._lock = Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self) -> None:
+        """Set all counts back to zero."""
+        with self._lock:
+            # id(rule) -> [rule, hits, tried], the rule keeps the id valid
+            self._rules: Dict[int, List[Any]] = {}
+            self._outcomes: Dict[str, int] = {}
+            self._tried_total = 0
+            self._tried_max = 0
+            self._match_times = [0] * (len(self.buckets) + 1)
+            self._match_seconds = 0.0
+            self._builds = 0
+            self._build_errors = 0
+            self._build_times = [0] * (len(self.buckets) + 1)
+            self._build_seconds = 0.0
+
+    def _start_match(self) -> None:
+        self._local.tried = []
+
+    def _rule_tried(self, rule: "Rule") -> None:
+        tried = getattr(self._local, "tried", None)
+
+        if tried is not None:
+            tried.append(rule)
+
+    def _end_match(self) -> List["Rule"]:
+        tried = self._local.tried
+        self._local.tried = None
+        return tried
+
+    def record_match(
+        self,
+        rule: Optional["Rule"],
+        outcome: str,
+        tried: List["Rule"],
+        seconds: float,
+    ) -> None:
+        """Called after :meth:`MapAdapter.match` with the result.
+
+        :param rule: The rule that matched. ``None`` if no rule matched,
+            or if matching was redirected before the rule was known.
+        :param outcome: ``"match"``, ``"redirect"``, ``"not_found"``,
+            ``"method_not_allowed"``, ``"websocket_mismatch"``, or
+            ``"error"``.
+        :param tried: The rules whose regular expression was tried on
+            its own, in order. Doesn't include rules tried as part of a
+            combined expression, or results from the match cache.
+        :param seconds: How long matching took.
+        """
+        index = bisect.bisect_left(self.buckets, seconds)
+
+        with self._lock:
+            self._outcomes[outcome] = self._outcomes.get(outcome, 0) + 1
+            self._tried_total += len(tried)
+            self._tried_max = max(self._tried_max, len(tried))
+            self._match_times[index] += 1
+            self._match_seconds += seconds
+
+            for other in tried:
+                self._rule_counts(other)[2] += 1
+
+            if rule is not None:
+                self._rule_counts(rule)[1] += 1
+
+    def _rule_counts(self, rule: "Rule") -> List[Any]:
+        counts = self._rules.get(id(rule))
+
+        if counts is None:
+            counts = self._rules[id(rule)] = [rule, 0, 0]
+
+        return counts
+
+    def record_build(self, endpoint: Any, success: bool, seconds: float) -> None:
+        """Called after building a URL with :meth:`MapAdapter.build` or
+        :meth:`MapAdapter.build_many`.
+
+        :param endpoint: The endpoint of the URL.
+        :param success: ``False`` if :exc:`BuildError` was raised.
+        :param seconds: How long building took.
+        """
+        index = bisect.bisect_left(self.buckets, seconds)
+
+        with self._lock:
+            self._builds += 1
+            self._build_errors += not success
+            self._build_times[index] += 1
+            self._build_seconds += seconds
+
+    def _histogram(self, counts: List[int], seconds: float) -> Dict[str, Any]:
+        bounds: List[Any] = [*self.buckets, None]
+        return {
+            "buckets": [[bound, count] for bound, count in zip(bounds, counts)],
+            "count": sum(counts),
+            "sum": seconds,
+        }
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Export the statistics as a dict of plain data.
+
+        ``"rules"`` has an item for each rule of the map in match order,
+        with the number of ``"hits"`` and how often it was ``"tried"``.
+        Rules that never match and rules that are often tried show up
+        here. The latency histograms under ``"seconds"`` list the
+        number of times in each bucket with its upper bound, ``None``
+        for the last one.
+        """
+        self.map.update()
+        domain = "host" if self.map.host_matching else "subdomain"
+
+        with self._lock:
+            matches = sum(self._outcomes.values())
+            rules = []
+
+            for rule in self.map._snapshot.rules:
+                _, hits, tried = self._rules.get(id(rule), (rule, 0, 0))
+                rules.append(
+                    {
+                        "rule": rule.rule,
+                        "endpoint": rule.endpoint,
+                        domain: getattr(rule, domain),
+                        "methods": sorted(rule.methods) if rule.methods else None,
+                        "hits": hits,
+                        "tried": tried,
+                    }
+                )
+
+            return {
+                "match": {
+                    "count": matches,
+                    "outcomes": dict(self._outcomes),
+                    "rules_tried": {
+                        "total": self._tried_total,
+                        "max": self._tried_max,
+                    },
+                    "seconds": self._histogram(
+                        self._match_times, self._match_seconds
+                    ),
+                },
+                "build": {
+                    "count": self._builds,
+                    "errors": self._build_errors,
+                    "seconds": self._histogram(
+                        self._build_times, self._build_seconds
+                    ),
+                },
+                "rules": rules,
+            }
+
+
+class RuleMatcher:
+    """Base class for the engines a :class:`Map` uses to find the rules
+    that match a path. A new matcher is created from the sorted rules
+    every time the map is updated, so a matcher never has to handle
+    rules being added.
+
+    Subclasses have to implement :meth:`match`. Deciding which of the
+    matching rules applies to the request method and WebSocket state,
+    and turning the outcome into redirects or errors, is done by the
+    :class:`MapAdapter`.
+
+    :param rules: the rules of the map, in the order of their
+        :meth:`Rule.match_compare_key`.
+
+    .. versionadded:: 2.0
+    """
+
+    def __init__(self, rules: List["Rule"]) -> None:
+        self.rules = rules
+
+    def match(
+        self, domain_part: str, path_part: str, method: str
+    ) -> Iterator[Tuple["Rule", Dict[str, Any]]]:
+        """Yield ``(rule, values)`` for every rule that matches the
+        domain and path, in the same order the rules were given. Any
+        :exc:`RequestPath` or :exc:`RequestAliasRedirect` raised by
+        :meth:`Rule.match` is passed on.
+
+        :param domain_part: the subdomain, or the host if the map uses
+            host matching.
+        :param path_part: the path to match, starting with a slash.
+        :param method: the request method.
+        """
+        raise NotImplementedError()
+
+
+def _static_rule_key(rule: "Rule") -> Optional[Tuple[str, str]]:
+    """Get the ``(domain_part, path)`` a rule without converters
+    matches, without the trailing slash of branch URLs. Returns ``None``
+    if the rule has converters.
+
+    :internal:
+    """
+    parts: List[str] = []
+
+    for is_dynamic, data in rule._trace if rule.is_leaf else rule._trace[:-1]:
+        if is_dynamic:
+            return None
+
+        parts.append(data)
+
+    domain_part, _, path = "".join(parts).partition("|")
+    return domain_part, path
+
+
+def _static_rule_domain(rule: "Rule") -> Optional[str]:
+    """Get the domain part a rule matches, or ``None`` if the domain
+    part has converters.
+
+    :internal:
+    """
+    parts: List[str] = []
+
+    for is_dynamic, data in rule._trace:
+        if is_dynamic:
+            return None
+
+        if data == "|":
+            break
+
+        parts.append(data)
+
+    return "".join(parts)
+
+
+class TableMatcher(RuleMatcher):
+    """Tries the regular expression of every rule in order. This is the
+    default matcher.
+
+    Rules without converters are indexed by their domain part and path,
+    so they are only tried for the path they can match. The other rules
+    are grouped by their subdomain or host, so they are only tried for
+    their domain. Rules with converters in the subdomain or host are
+    tried for every domain.
+
+    .. versionadded:: 2.0
+    """
+
+    def __init__(self, rules: List["Rule"]) -> None:
+        super().__init__(rules)
+        # rules grouped by domain part, and the rules with a dynamic
+        # domain part, which are tried for every domain
+        self._all: Dict[str, List[Tuple[int, "Rule"]]] = {}
+        self._any_domain: List[Tuple[int, "Rule"]] = []
+        self._static: Dict[Tuple[str, str], List[Tuple[int, "Rule"]]] = {}
+        self._dynamic: Dict[str, List[Tuple[int, "Rule"]]] = {}
+
+        for index, rule in enumerate(rules):
+            if rule.build_only:
+                continue
+
+            item = (index, rule)
+            domain_part = _static_rule_domain(rule)
+
+            if domain_part is None:
+                self._any_domain.append(item)
+                continue
+
+            self._all.setdefault(domain_part, []).append(item)
+            key = _static_rule_key(rule)
+
+            if key is None:
+                self._dynamic.setdefault(domain_part, []).append(item)
+                continue
+
+            self._static.setdefault(key, []).append(item)
+
+            # branches and rules without strict slashes also match with
+            # a trailing slash
+            if not (rule.is_leaf and rule.strict_slashes):
+                self._static.setdefault((domain_part, f"{key[1]}/"), []).append(item)
+
+    def match(
+        self, domain_part: str, path_part: str, method: str
+    ) -> Iterator[Tuple["Rule", Dict[str, Any]]]:
+        path = f"{domain_part}|{path_part}"
+
+        if "//" in path_part:
+            # merged slashes can match any static rule
+            groups = [self._all.get(domain_part), self._any_domain]
+        else:
+            # a rule with converters may still take precedence
+            groups = [
+                self._static.get((domain_part, path_part)),
+                self._dynamic.get(domain_part),
+                self._any_domain,
+            ]
+
+        groups = [group for group in groups if group]
+        candidates: Iterable[Tuple[int, "Rule"]]
+
+        if len(groups) == 1:
+            candidates = groups[0]
+        else:
+            candidates = heapq.merge(*groups)
+
+        for _, rule in candidates:
+            rv = rule.match(path, method)
+
+            if rv is not None:
+                yield rule, rv
+
+
+class _MatcherState:
+    """A node in the tree of a :class:`StateMachineMatcher`.
+
+    :internal:
+    """
+
+    __slots__ = ("static", "dynamic", "rules")
+
+    def __init__(self) -> None:
+        self.static: Dict[str, "_MatcherState"] = {}
+        self.dynamic: Dict[str, Tuple[Callable, "_MatcherState"]] = {}
+        self.rules: List[Tuple[int, "Rule"]] = []
+
+
+def _rule_segments(rule: "Rule") -> Optional[List[List[Any]]]:
+    """Split a bound rule into its domain part followed by its path
+    segments, without the trailing slash of branch URLs. Each segment is
+    a list of static strings and converters. Returns ``None`` if the
+    rule can't be split on slashes, because a converter can match a
+    slash or consecutive slashes are significant.
+
+    :internal:
+    """
+    segments: List[List[Any]] = [[]]
+    in_path = False
+    trace = rule._trace if rule.is_leaf else rule._trace[:-1]
+
+    for is_dynamic, data in trace:
+        if is_dynamic:
+            converter = rule._converters[data]
+
+            if not converter.part_isolating or _matches_slash(converter.regex):
+                return None
+
+            segments[-1].append(converter)
+        elif not in_path and data == "|":
+            in_path = True
+        elif data.startswith("/"):
+            if data != "/" or not in_path:
+                return None
+
+            segments.append([])
+        else:
+            segments[-1].append(data)
+
+    return segments
+
+
+def _segment_regex(parts: List[Any]) -> str:
+    """Get the regular expression matching a segment returned by
+    :func:`_rule_segments`.
+
+    :internal:
+    """
+    return "".join(
+        re.escape(part) if isinstance(part, str) else f"(?:{part.regex})"
+        for part in parts
+    )
+
+
+def _static_prefix(rule: "Rule") -> str:
+    """Get the static text every path the rule matches starts with,
+    including the domain part and the ``|`` separator.
+
+    :internal:
+    """
+    parts = []
+
+    for is_dynamic, data in rule._trace:
+        if is_dynamic:
+            break
+
+        parts.append(data)
+
+    return "".join(parts)
+
+
+def _declared_segments(rule: "Rule") -> Optional[List[List[Any]]]:
+    """Like :func:`_rule_segments`, but returns ``None`` if a converter
+    isn't built in and didn't set ``part_isolating`` itself, because
+    the value inferred from its regex may be wrong.
+
+    :internal:
+    """
+    for converter in rule._converters.values():
+        if not (
+            type(converter) in _builtin_converters
+            or converter._part_isolating_declared
+            or "part_isolating" in vars(converter)
+        ):
+            return None
+
+    return _rule_segments(rule)
+
+
+def _segments_overlap(a: List[List[Any]], b: List[List[Any]]) -> bool:
+    """Check if two rules split by :func:`_rule_segments` may match the
+    same path. Returns ``True`` unless it's certain they can't.
+
+    :internal:
+    """
+    if len(a) != len(b):
+        if len(a) > len(b):
+            a, b = b, a
+
+        # A trailing slash after the shorter rule is an empty last
+        # segment for the longer rule.
+        if len(b) - len(a) != 1 or re.fullmatch(_segment_regex(b[-1]), "") is None:
+            return False
+
+        b = b[:-1]
+
+    for a_parts, b_parts in zip(a, b):
+        a_static = all(isinstance(part, str) for part in a_parts)
+        b_static = all(isinstance(part, str) for part in b_parts)
+
+        if a_static and b_static:
+            if "".join(a_parts) != "".join(b_parts):
+                return False
+        elif a_static or b_static:
+            static, dynamic = (a_parts, b_parts) if a_static else (b_parts, a_parts)
+
+            if re.fullmatch(_segment_regex(dynamic), "".join(static)) is None:
+                return False
+
+    return True
+
+
+class StateMachineMatcher(RuleMatcher):
+    """Compiles all rules into a tree with one level per path segment,
+    with the domain part as the first level. Static segments are
+    dictionary lookups, segments containing converters are tested
+    against a regular expression built from the converters. Segments
+    that are a single converter are tested with its
+    :meth:`~BaseConverter.part_matcher` instead if it has one, such as
+    ``str.isdecimal`` for ``int``.
+
+    A path only visits the branches its segments fit into, which leaves
+    the few rules whose regular expression can match at all. Those are
+    tried in their original order, so the precedence, redirects and
+    converter validation are the same as with the :class:`TableMatcher`.
+    If every converter of a rule is a whole segment, its values are
+    taken from the segments the path reached the rule with, instead of
+    running the rule's regular expression again.
+    Rules with converters that match slashes (like ``path``) can't be
+    split into segments and are always tried, as are all rules if the
+    path contains consecutive slashes.
+
+    .. code-block:: python
+
+        url_map = Map(rules, matcher_class=StateMachineMatcher)
+
+    .. versionadded:: 2.0
+    """
+
+    def __init__(self, rules: List["Rule"]) -> None:
+        super().__init__(rules)
+        self._root = _MatcherState()
+        self._all: List[Tuple[int, "Rule"]] = []
+        self._fallback: List[Tuple[int, "Rule"]] = []
+        # maps the index of a rule to the positions of its converters'
+        # segments, if the values can be taken from the segments
+        self._direct: Dict[int, List[Tuple[int, str]]] = {}
+
+        for index, rule in enumerate(rules):
+            if rule.build_only:
+                continue
+
+            item = (index, rule)
+            self._all.append(item)
+            segments = _rule_segments(rule)
+
+            if segments is None:
+                self._fallback.append(item)
+                continue
+
+            self._add_direct(index, rule, segments)
+            state = self._root
+
+            for parts in segments:
+                if all(isinstance(part, str) for part in parts):
+                    state = state.static.setdefault("".join(parts), _MatcherState())
+                    continue
+
+                regex = _segment_regex(parts)
+
+                if regex not in state.dynamic:
+                    test = None
+
+                    if len(parts) == 1:
+                        test = parts[0].part_matcher()
+
+                    if test is None:
+                        test = re.compile(regex).fullmatch
+
+                    state.dynamic[regex] = (test, _MatcherState())
+
+                state = state.dynamic[regex][1]
+
+            state.rules.append(item)
+
+    def _add_direct(self, index: int, rule: "Rule", segments: List[List[Any]]) -> None:
+        """Record where the values of the rule are if every converter is
+        a whole segment. A path that reaches the rule has matched each
+        of those segments against the converter's regex already. Rules
+        that have a slash suffix or override :meth:`Rule.match` use the
+        regex.
+
+        :internal:
+        """
+        if (
+            not rule.is_leaf
+            or not rule.strict_slashes
+            or "match" in vars(rule)
+            or type(rule).match is not Rule.match
+        ):
+            return
+
+        names = {id(converter): name for name, converter in rule._converters.items()}
+        direct = []
+
+        for position, parts in enumerate(segments):
+            if all(isinstance(part, str) for part in parts):
+                continue
+
+            if len(parts) != 1:
+                return
+
+            direct.append((position, names[id(parts[0])]))
+
+        self._direct[index] = direct
+
+    def _walk(self, parts: List[str]) -> List[Tuple[int, "Rule"]]:
+        found: List[Tuple[int, "Rule"]] = []
+        stack = [(self._root, 0)]
+        end = len(parts)
+
+        while stack:
+            state, index = stack.pop()
+
+            if index == end:
+                found.extend(state.rules)
+                continue
+
+            part = parts[index]
+            next_state = state.static.get(part)
+
+            if next_state is not None:
+                stack.append((next_state, index + 1))
+
+            for test, next_state in state.dynamic.values():
+                if test(part):
+                    stack.append((next_state, index + 1))
+
+        return found
+
+    def match(
+        self, domain_part: str, path_part: str, method: str
+    ) -> Iterator[Tuple["Rule", Dict[str, Any]]]:
+        path = f"{domain_part}|{path_part}"
+        exact: AbstractSet[int] = frozenset()
+
+        if "//" in path_part:
+            candidates = self._all
+        else:
+            parts = [domain_part]
+            parts.extend(path_part.split("/")[1:])
+            found = self._walk(parts)
+            exact = {index for index, _ in found}
+
+            # A trailing slash may be the slash of a branch URL or an
+            # empty last segment, try both.
+            if len(parts) > 1 and not parts[-1]:
+                found.extend(self._walk(parts[:-1]))
+
+            found.extend(self._fallback)
+            candidates = sorted(dict(found).items())
+
+        for index, rule in candidates:
+            direct = self._direct.get(index) if index in exact else None
+
+            if direct is None:
+                rv = rule.match(path, method)
+            else:
+                groups = {name: parts[position] for position, name in direct}
+                rv = rule._match_groups(groups, path, method)
+
+            if rv is not None:
+                yield rule, rv
+
+
+class CombinedRegexMatcher(RuleMatcher):
+    """Combines the regular expressions of the rules into alternations,
+    so a single call to the regex engine tries a whole batch of rules in
+    C. The first alternative that matches identifies the rule, and only
+    its converters are run on the matched groups.
+
+    If the rule rejects the match, for example because a converter
+    raises :exc:`ValidationError` or the method doesn't match, the rest
+    of its batch is tried rule by rule before moving on to the next
+    batch, so the precedence is the same as with the
+    :class:`TableMatcher`.
+
+    Only use it for maps with many rules with converters, where it is
+    faster than the :class:`TableMatcher`. The
+    :class:`StateMachineMatcher` is faster for most of those too, unless
+    many rules have converters that match slashes, such as ``path``.
+    Static paths aren't looked up in a table, so they match about ten
+    times slower than with the :class:`TableMatcher`. Paths that don't
+    match any rule go through every batch and are slower still. Adding
+    rules compiles the batches that changed again, which makes
+    :meth:`Map.update` slower than with the :class:`TableMatcher`.
+
+    .. code-block:: python
+
+        url_map = Map(rules, matcher_class=CombinedRegexMatcher)
+
+    .. versionadded:: 2.0
+    """
+
+    #: The average number of rules combined into one regular
+    #: expression. Python's regex engine slows down with the number of
+    #: groups in an expression, so a single alternation of thousands of
+    #: rules is slower than trying them one by one.
+    batch_size = 32
+
+    def __init__(self, rules: List["Rule"]) -> None:
+        super().__init__(rules)
+        self._batches: List[Tuple[Pattern, List[Tuple["Rule", Dict[str, str]]]]] = []
+        batch: List["Rule"] = []
+
+        for rule in rules:
+            if rule.build_only:
+                continue
+
+            batch.append(rule)
+
+            # A batch ends after rules picked by the hash of their
+            # pattern, instead of after a fixed number of rules, so
+            # adding a rule only changes the batch it's added to.
+            if (
+                len(batch) >= 4 * self.batch_size
+                or hash(rule._regex_pattern) % self.batch_size == 0
+            ):
+                self._add_batch(batch)
+                batch = []
+
+        if batch:
+            self._add_batch(batch)
+
+    def _add_batch(self, rules: List["Rule"]) -> None:
+        alternatives = []
+        entries = []
+
+        for index, rule in enumerate(rules):
+            pattern = rule._regex_pattern
+            names = {}
+
+            for name in (*rule._converters, "__suffix__"):
+                if f"(?P<{name}>" not in pattern:
+                    continue
+
+                group = f"_{index}_{name}"
+                pattern = pattern.replace(f"(?P<{name}>", f"(?P<{group}>", 1)
+                names[group] = name
+
+            alternatives.append(f"(?P<_{index}>{pattern})")
+            entries.append((rule, names))
+
+        pattern = "|".join(alternatives)
+        cached = rules[0]._combined_batch
+
+        # the map's previous matcher compiled the same batch
+        if cached is not None and cached[0] == pattern:
+            regex = cached[1]
+        else:
+            regex = re.compile(pattern)
+            rules[0]._combined_batch = (pattern, regex)
+
+        self._batches.append((regex, entries))
+
+    def match(
+        self, domain_part: str, path_part: str, method: str
+    ) -> Iterator[Tuple["Rule", Dict[str, Any]]]:
+        path = f"{domain_part}|{path_part}"
+
+        for regex, entries in self._batches:
+            m = regex.match(path)
+
+            if m is None:
+                continue
+
+            # the group of the whole alternative closes last
+            index = int(m.lastgroup[1:])
+            rule, names = entries[index]
+            groups = {name: m.group(group) for group, name in names.items()}
+            rv = rule._match_groups(groups, path, method)
+
+            if rv is not None:
+                yield rule, rv
+
+            for rule, _ in entries[index + 1 :]:
+                rv = rule.match(path, method)
+
+                if rv is not None:
+                    yield rule, rv
+
+
+class _MapSnapshot:
+    """The sorted rules of a :class:`Map` and everything built from
+    them for matching and building, at one point in time. The map
+    replaces its snapshot when rules were added, it's never changed
+    otherwise, so adapters can use it without locking while rules are
+    added. The lookup tables are filled in on demand.
+
+    :internal:
+    """
+
+    __slots__ = (
+        "version",
+        "rules",
+        "rules_by_endpoint",
+        "matcher",
+        "build_dispatch",
+        "rule_patterns",
+        "same_pattern",
+        "endpoint_ngrams",
+    )
+
+    def __init__(
+        self,
+        version: int,
+        rules: List["Rule"],
+        rules_by_endpoint: Dict[Hashable, List["Rule"]],
+        matcher_class: Type[RuleMatcher],
+    ) -> None:
+        #: Incremented for each snapshot of a map, part of cache keys.
+        self.version = version
+        self.rules = rules
+        self.rules_by_endpoint = rules_by_endpoint
+        self.matcher = matcher_class(rules)
+        #: endpoint -> (names of all arguments, {(method, present
+        #: argument names): rules suitable for those names})
+        self.build_dispatch: Dict[
+            Hashable, Tuple[FrozenSet[str], Dict[Tuple[Any, ...], List["Rule"]]]
+        ] = {}
+        #: (rule, pattern key, static prefix, segments) for each rule,
+        #: and id(rule) -> result of same_pattern_rules
+        self.rule_patterns: Optional[List[Tuple["Rule", Any, str, Any]]] = None
+        self.same_pattern: Dict[int, Optional[List["Rule"]]] = {}
+        #: trigram -> endpoint names containing it, for suggestions
+        self.endpoint_ngrams: Optional[Dict[str, List[str]]] = None
+
+    def same_pattern_rules(self, rule: "Rule") -> Optional[List[Rule]]:
+        """Get the rules that match exactly the same paths as the given
+        rule, because they have the same pattern and converters, in
+        match order. Returns ``None`` if rules with a different pattern
+        may also match some of those paths. The result is remembered
+        for the snapshot.
+
+        Once a rule matched, this tells if the remaining matches, which
+        are needed to tell which methods are allowed, can only be rules
+        with the same pattern.
+
+        :internal:
+        """
+        same_pattern = self.same_pattern
+        key = id(rule)
+
+        if key in same_pattern:
+            return same_pattern[key]
+
+        patterns = self.rule_patterns
+
+        if patterns is None:
+            patterns = self.rule_patterns = [
+                (
+                    other,
+                    (
+                        other._regex_pattern,
+                        repr(sorted(other._converter_specs.items())),
+                        other.merge_slashes,
+                    ),
+                    _static_prefix(other),
+                    _declared_segments(other),
+                )
+                for other in self.rules
+                if not other.build_only
+            ]
+
+        entry = next((entry for entry in patterns if entry[0] is rule), None)
+
+        if entry is None:
+            return None
+
+        _, pattern, prefix, segments = entry
+        rules: Optional[List["Rule"]] = []
+
+        for other, other_pattern, other_prefix, other_segments in patterns:
+            if other_pattern == pattern:
+                rules.append(other)
+            elif (
+                other_prefix.startswith(prefix) or prefix.startswith(other_prefix)
+            ) and (
+                segments is None
+                or other_segments is None
+                or _segments_overlap(segments, other_segments)
+            ):
+                rules = None
+                break
+
+        same_pattern[key] = rules
+        return rules
+
+    def similar_endpoints(self, endpoint: Any, limit: int = 10) -> List[str]:
+        """Get up to ``limit`` endpoint names that share the most
+        trigrams with the given endpoint, most similar first. If none
+        are similar, returns the first ``limit`` endpoint names, so
+        there is still something to suggest. The index is built the
+        first time it's needed.
+
+        :internal:
+        """
+        index = self.endpoint_ngrams
+
+        if index is None:
+            index = {}
+
+            for name in self.rules_by_endpoint:
+                if isinstance(name, str):
+                    for ngram in _ngrams(name):
+                        index.setdefault(ngram, []).append(name)
+
+            self.endpoint_ngrams = index
+
+        shared: Dict[str, int] = {}
+
+        if isinstance(endpoint, str):
+            for ngram in _ngrams(endpoint):
+                for name in index.get(ngram, ()):
+                    shared[name] = shared.get(name, 0) + 1
+
+        if not shared:
+            names = (name for name in self.rules_by_endpoint if isinstance(name, str))
+            return list(itertools.islice(names, limit))
+
+        return heapq.nlargest(limit, shared, key=shared.__getitem__)
+
+
+def _ngrams(name: str) -> Set[str]:
+    """The trigrams of a name padded with spaces, so that short names
+    and the start and end of names are included.
+
+    :internal:
+    """
+    name = f"  {name} "
+    return {name[i : i + 3] for i in range(len(name) - 2)}
+
+
+def _merge_sorted(
+    items: List[Any], keys: List[Any], new_items: List[Any], key: Callable
+) -> Tuple[List[Any], List[Any]]:
+    """Merge unsorted items into a sorted list of items with a parallel
+    list of their keys. New items are placed after existing items with
+    an equal key, and keep their order among themselves, as a stable
+    sort of all items would.
+
+    :internal:
+    """
+    keys = keys + [key(item) for item in new_items]
+    items = items + new_items
+    # the existing keys are one sorted run, the sort only has to order
+    # the new keys and merge the two runs
+    order = sorted(range(len(keys)), key=keys.__getitem__)
+    return [items[i] for i in order], [keys[i] for i in order]
+
+
+class Map:
+    """The map class stores all the URL rules and some configuration
+    parameters.  Some of the configuration values are only stored on the
+    `Map` instance since those affect all rules, others are just defaults
+    and can be overridden for each rule.  Note that you have to specify all
+    arguments besides the `rules` as keyword arguments!
+
+    :param rules: sequence of url rules for this map.
+    :param default_subdomain: The default subdomain for rules without a
+                              subdomain defined.
+    :param charset: charset of the url. defaults to ``"utf-8"``
+    :param strict_slashes: If a rule ends with a slash but the matched
+        URL does not, redirect to the URL with a trailing slash.
+    :param merge_slashes: Merge consecutive slashes when matching or
+        building URLs. Matches will redirect to the normalized URL.
+        Slashes in variable parts are not merged.
+    :param redirect_defaults: This will redirect to the default rule if it
+                              wasn't visited that way. This helps creating
+                              unique URLs.
+    :param converters: A dict of converters that adds additional converters
+                       to the list of converters. If you redefine one
+                       converter this will override the original one.
+    :param sort_parameters: If set to `True` the url parameters are sorted.
+                            See `url_encode` for more details.
+    :param sort_key: The sort key function for `url_encode`.
+    :param encoding_errors: the error method to use for decoding
+    :param host_matching: if set to `True` it enables the host matching
+                          feature and disables the subdomain one.  If
+                          enabled the `host` parameter to rules is used
+                          instead of the `subdomain` one.
+    :param matcher_class: The :class:`RuleMatcher` used to find the rules
+        matching a path. Defaults to :attr:`matcher_class`.
+    :param match_cache_size: Cache the results of up to this many
+        different matches. The cache is emptied when rules are added.
+        See :meth:`match_cache_info`. Disabled by default.
+    :param build_cache_size: Cache up to this many URLs built by
+        :meth:`MapAdapter.build`. Only URLs built from values that are
+        strings, numbers or UUIDs are cached. The cache is emptied when
+        rules are added. See :meth:`build_cache_info`. Disabled by
+        default.
+    :param compile_cache: Path to a file the compiled rules are loaded
+        from, so they don't have to be compiled again when the process
+        restarts. If any of the ``rules`` had to be compiled, the file is
+        written after they are added. See :meth:`save_compile_cache`.
+    :param lazy_compile: Compile the regular expression of a rule the
+        first time it's matched, and its URL building functions the first
+        time it's built, instead of when it's added. Call
+        :meth:`compile_all` to compile all rules ahead of time.
+    :param collect_stats: Count the matches of each rule and measure
+        matching and building in :attr:`stats`. See
+        :class:`RoutingStats`.
+
+    .. versionchanged:: 2.0
+        Added ``matcher_class``, ``match_cache_size``,
+        ``build_cache_size``, ``compile_cache``, ``lazy_compile``, and
+        ``collect_stats``.
+
+    .. versionchanged:: 1.0
+        If ``url_scheme`` is ``ws`` or ``wss``, only WebSocket rules
+        will match.
+
+    .. versionchanged:: 1.0
+        Added ``merge_slashes``.
+
+    .. versionchanged:: 0.7
+        Added ``encoding_errors`` and ``host_matching``.
+
+    .. versionchanged:: 0.5
+        Added ``sort_parameters`` and ``sort_key``.
+    """
+
+    #: A dict of default converters to be used.
+    default_converters = ImmutableDict(DEFAULT_CONVERTERS)
+
+    #: The type of lock to use when updating.
+    #:
+    #: .. versionadded:: 1.0
+    lock_class = Lock
+
+    #: The :class:`RuleMatcher` used to find the rules matching a path.
+    #:
+    #: .. versionadded:: 2.0
+    matcher_class: Type[RuleMatcher] = TableMatcher
+
+    #: The :class:`RoutingStats` created if ``collect_stats`` is enabled.
+    #:
+    #: .. versionadded:: 2.0
+    stats_class: Type[RoutingStats] = RoutingStats
+
+    def __init__(
+        self,
+        rules: Optional[Union[List[RuleTemplateFactory], List[Rule]]] = None,
+        default_subdomain: str = "",
+        charset: str = "utf-8",
+        strict_slashes: bool = True,
+        merge_slashes: bool = True,
+        redirect_defaults: bool = True,
+        converters: None = None,
+        sort_parameters: bool = False,
+        sort_key: Optional[Callable] = None,
+        encoding_errors: str = "replace",
+        host_matching: bool = False,
+        matcher_class: Optional[Type[RuleMatcher]] = None,
+        match_cache_size: Optional[int] = None,
+        build_cache_size: Optional[int] = None,
+        compile_cache: Optional[str] = None,
+        lazy_compile: bool = False,
+        collect_stats: bool = False,
+    ) -> None:
+        # The rules are kept sorted as they're added, with the sort keys
+        # in parallel lists for bisect.
+        self._rules: List[Any] = []
+        self._rule_keys: List[Any] = []
+        self._rules_by_endpoint: Dict[Hashable, Any] = {}
+        self._endpoint_keys: Dict[Hashable, List[Any]] = {}
+        # what adapters use, replaced by update() after rules were added
+        self._snapshot = _MapSnapshot(0, [], {}, RuleMatcher)
+        self._match_cache: Optional[_LRUCache] = None
+        self._build_cache: Optional[_LRUCache] = None
+        self._compile_cache: Optional[Dict[str, tuple]] = None
+        self._compile_cache_changed = False
+        self._remap = True
+        self._remap_lock = self.lock_class()
+        #: The :class:`RoutingStats` of the map, or ``None`` if
+        #: ``collect_stats`` is disabled.
+        self.stats: Optional[RoutingStats] = None
+
+        if collect_stats:
+            self.stats = self.stats_class(self)
+
+        if match_cache_size:
+            self._match_cache = _LRUCache(match_cache_size)
+
+        if build_cache_size:
+            self._build_cache = _LRUCache(build_cache_size)
+
+        if matcher_class is not None:
+            self.matcher_class = matcher_class
+
+        self.default_subdomain = default_subdomain
+        self.charset = charset
+        self.encoding_errors = encoding_errors
+        self.strict_slashes = strict_slashes
+        self.merge_slashes = merge_slashes
+        self.redirect_defaults = redirect_defaults
+        self.host_matching = host_matching
+
+        self.converters = self.default_converters.copy()
+        if converters:
+            self.converters.update(converters)
+
+        self.sort_parameters = sort_parameters
+        self.sort_key = sort_key
+        self.compile_cache = compile_cache
+        self.lazy_compile = lazy_compile
+
+        if compile_cache is not None:
+            self._compile_cache = self._load_compile_cache(compile_cache)
+
+        self.add_many(rules or ())
+
+        if self._compile_cache_changed:
+            self.save_compile_cache()
+
+    def is_endpoint_expecting(self, endpoint, *arguments):
+        """Iterate over all rules and check if the endpoint expects
+        the arguments provided.  This is for example useful if you have
+        some URLs that expect a language code and others that do not and
+        you want to wrap the builder a bit so that the current language
+        code is automatically added if not provided but endpoints expect
+        it.
+
+        :param endpoint: the endpoint to check.
+        :param arguments: this function accepts one or more arguments
+                          as positional arguments.  Each one of them is
+                          checked.
+        """
+        self.update()
+        arguments = set(arguments)
+        for rule in self._rules_by_endpoint[endpoint]:
+            if arguments.issubset(rule.arguments):
+                return True
+        return False
+
+    def iter_rules(self, endpoint=None):
+        """Iterate over all rules or the rules of an endpoint.
 
         :param endpoint: if provided only the rules for that endpoint
                          are returned.
@@ -1544,12 +2973,171 @@ class Map:
         rule is not bound to another map.
 
         :param rulefactory: a :class:`Rule` or :class:`RuleFactory`
+
+        .. versionchanged:: 2.0
+            The rule is inserted in order instead of sorting all rules
+            again.
         """
         for rule in rulefactory.get_rules(self):
             rule.bind(self)
-            self._rules.append(rule)
-            self._rules_by_endpoint.setdefault(rule.endpoint, []).append(rule)
-        self._remap = True
+
+            with self._remap_lock:
+                key = rule.match_compare_key()
+                index = bisect.bisect_right(self._rule_keys, key)
+                self._rules.insert(index, rule)
+                self._rule_keys.insert(index, key)
+                rules = self._rules_by_endpoint.setdefault(rule.endpoint, [])
+                keys = self._endpoint_keys.setdefault(rule.endpoint, [])
+                key = rule.build_compare_key()
+                index = bisect.bisect_right(keys, key)
+                rules.insert(index, rule)
+                keys.insert(index, key)
+                self._remap = True
+
+    def add_many(
+        self, rulefactories: Iterable[Union[Rule, RuleTemplateFactory]]
+    ) -> None:
+        """Add several rules or factories to the map and bind them. The
+        result is the same as calling :meth:`add` for each, but the new
+        rules are sorted among themselves and merged with the existing
+        rules once, which is faster when adding many rules at a time.
+
+        :param rulefactories: an iterable of :class:`Rule` or
+            :class:`RuleFactory`
+
+        .. versionadded:: 2.0
+        """
+        new_rules = []
+
+        try:
+            for rulefactory in rulefactories:
+                for rule in rulefactory.get_rules(self):
+                    rule.bind(self)
+                    new_rules.append(rule)
+        finally:
+            # rules that were bound before an error are still added
+            if new_rules:
+                self._merge_rules(new_rules)
+
+    def _merge_rules(self, new_rules: List[Rule]) -> None:
+        by_endpoint: Dict[Hashable, List[Rule]] = {}
+
+        for rule in new_rules:
+            by_endpoint.setdefault(rule.endpoint, []).append(rule)
+
+        with self._remap_lock:
+            self._rules, self._rule_keys = _merge_sorted(
+                self._rules, self._rule_keys, new_rules, Rule.match_compare_key
+            )
+
+            for endpoint, rules in by_endpoint.items():
+                (
+                    self._rules_by_endpoint[endpoint],
+                    self._endpoint_keys[endpoint],
+                ) = _merge_sorted(
+                    self._rules_by_endpoint.get(endpoint, []),
+                    self._endpoint_keys.get(endpoint, []),
+                    rules,
+                    Rule.build_compare_key,
+                )
+
+            self._remap = True
+
+    def compile_all(self) -> None:
+        """Compile the regular expressions and URL building functions of
+        all rules that haven't been compiled yet, and prepare the map for
+        matching. Rules are compiled when they're added unless the map
+        was created with ``lazy_compile``. Call this before forking
+        worker processes so they share the compiled rules.
+
+        .. versionadded:: 2.0
+        """
+        for rule in self._rules:
+            if rule._build is None:
+                rule._compile_builders()
+
+            if rule._regex is None and rule._regex_pattern is not None:
+                rule._regex = re.compile(rule._regex_pattern)
+
+        self.update()
+
+    def _compile_cache_header(self) -> tuple:
+        """Identifies the Python and Werkzeug versions and the map
+        configuration the rules in a compile cache were compiled for.
+
+        :internal:
+        """
+        from . import __version__
+        from importlib.util import MAGIC_NUMBER
+
+        converters = sorted(
+            (name, f"{cls.__module__}.{cls.__qualname__}")
+            for name, cls in self.converters.items()
+        )
+        return (
+            _COMPILE_CACHE_FORMAT,
+            __version__,
+            MAGIC_NUMBER,
+            self.charset,
+            self.host_matching,
+            tuple(converters),
+        )
+
+    def _load_compile_cache(self, path: str) -> Dict[str, tuple]:
+        try:
+            with open(path, "rb") as f:
+                header, compiled = marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            return {}
+
+        if header != self._compile_cache_header() or not isinstance(compiled, dict):
+            return {}
+
+        return compiled
+
+    def save_compile_cache(self, path: Optional[str] = None) -> None:
+        """Write the compiled rules of the map to a file. A new map
+        with the same configuration can load them by passing the path as
+        ``compile_cache``, instead of compiling its rules again. Rules
+        are identified by their type, rule string, subdomain or host,
+        defaults and slash options. Other rules are compiled as usual.
+
+        The file is written to a temporary file first, so processes
+        starting at the same time never load a partially written cache.
+        Errors writing the file are ignored.
+
+        Rules are compiled again if the regex or weight of one of their
+        converters changed. The file contains code that is run when it
+        is loaded, it must only be writable by the application.
+
+        :param path: The file to write. Defaults to the ``compile_cache``
+            passed to the map.
+
+        .. versionadded:: 2.0
+        """
+        if path is None:
+            path = self.compile_cache
+
+        assert path is not None, "no compile cache path given"
+        compiled = {rule._compile_key(): rule._dump_compiled() for rule in self._rules}
+        data = marshal.dumps((self._compile_cache_header(), compiled))
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+            return
+
+        self._compile_cache = compiled
+        self._compile_cache_changed = False
 
     def bind(
         self,
@@ -1717,8 +3305,14 @@ class Map:
         )
 
     def update(self) -> None:
-        """Called before matching and building to keep the compiled rules
-        in the correct order after things changed.
+        """Called before matching and building to prepare the matcher
+        and reset the caches after rules were added. The rules are
+        already kept in order by :meth:`add`.
+
+        .. versionchanged:: 2.0
+            Publishes a new snapshot of the rules instead of changing
+            the ones in use, so threads matching and building at the
+            same time aren't affected.
         """
         if not self._remap:
             return
@@ -1727,11 +3321,46 @@ class Map:
             if not self._remap:
                 return
 
-            self._rules.sort(key=lambda x: x.match_compare_key())
-            for rules in self._rules_by_endpoint.values():
-                rules.sort(key=lambda x: x.build_compare_key())
+            # Copies, add() changes the lists of the map in place. The
+            # snapshot is replaced in one assignment, adapters either
+            # get the old or the new one.
+            self._snapshot = _MapSnapshot(
+                self._snapshot.version + 1,
+                list(self._rules),
+                {k: list(v) for k, v in self._rules_by_endpoint.items()},
+                self.matcher_class,
+            )
+
+            if self._match_cache is not None:
+                self._match_cache.clear()
+
+            if self._build_cache is not None:
+                self._build_cache.clear()
+
             self._remap = False
 
+    def match_cache_info(self) -> Optional[CacheInfo]:
+        """Get the hits, misses and size of the match cache, or ``None``
+        if ``match_cache_size`` wasn't set.
+
+        .. versionadded:: 2.0
+        """
+        if self._match_cache is None:
+            return None
+
+        return self._match_cache.info()
+
+    def build_cache_info(self) -> Optional[CacheInfo]:
+        """Get the hits, misses and size of the build cache, or ``None``
+        if ``build_cache_size`` wasn't set.
+
+        .. versionadded:: 2.0
+        """
+        if self._build_cache is None:
+            return None
+
+        return self._build_cache.info()
+
     def __repr__(self) -> str:
         rules = self.iter_rules()
         return f"{type(self).__name__}({pformat(list(rules))})"
@@ -1922,6 +3551,66 @@ class MapAdapter:
         .. versionadded:: 0.6
             Added ``return_rule``.
         """
+        stats = self.map.stats
+
+        if stats is None:
+            rule, rv = self._match(path_info, method, query_args, websocket)
+        else:
+            rule, rv = self._match_with_stats(
+                stats, path_info, method, query_args, websocket
+            )
+
+        if return_rule:
+            return rule, rv
+        else:
+            return rule.endpoint, rv
+
+    def _match_with_stats(
+        self,
+        stats: RoutingStats,
+        path_info: Optional[str],
+        method: Optional[str],
+        query_args: Optional[Union[str, Dict[str, str]]],
+        websocket: Optional[bool],
+    ) -> Tuple[Rule, Dict[str, Any]]:
+        rule = None
+        outcome = "error"
+        stats._start_match()
+        start = perf_counter()
+
+        try:
+            rule, rv = self._match(path_info, method, query_args, websocket)
+            outcome = "match"
+        except RequestRedirect:
+            outcome = "redirect"
+            raise
+        except MethodNotAllowed:
+            outcome = "method_not_allowed"
+            raise
+        except NotFound:
+            outcome = "not_found"
+            raise
+        except WebsocketMismatch:
+            outcome = "websocket_mismatch"
+            raise
+        finally:
+            seconds = perf_counter() - start
+            stats.record_match(rule, outcome, stats._end_match(), seconds)
+
+        return rule, rv
+
+    def _match(
+        self,
+        path_info: Optional[str],
+        method: Optional[str],
+        query_args: Optional[Union[str, Dict[str, str]]],
+        websocket: Optional[bool],
+    ) -> Tuple[Rule, Dict[str, Any]]:
+        """Find the rule for :meth:`match` and its values, or raise the
+        redirect or error.
+
+        :internal:
+        """
         self.map.update()
         if path_info is None:
             path_info = self.path_info
@@ -1940,80 +3629,162 @@ class MapAdapter:
         path_part = f"/{path_info.lstrip('/')}" if path_info else ""
         path = f"{domain_part}|{path_part}"
 
-        have_match_for = set()
-        websocket_mismatch = False
-
-        for rule in self.map._rules:
-            try:
-                rv = rule.match(path, method)
-            except RequestPath as e:
-                raise RequestRedirect(
-                    self.make_redirect_url(
-                        url_quote(e.path_info, self.map.charset, safe="/:|+"),
-                        query_args,
-                    )
+        try:
+            rule, rv = self._match_rule(domain_part, path_part, method, websocket)
+        except RequestPath as e:
+            raise RequestRedirect(
+                self.make_redirect_url(
+                    url_quote(e.path_info, self.map.charset, safe="/:|+"),
+                    query_args,
                 )
-            except RequestAliasRedirect as e:
-                raise RequestRedirect(
-                    self.make_alias_redirect_url(
-                        path,
-                        rule.endpoint,
-                        e.matched_values,
-                        method,
-                        query_args,  # type: ignore
-                    )
+            )
+        except RequestAliasRedirect as e:
+            raise RequestRedirect(
+                self.make_alias_redirect_url(
+                    path,
+                    e.endpoint,
+                    e.matched_values,
+                    method,
+                    query_args,  # type: ignore
                 )
-            if rv is None:
-                continue
-            if rule.methods is not None and method not in rule.methods:
-                have_match_for.update(rule.methods)
-                continue
-
-            if rule.websocket != websocket:
-                websocket_mismatch = True
-                continue
+            )
 
-            if self.map.redirect_defaults:
-                redirect_url = self.get_default_redirect(
-                    rule, method, rv, query_args  # type: ignore
-                )
-                if redirect_url is not None:
-                    raise RequestRedirect(redirect_url)
+        if self.map.redirect_defaults:
+            redirect_url = self.get_default_redirect(
+                rule, method, rv, query_args  # type: ignore
+            )
+            if redirect_url is not None:
+                raise RequestRedirect(redirect_url)
 
-            if rule.redirect_to is not None:
-                if isinstance(rule.redirect_to, str):
+        if rule.redirect_to is not None:
+            if isinstance(rule.redirect_to, str):
 
-                    def _handle_match(match):
-                        value = rv[match.group(1)]
-                        return rule._converters[match.group(1)].to_url(value)
+                def _handle_match(match):
+                    value = rv[match.group(1)]
+                    return rule._converters[match.group(1)].to_url(value)
 
-                    redirect_url = _simple_rule_re.sub(_handle_match, rule.redirect_to)
-                else:
-                    redirect_url = rule.redirect_to(self, **rv)
+                redirect_url = _simple_rule_re.sub(_handle_match, rule.redirect_to)
+            else:
+                redirect_url = rule.redirect_to(self, **rv)
 
-                if self.subdomain:
-                    netloc = f"{self.subdomain}.{self.server_name}"
-                else:
-                    netloc = self.server_name
+            if self.subdomain:
+                netloc = f"{self.subdomain}.{self.server_name}"
+            else:
+                netloc = self.server_name
 
-                raise RequestRedirect(
-                    url_join(
-                        f"{self.url_scheme or 'http'}://{netloc}{self.script_name}",
-                        redirect_url,
-                    )
+            raise RequestRedirect(
+                url_join(
+                    f"{self.url_scheme or 'http'}://{netloc}{self.script_name}",
+                    redirect_url,
                 )
+            )
 
-            if require_redirect:
-                raise RequestRedirect(
-                    self.make_redirect_url(
-                        url_quote(path_info, self.map.charset, safe="/:|+"), query_args,
-                    )
+        if require_redirect:
+            raise RequestRedirect(
+                self.make_redirect_url(
+                    url_quote(path_info, self.map.charset, safe="/:|+"), query_args,
                 )
+            )
 
-            if return_rule:
-                return rule, rv
+        return rule, rv
+
+    def _match_rule(
+        self, domain_part: str, path_part: str, method: str, websocket: bool
+    ) -> Tuple[Rule, Dict[str, Any]]:
+        """Find the first rule matching the path, method and WebSocket
+        state, using the map's match cache if it is enabled. Raises
+        :exc:`RequestPath` or :exc:`RequestAliasRedirect` if the rule
+        wants to redirect, otherwise the :exc:`NotFound` family of
+        errors if nothing matches.
+
+        :internal:
+        """
+        cache = self.map._match_cache
+
+        if cache is None:
+            return self._find_rule(domain_part, path_part, method, websocket)
+
+        key = (self.map._snapshot.version, domain_part, path_part, method, websocket)
+        cached = cache.get(key)
+
+        if cached is None:
+            generation = cache.generation
+
+            try:
+                rule, rv = self._find_rule(domain_part, path_part, method, websocket)
+            except (RoutingException, HTTPException) as e:
+                # don't keep the frames of the traceback alive
+                cached = e.with_traceback(None)
             else:
-                return rule.endpoint, rv
+                # A hit doesn't call to_python again, only keep values
+                # that can't be changed by the caller or the converter.
+                if not all(type(value) in _BUILD_CACHE_TYPES for value in rv.values()):
+                    return rule, rv
+
+                cached = rule, rv
+
+            cache.set(key, cached, generation)
+
+        if isinstance(cached, Exception):
+            # a new instance, the raised one gets a traceback attached
+            raise copy(cached)
+
+        rule, rv = cached
+        return rule, dict(rv)
+
+    def _iter_matches(
+        self, domain_part: str, path_part: str, method: str
+    ) -> Iterator[Tuple[Rule, Dict[str, Any]]]:
+        """Yield the rules matching the path from the map's matcher. If
+        the caller asks for more matches after the first one, because
+        the method didn't match, and only rules with the same pattern as
+        the first one can match, only those are tried instead of
+        continuing the search.
+
+        :internal:
+        """
+        snapshot = self.map._snapshot
+        matches = snapshot.matcher.match(domain_part, path_part, method)
+
+        for rule, rv in matches:
+            yield rule, rv
+            break
+        else:
+            return
+
+        # merged slashes don't follow the segments of the rules
+        rules = None if "//" in path_part else snapshot.same_pattern_rules(rule)
+
+        if rules is None:
+            yield from matches
+            return
+
+        path = f"{domain_part}|{path_part}"
+        # Rule compares equal to other rules with the same pattern
+        start = next(i for i, other in enumerate(rules) if other is rule) + 1
+
+        for other in rules[start:]:
+            rv = other.match(path, method)
+
+            if rv is not None:
+                yield other, rv
+
+    def _find_rule(
+        self, domain_part: str, path_part: str, method: str, websocket: bool
+    ) -> Tuple[Rule, Dict[str, Any]]:
+        have_match_for = set()
+        websocket_mismatch = False
+
+        for rule, rv in self._iter_matches(domain_part, path_part, method):
+            if rule.methods is not None and method not in rule.methods:
+                have_match_for.update(rule.methods)
+                continue
+
+            if rule.websocket != websocket:
+                websocket_mismatch = True
+                continue
+
+            return rule, rv
 
         if have_match_for:
             raise MethodNotAllowed(valid_methods=list(have_match_for))
@@ -2086,7 +3857,7 @@ class MapAdapter:
         :internal:
         """
         assert self.map.redirect_defaults
-        for r in self.map._rules_by_endpoint[rule.endpoint]:
+        for r in self.map._snapshot.rules_by_endpoint[rule.endpoint]:
             # every rule that comes after this one, including ourself
             # has a lower priority for the defaults.  We order the ones
             # with the highest priority up for building.
@@ -2140,6 +3911,38 @@ class MapAdapter:
         assert url != path, "detected invalid alias setting. No canonical URL found"
         return url
 
+    def _suitable_rules(
+        self, endpoint: str, values: Dict[str, Any], method: Optional[str]
+    ) -> List[Rule]:
+        """Get the rules of the endpoint that have the method and can be
+        built from the names of the given values, in build order. The
+        defaults of the rules still need to be checked against the
+        values. The lists are remembered by the map until it's updated.
+
+        :internal:
+        """
+        snapshot = self.map._snapshot
+        dispatch = snapshot.build_dispatch.get(endpoint)
+
+        if dispatch is None:
+            rules = snapshot.rules_by_endpoint.get(endpoint, ())
+            names = frozenset().union(*(rule.arguments for rule in rules))
+            dispatch = snapshot.build_dispatch[endpoint] = (names, {})
+
+        names, by_keys = dispatch
+        keys = names.intersection(values) if names else names
+        rules = by_keys.get((method, keys))
+
+        if rules is None:
+            rules = [
+                rule
+                for rule in snapshot.rules_by_endpoint.get(endpoint, ())
+                if rule._suitable_for_keys(keys, method)
+            ]
+            by_keys[(method, keys)] = rules
+
+        return rules
+
     def _partial_build(
         self,
         endpoint: str,
@@ -2165,8 +3968,8 @@ class MapAdapter:
         # host is found, go with first result.
         first_match = None
 
-        for rule in self.map._rules_by_endpoint.get(endpoint, ()):
-            if rule.suitable_for(values, method):
+        for rule in self._suitable_rules(endpoint, values, method):
+            if rule._defaults_match(values):
                 rv = rule.build(values, append_unknown)
 
                 if rv is not None:
@@ -2261,33 +4064,224 @@ class MapAdapter:
         .. versionadded:: 0.6
            Added the ``append_unknown`` parameter.
         """
+        stats = self.map.stats
+
+        if stats is None:
+            return self._cached_build(
+                endpoint, values, method, force_external, append_unknown, url_scheme
+            )
+
+        start = perf_counter()
+
+        try:
+            url = self._cached_build(
+                endpoint, values, method, force_external, append_unknown, url_scheme
+            )
+        except BuildError:
+            stats.record_build(endpoint, False, perf_counter() - start)
+            raise
+
+        stats.record_build(endpoint, True, perf_counter() - start)
+        return url
+
+    def _cached_build(
+        self,
+        endpoint: str,
+        values: Optional[Any],
+        method: Optional[str],
+        force_external: bool,
+        append_unknown: bool,
+        url_scheme: Optional[str],
+    ) -> str:
+        """Build a URL for :meth:`build`, using the map's build cache if
+        it is enabled.
+
+        :internal:
+        """
         self.map.update()
+        values = self._prepare_build_values(values)
+        cache = self.map._build_cache
 
-        if values:
-            if isinstance(values, MultiDict):
-                temp_values = {}
-                # dict.items(values) is like `values.lists()`
-                # without the call or `list()` coercion overhead.
-                for key, value in dict.items(values):
-                    if not value:
-                        continue
-                    if len(value) == 1:  # flatten single item lists
-                        value = value[0]
-                        if value is None:  # drop None
-                            continue
-                    temp_values[key] = value
-                values = temp_values
-            else:
-                # drop None
-                values = dict(i for i in values.items() if i[1] is not None)
-        else:
-            values = {}
+        if cache is not None and all(
+            type(value) in _BUILD_CACHE_TYPES for value in values.values()
+        ):
+            # The type is part of the key, 1, 1.0 and True are equal. The
+            # key has every adapter attribute that building uses, the
+            # default method picks the rule if no method is given.
+            key = (
+                self.map._snapshot.version,
+                self.server_name,
+                self.script_name,
+                self.subdomain,
+                self.url_scheme,
+                endpoint,
+                frozenset((k, type(v), v) for k, v in values.items()),
+                method,
+                self.default_method if method is None else None,
+                force_external,
+                append_unknown,
+                url_scheme,
+            )
+            url = cache.get(key)
+
+            if url is None:
+                generation = cache.generation
+                url = self._build(
+                    endpoint, values, method, force_external, append_unknown, url_scheme
+                )
+                cache.set(key, url, generation)
+
+            return url
+
+        return self._build(
+            endpoint, values, method, force_external, append_unknown, url_scheme
+        )
+
+    def _build(
+        self,
+        endpoint: str,
+        values: Dict[str, Any],
+        method: Optional[str],
+        force_external: bool,
+        append_unknown: bool,
+        url_scheme: Optional[str],
+    ) -> str:
+        """Build a URL from the values prepared by :meth:`build`.
 
+        :internal:
+        """
         rv = self._partial_build(endpoint, values, method, append_unknown)
         if rv is None:
             raise BuildError(endpoint, values, method, self)
 
         domain_part, path, websocket = rv
+        prefix = self._url_prefix(domain_part, websocket, force_external, url_scheme)
+        return prefix + path.lstrip("/")
+
+    def build_many(
+        self,
+        endpoint: str,
+        values_iterable: Iterable[Any],
+        method: Optional[str] = None,
+        force_external: bool = False,
+        append_unknown: bool = True,
+        url_scheme: Optional[str] = None,
+    ) -> Iterator[str]:
+        """Build a URL for the same endpoint from each item of an
+        iterable of values. Yields the same URLs as calling :meth:`build`
+        for each item, but the work that doesn't depend on the values is
+        only done once. This is faster when building many URLs, for
+        example for the items on a listing page.
+
+        >>> urls = Map([Rule("/item/<int:id>", endpoint="item")]).bind("example.com")
+        >>> list(urls.build_many("item", [{"id": 1}, {"id": 2}]))
+        ['/item/1', '/item/2']
+
+        A :exc:`BuildError` is raised when the URL for an item can't be
+        built, after the URLs for the previous items were yielded.
+
+        The other arguments are the same as for :meth:`build`. The build
+        cache isn't used.
+
+        .. versionadded:: 2.0
+        """
+        self.map.update()
+        stats = self.map.stats
+        prefixes: Dict[Tuple[Optional[str], bool], str] = {}
+        names: Optional[Set[str]] = None
+        rules: List[Rule] = []
+
+        for values in values_iterable:
+            if stats is not None:
+                start = perf_counter()
+
+            values = self._prepare_build_values(values)
+
+            if self.map.host_matching:
+                rv = self._partial_build(endpoint, values, method, append_unknown)
+            else:
+                # Without host matching, the first rule that builds is
+                # used. The rules to try only change with the names.
+                if values.keys() != names:
+                    names = set(values)
+                    rules = self._suitable_rules(endpoint, values, method)
+
+                    if method is None:
+                        rules = (
+                            self._suitable_rules(endpoint, values, self.default_method)
+                            + rules
+                        )
+
+                rv = None
+
+                for rule in rules:
+                    if rule._defaults_match(values):
+                        rv = rule.build(values, append_unknown)
+
+                        if rv is not None:
+                            rv = (rv[0], rv[1], rule.websocket)
+                            break
+
+            if rv is None:
+                if stats is not None:
+                    stats.record_build(endpoint, False, perf_counter() - start)
+
+                raise BuildError(endpoint, values, method, self)
+
+            domain_part, path, websocket = rv
+            prefix = prefixes.get((domain_part, websocket))
+
+            if prefix is None:
+                prefix = self._url_prefix(
+                    domain_part, websocket, force_external, url_scheme
+                )
+                prefixes[(domain_part, websocket)] = prefix
+
+            if stats is not None:
+                stats.record_build(endpoint, True, perf_counter() - start)
+
+            yield prefix + path.lstrip("/")
+
+    @staticmethod
+    def _prepare_build_values(values: Optional[Any]) -> Dict[str, Any]:
+        """Turn the values passed to :meth:`build` into a dict, dropping
+        ``None`` values and flattening single item lists of a
+        :class:`MultiDict`.
+
+        :internal:
+        """
+        if not values:
+            return {}
+
+        if isinstance(values, MultiDict):
+            temp_values = {}
+            # dict.items(values) is like `values.lists()`
+            # without the call or `list()` coercion overhead.
+            for key, value in dict.items(values):
+                if not value:
+                    continue
+                if len(value) == 1:  # flatten single item lists
+                    value = value[0]
+                    if value is None:  # drop None
+                        continue
+                temp_values[key] = value
+            return temp_values
+
+        # drop None
+        return dict(i for i in values.items() if i[1] is not None)
+
+    def _url_prefix(
+        self,
+        domain_part: Optional[str],
+        websocket: bool,
+        force_external: bool,
+        url_scheme: Optional[str],
+    ) -> str:
+        """Get the part of a built URL before the path of the rule, for
+        a rule with the given domain part and WebSocket state.
+
+        :internal:
+        """
         host = self.get_host(domain_part)
 
         if url_scheme is None:
@@ -2309,7 +4303,7 @@ class MapAdapter:
             (self.map.host_matching and host == self.server_name)
             or (not self.map.host_matching and domain_part == self.subdomain)
         ):
-            return f"{self.script_name.rstrip('/')}/{path.lstrip('/')}"
+            return f"{self.script_name.rstrip('/')}/"
 
         scheme = f"{url_scheme}:" if url_scheme else ""
-        return f"{scheme}//{host}{self.script_name[:-1]}/{path.lstrip('/')}"
+        return f"{scheme}//{host}{self.script_name[:-1]}/"
@@ -400,7 +400,9 @@ class BytesURL(BaseURL):
         )
 
 
-_unquote_maps: Dict[FrozenSet, Dict[bytes, int]] = {frozenset(): _hextobyte}
+_unquote_maps: Dict[FrozenSet, Dict[bytes, bytes]] = {
+    frozenset(): {h: bytes((b,)) for h, b in _hextobyte.items()}
+}
 
 
 def _unquote_to_bytes(string: Union[str, bytes], unsafe: str = "") -> bytes:
@@ -410,28 +412,28 @@ def _unquote_to_bytes(string: Union[str, bytes], unsafe: str = "") -> bytes:
     if isinstance(unsafe, str):
         unsafe = unsafe.encode("utf-8")  # type: ignore
 
-    unsafe = frozenset(bytearray(unsafe))  # type: ignore
-    groups = iter(string.split(b"%"))
-    result = bytearray(next(groups, b""))
+    unsafe = frozenset(bytearray(unsafe)) if unsafe else frozenset()  # type: ignore
+    groups = string.split(b"%")
+    result = [groups[0]]
 
     try:
         hex_to_byte = _unquote_maps[unsafe]
     except KeyError:
         hex_to_byte = _unquote_maps[unsafe] = {
-            h: b for h, b in _hextobyte.items() if b not in unsafe
+            h: bytes((b,)) for h, b in _hextobyte.items() if b not in unsafe
         }
 
-    for group in groups:
-        code = group[:2]
+    for group in groups[1:]:
+        byte = hex_to_byte.get(group[:2])
 
-        if code in hex_to_byte:
-            result.append(hex_to_byte[code])
-            result.extend(group[2:])
+        if byte is None:
+            result.append(b"%")
+            result.append(group)
         else:
-            result.append(37)  # %
-            result.extend(group)
+            result.append(byte)
+            result.append(group[2:])
 
-    return bytes(result)
+    return b"".join(result)
 
 
 def _url_encode_impl(
@@ -866,6 +868,10 @@ def url_decode(
         separator = separator.decode(charset or "ascii")
     elif isinstance(s, bytes) and not isinstance(separator, bytes):
         separator = separator.encode(charset or "ascii")
+    if isinstance(s, bytes):
+        return cls(  # type: ignore
+            _url_decode_bytes(s, charset, include_empty, errors, separator)
+        )
     return cls(  # type: ignore
         _url_decode_impl(s.split(separator), charset, include_empty, errors)
     )
@@ -955,6 +961,75 @@ def _url_decode_impl(
         yield key, url_unquote_plus(value, charset, errors)  # type: ignore
 
 
+#: Charsets where the bytes of "&", "=", and "+" are never part of
+#: another character, and error handlers that never remove a byte or
+#: raise, so a query string can be decoded before it is split.
+_split_after_decode_charsets = frozenset(
+    ["utf-8", "ascii", "iso8859-1", "iso8859-15", "cp1252"]
+)
+_split_after_decode_errors = frozenset(["replace", "surrogateescape"])
+
+
+def _url_decode_bytes(
+    s: bytes,
+    charset: Optional[str],
+    include_empty: bool,
+    errors: str,
+    separator: bytes,
+) -> Iterator[Tuple[Any, Any]]:
+    """Like :func:`_url_decode_impl`, but faster for a whole query
+    string in bytes. Pairs without "%" don't need to be unquoted byte
+    by byte. If there is no "%" at all and the charset allows it, the
+    whole string is decoded at once and split afterwards.
+    """
+    if (
+        b"%" not in s
+        and charset is not None
+        and errors in _split_after_decode_errors
+        and all(c < 128 for c in separator)
+        and codecs.lookup(charset).name in _split_after_decode_charsets
+    ):
+        text = s.replace(b"+", b" ").decode(charset, errors)
+
+        for pair in text.split(separator.decode("ascii")):
+            if not pair:
+                continue
+
+            key, equal, value = pair.partition("=")
+
+            if equal or include_empty:
+                yield key, value
+
+        return
+
+    for pair in s.split(separator):
+        if not pair:
+            continue
+
+        key, equal, value = pair.partition(b"=")
+
+        if equal or include_empty:
+            yield (
+                _unquote_plus_bytes(key, charset, errors),
+                _unquote_plus_bytes(value, charset, errors),
+            )
+
+
+def _unquote_plus_bytes(
+    s: bytes, charset: Optional[str], errors: str
+) -> Union[str, bytes]:
+    if b"+" in s:
+        s = s.replace(b"+", b" ")
+
+    if b"%" in s:
+        s = _unquote_to_bytes(s)
+
+    if charset is not None:
+        return s.decode(charset, errors)
+
+    return s
+
+
 def url_encode(
     obj: object,
     charset: str = "utf-8",
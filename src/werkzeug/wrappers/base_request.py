@@ -16,6 +16,7 @@ from ..datastructures import iter_multi_items
 from ..datastructures import MultiDict
 from ..formparser import default_stream_factory
 from ..formparser import FormDataParser
+from ..formparser import SpoolingStrategy
 from ..http import parse_cookie
 from ..http import parse_list_header
 from ..http import parse_options_header
@@ -138,6 +139,23 @@ class BaseRequest:
     #: the form date parsing.
     form_data_parser_class = FormDataParser
 
+    #: A :class:`~werkzeug.formparser.SpoolingStrategy` that creates the
+    #: streams for uploaded files, instead of
+    #: :func:`~werkzeug.formparser.default_stream_factory`. It is shared
+    #: by all requests of the class, so its memory budget applies to all
+    #: of them together.
+    #:
+    #: .. versionadded:: 2.0
+    spooling_strategy: Optional[SpoolingStrategy] = None
+
+    #: Decode the values of multipart form fields when they are first
+    #: read from :attr:`form` instead of while parsing. Fields that are
+    #: never read are never decoded. This is forwarded to the form data
+    #: parser as ``lazy_decode``.
+    #:
+    #: .. versionadded:: 2.0
+    lazy_form_decode = False
+
     #: Optionally a list of hosts that is trusted by this request.  By default
     #: all hosts are trusted which means that whatever the client sends the
     #: host is will be accepted.
@@ -280,7 +298,18 @@ class BaseRequest:
         :param content_length: the length of this file.  This value is usually
                                not provided because webbrowsers do not provide
                                this value.
+
+        .. versionchanged:: 2.0
+            Uses :attr:`spooling_strategy` if it is set.
         """
+        if self.spooling_strategy is not None:
+            return self.spooling_strategy(
+                total_content_length=total_content_length,
+                filename=filename,
+                content_type=content_type,
+                content_length=content_length,
+            )
+
         return default_stream_factory(
             total_content_length=total_content_length,
             filename=filename,
@@ -310,6 +339,7 @@ class BaseRequest:
             self.max_form_memory_size,
             self.max_content_length,
             self.parameter_storage_class,
+            lazy_decode=self.lazy_form_decode,
         )
 
     def _load_form_data(self) -> None:
@@ -914,6 +914,7 @@ class LimitedStream(io.IOBase):
     def __init__(self, stream: Union[IO], limit: int) -> None:
         self._read = stream.read
         self._readline = stream.readline
+        self._readinto = getattr(stream, "readinto", None)
         self._pos = 0
         self.limit = limit
 
@@ -978,6 +979,37 @@ class LimitedStream(io.IOBase):
         self._pos += len(read)
         return read
 
+    def readinto(self, buffer: Union[bytearray, memoryview]) -> int:
+        """Read up to ``len(buffer)`` bytes into a writable buffer, and
+        return the number of bytes read. Uses the ``readinto`` method of
+        the wrapped stream if it has one, otherwise the data is read and
+        copied into the buffer.
+
+        .. versionadded:: 2.0
+        """
+        if self._pos >= self.limit:
+            data = self.on_exhausted()
+            buffer[: len(data)] = data
+            return len(data)
+        to_read = min(self.limit - self._pos, len(buffer))
+        try:
+            if self._readinto is not None:
+                size = self._readinto(memoryview(buffer)[:to_read])
+            else:
+                data = self._read(to_read)
+                size = len(data)
+                buffer[:size] = data
+        except (OSError, ValueError):
+            data = self.on_disconnect()
+            buffer[: len(data)] = data
+            return len(data)
+        if to_read and size != to_read:
+            data = self.on_disconnect()
+            buffer[: len(data)] = data
+            return len(data)
+        self._pos += size
+        return size
+
     def readline(self, size: Optional[int] = None) -> BytesOrStr:  # type: ignore
         """Reads one line from the stream."""
         if self._pos >= self.limit:
@@ -1155,6 +1155,14 @@ class TestFileStorage:
         for name in ("fileno", "writable", "readable", "seekable"):
             assert hasattr(file_storage, name)
 
+    def test_content_length(self):
+        storage = self.storage_class(content_length=5)
+        assert storage.content_length == 5
+        storage.content_length = 3
+        assert storage.content_length == 3
+        assert storage.headers["Content-Length"] == "5"
+        assert self.storage_class().content_length == 0
+
     def test_save_to_pathlib_dst(self, tmp_path):
         src = tmp_path / "src.txt"
         src.write_text("test")
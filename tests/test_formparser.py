@@ -1,5 +1,9 @@
+import base64
 import csv
+import hashlib
 import io
+import os
+import pickle
 from os.path import dirname
 from os.path import join
 
@@ -7,6 +11,7 @@ import pytest
 
 from werkzeug import formparser
 from werkzeug.datastructures import MultiDict
+from werkzeug.datastructures import OrderedMultiDict
 from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.formparser import FormDataParser
 from werkzeug.formparser import parse_form_data
@@ -14,6 +19,7 @@ from werkzeug.test import Client
 from werkzeug.test import create_environ
 from werkzeug.wrappers import Request
 from werkzeug.wrappers import Response
+from werkzeug.wsgi import LimitedStream
 
 
 @Request.application
@@ -534,6 +540,540 @@ class TestMultiPartParser:
         assert request.files["rfc2231"].filename == "a b c d e f.txt"
         assert request.files["rfc2231"].read() == b"file contents"
 
+    @pytest.mark.parametrize("mode", [{}, {"scan_boundary": True}, {"readinto": True}])
+    def test_transfer_encoding_chunks(self, mode):
+        contents = os.urandom(5000) + b"\r\n"
+        # lines that don't end at a group of four characters
+        encoded = base64.b64encode(contents)
+        encoded = b"\r\n".join(encoded[i : i + 6] for i in range(0, len(encoded), 6))
+        data = (
+            b"--foo\r\nContent-Disposition: form-data; name=a; filename=a.bin\r\n"
+            b"Content-Transfer-Encoding: base64\r\n\r\n" + encoded + b"\r\n"
+            b"--foo\r\nContent-Disposition: form-data; name=b\r\n"
+            b"Content-Transfer-Encoding: quoted-printable\r\n\r\n"
+            + b"ab=\r\ncd=C3=A4\r\n" * 500
+            + b"end=\r\n--foo--"
+        )
+        parser = formparser.MultiPartParser(**mode)
+        form, files = parser.parse(io.BytesIO(data), b"foo", len(data))
+        assert files["a"].read() == contents
+        files["a"].close()
+        assert form["b"] == "abcd\xe4\r\n" * 500 + "end"
+
+    @pytest.mark.parametrize("mode", [{}, {"scan_boundary": True}, {"readinto": True}])
+    def test_transfer_encoding_invalid(self, mode):
+        data = (
+            b"--foo\r\nContent-Disposition: form-data; name=a\r\n"
+            b"Content-Transfer-Encoding: base64\r\n\r\nQUJDR\r\n--foo--"
+        )
+        parser = formparser.MultiPartParser(**mode)
+
+        with pytest.raises(ValueError, match="could not decode"):
+            parser.parse(io.BytesIO(data), b"foo", len(data))
+
+    @pytest.mark.parametrize("mode", [{}, {"scan_boundary": True}, {"readinto": True}])
+    def test_digests(self, mode):
+        contents = b"line\r\n" * 1000 + b"end"
+        data = (
+            b"--foo\r\n"
+            b'Content-Disposition: form-data; name="a"; filename="a.txt"\r\n\r\n'
+            + contents
+            + b"\r\n--foo\r\n"
+            b'Content-Disposition: form-data; name="b"; filename="b.txt"\r\n\r\n'
+            b"\r\n--foo--"
+        )
+        environ = create_environ(
+            input_stream=io.BytesIO(data),
+            content_length=len(data),
+            content_type="multipart/form-data; boundary=foo",
+            method="POST",
+        )
+        parser = FormDataParser(digests=["sha256", "md5"], **mode)
+        _, _, files = parser.parse_from_environ(environ)
+        digests = files["a"].digests
+        assert files["a"].content_length == len(contents)
+        assert digests["sha256"].digest() == hashlib.sha256(contents).digest()
+        assert digests["md5"].hexdigest() == hashlib.md5(contents).hexdigest()
+        assert files["b"].content_length == 0
+        assert files["b"].digests["md5"].hexdigest() == hashlib.md5().hexdigest()
+
+        for file_storage in files.values():
+            file_storage.close()
+
+        environ["wsgi.input"] = io.BytesIO(data)
+        _, _, files = parse_form_data(environ, digests=["sha1"])
+        assert files["a"].digests["sha1"].digest() == hashlib.sha1(contents).digest()
+
+        for file_storage in files.values():
+            file_storage.close()
+
+    lazy_data = (
+        b"--foo\r\n"
+        b'Content-Disposition: form-data; name="a"\r\n\r\n'
+        b"1\r\n--foo\r\n"
+        b'Content-Disposition: form-data; name="a"\r\n'
+        b"Content-Type: text/plain; charset=latin1\r\n\r\n"
+        b"\xe4\r\n--foo\r\n"
+        b'Content-Disposition: form-data; name="b"\r\n\r\n'
+        b"\xe2\x98\x83\r\n--foo--"
+    )
+
+    def test_lazy_decode(self):
+        class LazyRequest(Request):
+            lazy_form_decode = True
+
+        request = LazyRequest.from_values(
+            input_stream=io.BytesIO(self.lazy_data),
+            content_length=len(self.lazy_data),
+            content_type="multipart/form-data; boundary=foo",
+            method="POST",
+        )
+        form = request.form
+        raw = dict.__getitem__(form, "b")
+        assert isinstance(list.__getitem__(raw, 0), formparser._LazyField)
+        assert form["b"] == "\N{SNOWMAN}"
+        assert list.__getitem__(raw, 0) == "\N{SNOWMAN}"
+        assert form.getlist("a") == ["1", "\xe4"]
+        expect = formparser.MultiPartParser(cls=MultiDict).parse(
+            io.BytesIO(self.lazy_data), b"foo", len(self.lazy_data)
+        )[0]
+        assert list(form.items(multi=True)) == list(expect.items(multi=True))
+        assert form.to_dict(flat=False) == expect.to_dict(flat=False)
+
+    def test_lazy_decode_list_access(self):
+        parser = formparser.MultiPartParser(lazy_decode=True)
+        form, _ = parser.parse(
+            io.BytesIO(self.lazy_data), b"foo", len(self.lazy_data)
+        )
+        assert form == MultiDict([("a", "1"), ("a", "\xe4"), ("b", "\N{SNOWMAN}")])
+        form, _ = parser.parse(
+            io.BytesIO(self.lazy_data), b"foo", len(self.lazy_data)
+        )
+        assert pickle.loads(pickle.dumps(form)).getlist("a") == ["1", "\xe4"]
+        assert list(form.listvalues()) == [["1", "\xe4"], ["\N{SNOWMAN}"]]
+
+    @pytest.mark.parametrize(
+        "operation",
+        [
+            lambda values, other: values + ["x"],
+            lambda values, other: ["x"] + values,
+            lambda values, other: values + other,
+            lambda values, other: values * 2,
+            lambda values, other: 2 * values,
+            lambda values, other: values[:],
+            lambda values, other: sorted(values),
+            lambda values, other: list(iter(values)),
+        ],
+    )
+    def test_lazy_decode_list_operations(self, operation):
+        parser = formparser.MultiPartParser(lazy_decode=True)
+        form, _ = parser.parse(
+            io.BytesIO(self.lazy_data), b"foo", len(self.lazy_data)
+        )
+        values, other = form.listvalues()
+        result = operation(values, other)
+        assert result
+        assert not any(isinstance(value, formparser._LazyField) for value in result)
+
+    def test_lazy_decode_list_mutations(self):
+        parser = formparser.MultiPartParser(lazy_decode=True)
+        form, _ = parser.parse(
+            io.BytesIO(self.lazy_data), b"foo", len(self.lazy_data)
+        )
+        values, other = form.listvalues()
+        values.sort(reverse=True)
+        assert list.__getitem__(values, 0) == "\xe4"
+        other += ["x"]
+        other *= 2
+        assert list.__getitem__(other, 0) == "\N{SNOWMAN}"
+
+    @pytest.mark.parametrize("cls", [dict, OrderedMultiDict])
+    def test_lazy_decode_other_cls(self, cls):
+        parser = formparser.MultiPartParser(lazy_decode=True, cls=cls)
+        form, _ = parser.parse(
+            io.BytesIO(self.lazy_data), b"foo", len(self.lazy_data)
+        )
+        assert form["a"] in ("1", "\xe4")
+        assert form["b"] == "\N{SNOWMAN}"
+
+    def test_unknown_digest(self):
+        with pytest.raises(ValueError):
+            FormDataParser(digests=["unknown"])
+
+
+class TestSpoolingStrategy:
+    def test_part_budget(self):
+        strategy = formparser.SpoolingStrategy(max_part_memory=10)
+        stream = strategy(None, None, None)
+        stream.write(b"a" * 6)
+        assert strategy.memory_in_use == 6
+        stream.write(b"b" * 6)
+        assert stream._rolled
+        assert strategy.memory_in_use == 0
+        stream.seek(0)
+        assert stream.read() == b"a" * 6 + b"b" * 6
+        stream.close()
+        assert strategy.as_dict() == {
+            "memory_in_use": 0,
+            "memory_peak": 6,
+            "memory_bytes": 6,
+            "file_bytes": 12,
+            "streams": 1,
+            "rollovers": 1,
+        }
+
+    def test_total_budget(self):
+        strategy = formparser.SpoolingStrategy(max_part_memory=10, max_memory=15)
+        a = strategy(None, None, None)
+        b = strategy(None, None, None)
+        a.write(b"a" * 10)
+        b.write(b"b" * 5)
+        b.seek(0)
+        b.write(b"c" * 5)
+        assert strategy.memory_in_use == 15
+        b.write(b"d")
+        assert not a._rolled
+        assert b._rolled
+        a.close()
+        assert strategy.memory_in_use == 0
+        c = strategy(None, None, None)
+        c.write(b"e" * 10)
+        assert not c._rolled
+        assert strategy.memory_peak == 15
+        strategy.reset()
+        assert strategy.memory_peak == 10
+        assert strategy.memory_bytes == 0
+
+    def test_content_length(self):
+        strategy = formparser.SpoolingStrategy(max_part_memory=10)
+        assert strategy(None, None, None, content_length=11)._rolled
+        assert not strategy(None, None, None, content_length=10)._rolled
+
+    @pytest.mark.parametrize(
+        "memfd",
+        [
+            pytest.param(
+                True,
+                marks=pytest.mark.skipif(
+                    not hasattr(os, "memfd_create"), reason="requires memfd"
+                ),
+            ),
+            False,
+        ],
+    )
+    def test_backing(self, memfd, tmp_path):
+        strategy = formparser.SpoolingStrategy(
+            max_part_memory=0, memfd=memfd, tmp_dir=str(tmp_path)
+        )
+        stream = strategy(None, None, None)
+        stream.write(b"data")
+        stream.flush()
+        assert os.fstat(stream.fileno()).st_size == 4
+        assert list(tmp_path.iterdir()) == []
+
+    def test_request(self):
+        class SpoolingRequest(Request):
+            spooling_strategy = formparser.SpoolingStrategy(max_part_memory=100)
+
+        data = (
+            b"--foo\r\n"
+            b'Content-Disposition: form-data; name="a"; filename="a.txt"\r\n\r\n'
+            + b"a" * 200
+            + b"\r\n--foo\r\n"
+            b'Content-Disposition: form-data; name="b"; filename="b.txt"\r\n\r\n'
+            b"b\r\n--foo--"
+        )
+        request = SpoolingRequest.from_values(
+            input_stream=io.BytesIO(data),
+            content_length=len(data),
+            content_type="multipart/form-data; boundary=foo",
+            method="POST",
+        )
+        assert request.files["a"].read() == b"a" * 200
+        assert request.files["b"].read() == b"b"
+        strategy = SpoolingRequest.spooling_strategy
+        assert strategy.streams == 2
+        assert strategy.rollovers == 1
+        assert strategy.memory_in_use == 1
+        request.close()
+        assert strategy.memory_in_use == 0
+
+
+def _parse_result(data, boundary, buffer_size=1024, **kwargs):
+    containers = []
+
+    def stream_factory(**options):
+        containers.append(io.BytesIO())
+        return containers[-1]
+
+    parser = formparser.MultiPartParser(
+        stream_factory, buffer_size=buffer_size, **kwargs
+    )
+
+    try:
+        form, files = parser.parse(io.BytesIO(data), boundary, len(data))
+        files = [(k, f.filename, f.read()) for k, f in files.items(multi=True)]
+    except ValueError as e:
+        return str(e)
+    finally:
+        for container in containers:
+            container.close()
+
+    return list(form.items(multi=True)), files
+
+
+_multipart_fixtures = [
+    ("firefox3-2png1txt", b"---------------------------186454651713519341951581030105"),
+    (
+        "firefox3-2pnglongtext",
+        b"---------------------------14904044739787191031754711748",
+    ),
+    ("opera8-2png1txt", b"----------zEO9jQKmLc2Cq88c23Dx19"),
+    ("webkit3-2png1txt", b"----WebKitFormBoundaryjdSFhcARk8fyGNy6"),
+    ("ie6-2png1txt", b"---------------------------7d91b03a20128"),
+    ("ie7_full_path_request.http", b"---------------------------7da36d1b4a0164"),
+]
+
+
+class TestScanBoundary:
+    @pytest.mark.parametrize(("name", "boundary"), _multipart_fixtures)
+    @pytest.mark.parametrize("buffer_size", [1024, 1028, 64 * 1024])
+    @pytest.mark.parametrize("mode", ["scan_boundary", "readinto"])
+    def test_fixtures(self, name, boundary, buffer_size, mode):
+        path = join(dirname(__file__), "multipart", name)
+
+        if not name.endswith(".http"):
+            path = join(path, "request.http")
+
+        data = get_contents(path)
+        expect = _parse_result(data, boundary, buffer_size)
+        assert _parse_result(data, boundary, buffer_size, **{mode: True}) == expect
+        assert expect[1]
+
+    @pytest.mark.parametrize(
+        "body",
+        [
+            b"value",
+            b"",
+            b"\r\n",
+            b"\n\n",
+            b"\r",
+            b"line\r\n\r\n--fo\r\n--foox\r\nx--foo\r\n--foo-",
+            b"\x00\xff" * 2000,
+            (b"a" * 1020 + b"\r\n") * 3,
+            b"-" * 3000,
+            b"\r" * 1500 + b"\n" * 1500,
+        ],
+    )
+    @pytest.mark.parametrize("nl", [b"\r\n", b"\n", b"\r"])
+    @pytest.mark.parametrize("end", [b"--foo--", b"--foo--  \r\nepilogue", b"--foo"])
+    @pytest.mark.parametrize("mode", ["scan_boundary", "readinto"])
+    def test_bodies(self, body, nl, end, mode):
+        data = b"".join(
+            [
+                b"\r\n--foo \r\n",
+                b'Content-Disposition: form-data; name="a"; filename="a.txt"',
+                nl * 2,
+                body,
+                nl,
+                b"--foo",
+                nl,
+                b'Content-Disposition: form-data; name="b"',
+                nl * 2,
+                body,
+                nl,
+                end,
+            ]
+        )
+        expect = _parse_result(data, b"foo")
+        assert _parse_result(data, b"foo", **{mode: True}) == expect
+
+    def test_transfer_encoding(self):
+        data = (
+            b'--foo\r\nContent-Disposition: form-data; name="test"\r\n'
+            b"Content-Transfer-Encoding: base64\r\n\r\n"
+            b"U2vlbmUgbORu\r\n--foo--"
+        )
+        result = _parse_result(data, b"foo", charset="latin1", scan_boundary=True)
+        assert result == ([("test", "Sk\xe5ne l\xe4n")], [])
+
+    def test_form_data_parser(self):
+        data = (
+            b"--foo\r\nContent-Disposition: form-data; name=foo\r\n\r\n"
+            b"Hello World\r\n--foo--"
+        )
+        parser = FormDataParser(scan_boundary=True)
+        _, form, _ = parser.parse(
+            io.BytesIO(data), "multipart/form-data", len(data), {"boundary": "foo"}
+        )
+        assert form["foo"] == "Hello World"
+
+    @pytest.mark.parametrize(
+        ("make_stream", "write_type"),
+        [
+            (io.BufferedReader, memoryview),
+            (lambda f: LimitedStream(io.BufferedReader(f), _size(f)), memoryview),
+            (lambda f: _ReadOnlyStream(f), bytes),
+            (lambda f: LimitedStream(_ReadOnlyStream(f), _size(f)), bytes),
+        ],
+    )
+    def test_readinto(self, make_stream, write_type):
+        data = (
+            b"--foo\r\nContent-Disposition: form-data; name=foo\r\n\r\n"
+            b"Hello World\r\n--foo\r\n"
+            b"Content-Disposition: form-data; name=bar; filename=bar.txt\r\n\r\n"
+            + b"x" * 3000
+            + b"\r\n--foo--"
+        )
+        written = []
+
+        class Container(io.BytesIO):
+            def write(self, data):
+                written.append(type(data))
+                return super().write(data)
+
+        parser = FormDataParser(
+            lambda **kwargs: Container(), readinto=True, max_form_memory_size=11
+        )
+        _, form, files = parser.parse(
+            make_stream(io.BytesIO(data)),
+            "multipart/form-data",
+            len(data),
+            {"boundary": "foo"},
+        )
+        assert form["foo"] == "Hello World"
+
+        assert files["bar"].read() == b"x" * 3000
+        files["bar"].close()
+
+        # streams that can't read into a buffer use scan_boundary
+        assert set(written) == {write_type}
+
+
+def _size(stream):
+    return len(stream.getvalue())
+
+
+class _ReadOnlyStream:
+    """A stream without ``readinto``, like some WSGI input streams."""
+
+    def __init__(self, stream):
+        self.read = stream.read
+        self.readline = stream.readline
+
+
+def _decode_events(decoder, data, size):
+    events = []
+
+    for i in range(0, len(data) + size, size):
+        decoder.feed(data[i : i + size])
+
+        while True:
+            event = decoder.next_event()
+
+            if event is formparser.NEED_DATA:
+                break
+
+            events.append(event)
+
+            if event is formparser.COMPLETE:
+                return events
+
+    return events
+
+
+class TestMultipartDecoder:
+    data = (
+        b"\r\n--foo\r\n"
+        b'Content-Disposition: form-data; name="a"\r\n\r\n'
+        b"Hello World\r\n"
+        b"--foo\r\n"
+        b'Content-Disposition: form-data; name="b"; filename="b.txt"\r\n'
+        b"Content-Type: text/plain\r\n\r\n"
+        b"file\r\ncontents\r\n"
+        b"--foo--\r\nepilogue"
+    )
+
+    @pytest.mark.parametrize("size", [1, 7, 1000])
+    def test_events(self, size):
+        decoder = formparser.MultipartDecoder(b"foo")
+        events = _decode_events(decoder, self.data, size)
+        headers = [e for e in events if isinstance(e, formparser.PartHeaders)]
+        assert [(e.name, e.filename) for e in headers] == [("a", None), ("b", "b.txt")]
+        assert headers[1].headers["Content-Type"] == "text/plain"
+        parts = []
+
+        for event in events:
+            if isinstance(event, formparser.PartHeaders):
+                parts.append(b"")
+            elif isinstance(event, formparser.PartData):
+                parts[-1] += event.data
+
+        assert parts == [b"Hello World", b"file\r\ncontents"]
+        assert sum(isinstance(e, formparser.PartEnd) for e in events) == 2
+        epilogue = [e.data for e in events if isinstance(e, formparser.Epilogue)]
+        assert b"".join(epilogue) == b"epilogue"
+        assert events[-1] is formparser.COMPLETE
+        assert decoder.next_event() is formparser.COMPLETE
+
+    def test_need_data(self):
+        decoder = formparser.MultipartDecoder(b"foo")
+        assert decoder.next_event() is formparser.NEED_DATA
+        decoder.feed(self.data[: self.data.index(b"Hello")])
+        event = decoder.next_event()
+        assert isinstance(event, formparser.PartHeaders)
+        assert decoder.next_event() is formparser.NEED_DATA
+
+    def test_max_content_length(self):
+        decoder = formparser.MultipartDecoder(b"foo", max_content_length=100)
+        decoder.feed(self.data[:100])
+
+        with pytest.raises(RequestEntityTooLarge):
+            decoder.feed(self.data[100:])
+
+    def test_max_form_memory_size(self):
+        decoder = formparser.MultipartDecoder(b"foo", max_form_memory_size=5)
+
+        with pytest.raises(RequestEntityTooLarge):
+            _decode_events(decoder, self.data, 1000)
+
+        # file parts don't count
+        decoder = formparser.MultipartDecoder(b"foo", max_form_memory_size=11)
+        assert _decode_events(decoder, self.data, 1000)[-1] is formparser.COMPLETE
+
+    def test_errors(self):
+        decoder = formparser.MultipartDecoder(b"foo")
+
+        with pytest.raises(ValueError, match="unexpected end of stream"):
+            _decode_events(decoder, self.data[: self.data.index(b"contents")], 1000)
+
+        decoder = formparser.MultipartDecoder(b"bar")
+
+        with pytest.raises(ValueError, match="Expected boundary"):
+            _decode_events(decoder, self.data, 1000)
+
+    def test_get_buffer(self):
+        decoder = formparser.MultipartDecoder(b"foo")
+        data = io.BytesIO(self.data)
+        parts = []
+
+        while True:
+            event = decoder.next_event()
+
+            if event is formparser.NEED_DATA:
+                decoder.buffer_updated(data.readinto(decoder.get_buffer(7)))
+            elif isinstance(event, formparser.PartHeaders):
+                parts.append(b"")
+            elif isinstance(event, formparser.PartData):
+                # form data is copied, file data is a view of the buffer
+                is_view = isinstance(event.data, memoryview)
+                assert is_view is (len(parts) == 2)
+                parts[-1] += event.data
+            elif event is formparser.COMPLETE:
+                break
+
+        assert parts == [b"Hello World", b"file\r\ncontents"]
+
 
 class TestInternalFunctions:
     def test_line_parser(self):
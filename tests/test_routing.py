@@ -1,4 +1,6 @@
 import gc
+import re
+import threading
 import uuid
 
 import pytest
@@ -1229,3 +1231,1026 @@ def test_rule_websocket_methods():
             methods=["get", "head", "options", "post"],
         )
     r.Rule("/ws", endpoint="ws", websocket=True, methods=["get", "head", "options"])
+
+
+def _make_matcher_test_map(matcher_class, **kwargs):
+    return r.Map(
+        [
+            r.Rule("/", endpoint="index"),
+            r.Rule("/about", endpoint="about"),
+            r.Rule("/docs/", endpoint="docs"),
+            r.Rule("/loose", endpoint="loose", strict_slashes=False),
+            r.Rule("/exact//slashes", endpoint="exact", merge_slashes=False),
+            r.Rule("/users/", endpoint="users", methods=["GET"]),
+            r.Rule("/users/", endpoint="users_new", methods=["POST"]),
+            r.Rule("/users/<int:id>", endpoint="user", methods=["GET", "PUT"]),
+            r.Rule("/users/<int(min=1000):id>", endpoint="big_user", methods=["POST"]),
+            r.Rule("/users/me", endpoint="me"),
+            r.Rule("/users/<name>", endpoint="user_by_name"),
+            r.Rule("/page/<int:page>.html", endpoint="page"),
+            r.Rule("/page/", defaults={"page": 1}, endpoint="page"),
+            r.Rule("/blob/<path:path>", endpoint="blob"),
+            r.Rule("/blob/<path:path>/raw", endpoint="raw"),
+            r.Rule("/<any(a, b, c):letter>/x", endpoint="letter"),
+            r.Rule("/uuid/<uuid:id>", endpoint="uuid"),
+            r.Rule("/float/<float:value>", endpoint="float"),
+            r.Rule("/old", redirect_to="about"),
+            r.Rule("/alias", endpoint="about", alias=True),
+            r.Rule("/ws", endpoint="ws", websocket=True),
+            r.Rule("/ws/both", endpoint="ws_both", websocket=True),
+            r.Rule("/ws/both", endpoint="http_both"),
+            r.Rule("/build", endpoint="build", build_only=True),
+            r.Rule("/empty/<string(minlength=0):value>", endpoint="empty"),
+            r.Subdomain(
+                "<sub>", [r.Rule("/", endpoint="sub"), r.Rule("/x", endpoint="x")]
+            ),
+        ],
+        matcher_class=matcher_class,
+        **kwargs,
+    )
+
+
+_matcher_test_paths = [
+    "",
+    "/",
+    "/about",
+    "/about/",
+    "//about",
+    "/docs",
+    "/docs/",
+    "/docs//",
+    "/loose",
+    "/loose/",
+    "/exact//slashes",
+    "/exact/slashes",
+    "/users",
+    "/users/",
+    "/users/42",
+    "/users/4200",
+    "/users/me",
+    "/users/someone",
+    "/users//42",
+    "/page/3.html",
+    "/page/1.html",
+    "/page/",
+    "/blob/a",
+    "/blob/a/b/c",
+    "/blob/a//b/raw",
+    "/a/x",
+    "/d/x",
+    "/uuid/7b1b9f3e-4bdc-4a2f-9a1c-5a6b7c8d9e0f",
+    "/uuid/nope",
+    "/float/1.5",
+    "/float/1",
+    "/old",
+    "/alias",
+    "/ws",
+    "/ws/both",
+    "/build",
+    "/empty/",
+    "/empty/value",
+    "/x",
+    "/missing",
+]
+
+
+class _ScanMatcher(r.RuleMatcher):
+    """Reference matcher that tries every rule, like Werkzeug did before
+    matchers were added.
+    """
+
+    def match(self, domain_part, path_part, method):
+        path = f"{domain_part}|{path_part}"
+
+        for rule in self.rules:
+            rv = rule.match(path, method)
+
+            if rv is not None:
+                yield rule, rv
+
+
+def _match_outcome(adapter, path, method, websocket=None):
+    try:
+        return adapter.match(path, method, websocket=websocket)
+    except r.RequestRedirect as e:
+        return "redirect", e.new_url
+    except r.MethodNotAllowed as e:
+        return "method", sorted(e.valid_methods)
+    except r.HTTPException as e:
+        return type(e).__name__
+
+
+class _SmallBatchMatcher(r.CombinedRegexMatcher):
+    batch_size = 2
+
+
+@pytest.mark.parametrize(
+    "matcher_class",
+    [
+        r.TableMatcher,
+        r.StateMachineMatcher,
+        r.CombinedRegexMatcher,
+        _SmallBatchMatcher,
+    ],
+)
+@pytest.mark.parametrize("subdomain", ["", "api"])
+def test_matcher_equivalence(matcher_class, subdomain):
+    expect = _make_matcher_test_map(_ScanMatcher).bind(
+        "example.org", subdomain=subdomain
+    )
+    adapter = _make_matcher_test_map(matcher_class).bind(
+        "example.org", subdomain=subdomain
+    )
+
+    for path in _matcher_test_paths:
+        for method in ("GET", "POST", "PUT", "DELETE"):
+            for websocket in (False, True):
+                assert _match_outcome(
+                    adapter, path, method, websocket
+                ) == _match_outcome(expect, path, method, websocket), (path, method)
+
+        assert adapter.allowed_methods(path) == expect.allowed_methods(path)
+
+
+def test_state_machine_matcher_host_matching():
+    m = r.Map(
+        [
+            r.Rule("/", endpoint="www_index", host="www.example.com"),
+            r.Rule("/", endpoint="user_index", host="<user>.example.com"),
+            r.Rule("/files/<path:name>", endpoint="files", host="<user>.example.com"),
+        ],
+        host_matching=True,
+        matcher_class=r.StateMachineMatcher,
+    )
+    assert m.bind("www.example.com").match("/") == ("www_index", {})
+    assert m.bind("abc.example.com").match("/") == ("user_index", {"user": "abc"})
+    assert m.bind("abc.example.com").match("/files/a/b") == (
+        "files",
+        {"user": "abc", "name": "a/b"},
+    )
+    pytest.raises(r.NotFound, m.bind("example.org").match, "/")
+
+
+def test_state_machine_matcher_segment_values():
+    m = r.Map(
+        [
+            r.Rule("/<any(en, de):lang>/page/<int(max=9):id>", endpoint="page"),
+            r.Rule("/<any(en, de):lang>/page/<name>", endpoint="name"),
+            r.Rule("/item/<int:id>-<slug>", endpoint="item"),
+            r.Rule("/docs/<name>/", endpoint="docs"),
+        ],
+        lazy_compile=True,
+        matcher_class=r.StateMachineMatcher,
+    )
+    page, name, item, docs = (
+        m._rules_by_endpoint[e][0] for e in ("page", "name", "item", "docs")
+    )
+    a = m.bind("example.org")
+    assert a.match("/de/page/3") == ("page", {"lang": "de", "id": 3})
+    # to_python still validates the value taken from the segment
+    assert a.match("/de/page/12") == ("name", {"lang": "de", "name": "12"})
+    # every converter is a whole segment, the regex isn't compiled
+    assert page._regex is None and name._regex is None
+    # the other rules need their regex
+    assert a.match("/item/3-abc") == ("item", {"id": 3, "slug": "abc"})
+    assert item._regex is not None
+    pytest.raises(r.RequestRedirect, a.match, "/docs/abc")
+    assert docs._regex is not None
+
+
+def test_matcher_class_attribute():
+    class CustomMap(r.Map):
+        matcher_class = r.StateMachineMatcher
+
+    m = CustomMap([r.Rule("/", endpoint="index")])
+    assert m.bind("example.org").match("/") == ("index", {})
+    assert isinstance(m._snapshot.matcher, r.StateMachineMatcher)
+    m = r.Map(matcher_class=r.TableMatcher)
+    assert m.matcher_class is r.TableMatcher
+
+
+def test_converter_part_isolating():
+    class SlashConverter(r.BaseConverter):
+        regex = "[^/]+/[^/]+"
+
+    class CustomConverter(r.BaseConverter):
+        regex = "[^/]+[a-z]"
+
+    class DotConverter(r.BaseConverter):
+        regex = ".+"
+
+    class DeclaredConverter(r.BaseConverter):
+        regex = ".+"
+        part_isolating = True
+
+    assert r.BaseConverter.part_isolating
+    assert not r.PathConverter.part_isolating
+    assert not SlashConverter.part_isolating
+    assert CustomConverter.part_isolating
+    assert not DotConverter.part_isolating
+    assert DeclaredConverter.part_isolating
+    m = r.Map()
+    assert r.AnyConverter(m, "a", "b").part_isolating
+    assert not r.AnyConverter(m, "a", "b/c").part_isolating
+
+
+@pytest.mark.parametrize(
+    ("regex", "expect"),
+    [
+        ("[^/]+", False),
+        (r"\w+-\d+", False),
+        ("[A-Fa-f0-9_-]{4}", False),
+        ("[^/?]+", False),
+        (".+", True),
+        (r"\S+", True),
+        ("[^a]+", True),
+        ("[ -~]+", True),
+        (r"a\x2fb", True),
+        ("[^/]+/[^/]+", True),
+    ],
+)
+def test_converter_matches_slash(regex, expect):
+    assert r._matches_slash(regex) is expect
+
+
+@pytest.mark.parametrize(
+    "matcher_class", [r.TableMatcher, r.StateMachineMatcher, r.CombinedRegexMatcher]
+)
+def test_converter_dot_regex(matcher_class):
+    class RestConverter(r.BaseConverter):
+        regex = ".+"
+
+    m = r.Map(
+        [r.Rule("/foo/<rest:r>", endpoint="a")],
+        converters={"rest": RestConverter},
+        matcher_class=matcher_class,
+    )
+    adapter = m.bind("example.org")
+    assert adapter.match("/foo/a/b") == ("a", {"r": "a/b"})
+    assert adapter.match("/foo/a") == ("a", {"r": "a"})
+
+
+def test_table_matcher_static_index():
+    m = r.Map(
+        [
+            r.Rule("/health", endpoint="health"),
+            r.Rule("/docs/", endpoint="docs"),
+            r.Rule("/ab", defaults={"page": 1}, endpoint="ab"),
+            r.Rule("/a<string(minlength=0):x>b", endpoint="dynamic"),
+            r.Rule("/<name>", endpoint="name"),
+        ]
+    )
+    a = m.bind("example.org")
+    assert a.match("/health") == ("health", {})
+    assert a.match("/docs/") == ("docs", {})
+    pytest.raises(r.RequestRedirect, a.match, "/docs")
+    # the rule with a converter has more static parts and comes first
+    assert a.match("/ab") == ("dynamic", {"x": ""})
+    assert a.match("/other") == ("name", {"name": "other"})
+    static = m._snapshot.matcher._static
+    assert {("", "/health"), ("", "/docs"), ("", "/docs/"), ("", "/ab")} == set(
+        static
+    )
+
+
+def test_table_matcher_domain_buckets():
+    m = r.Map(
+        [
+            r.Rule("/<page>", host="a.example.org", endpoint="a"),
+            r.Rule("/<page>", host="b.example.org", endpoint="b"),
+            r.Rule("/b/<page>", host="<tenant>.example.org", endpoint="tenant"),
+            r.Rule("/<page>", host="<tenant>.example.org", endpoint="fallback"),
+        ],
+        host_matching=True,
+    )
+    assert m.bind("a.example.org").match("/x") == ("a", {"page": "x"})
+    assert m.bind("b.example.org").match("/x") == ("b", {"page": "x"})
+    # a rule for any host takes precedence if it has more static parts
+    assert m.bind("a.example.org").match("/b/x") == (
+        "tenant",
+        {"tenant": "a", "page": "x"},
+    )
+    assert m.bind("c.example.org").match("/x") == (
+        "fallback",
+        {"tenant": "c", "page": "x"},
+    )
+    with pytest.raises(r.RequestRedirect) as exc_info:
+        m.bind("b.example.org").match("/b//x")
+
+    assert exc_info.value.new_url == "http://b.example.org/b/x"
+    matcher = m._snapshot.matcher
+    assert {
+        domain: [rule.endpoint for _, rule in group]
+        for domain, group in matcher._dynamic.items()
+    } == {"a.example.org": ["a"], "b.example.org": ["b"]}
+    assert [rule.endpoint for _, rule in matcher._any_domain] == ["tenant", "fallback"]
+
+
+def test_same_pattern_rules():
+    m = r.Map(
+        [
+            r.Rule("/item/<int:id>", endpoint="show", methods=["GET"]),
+            r.Rule("/item/<int:id>", endpoint="update", methods=["PUT"]),
+            r.Rule("/item/<int:id>", endpoint="delete", methods=["DELETE"]),
+            r.Rule("/item/new", endpoint="new", methods=["POST"]),
+            r.Rule("/<name>", endpoint="page", methods=["GET"]),
+            r.Rule("/about", endpoint="about", methods=["POST"]),
+            r.Rule("/files/<path:name>", endpoint="files", methods=["GET"]),
+        ]
+    )
+    a = m.bind("example.org")
+    assert sorted(a.allowed_methods("/item/1")) == ["DELETE", "GET", "HEAD", "PUT"]
+    assert sorted(a.allowed_methods("/item/new")) == ["POST"]
+    assert sorted(a.allowed_methods("/about")) == ["GET", "HEAD", "POST"]
+    assert a.match("/item/1", method="PUT") == ("update", {"id": 1})
+
+    with pytest.raises(r.MethodNotAllowed) as exc_info:
+        a.match("/item/1", method="POST")
+
+    assert sorted(exc_info.value.valid_methods) == ["DELETE", "GET", "HEAD", "PUT"]
+    show, new, about = (m._rules_by_endpoint[e][0] for e in ("show", "new", "about"))
+    same_pattern = m._snapshot.same_pattern_rules(show)
+    assert [rule.endpoint for rule in same_pattern] == ["show", "update", "delete"]
+    assert [rule.endpoint for rule in m._snapshot.same_pattern_rules(new)] == ["new"]
+    # "/<name>" matches "/about" as well
+    assert m._snapshot.same_pattern_rules(about) is None
+    # rules with converters that match slashes overlap other rules
+    m.add(r.Rule("/<path:rest>", endpoint="any", methods=["PATCH"]))
+    assert sorted(a.allowed_methods("/item/1")) == [
+        "DELETE",
+        "GET",
+        "HEAD",
+        "PATCH",
+        "PUT",
+    ]
+    assert m._snapshot.same_pattern_rules(show) is None
+
+
+def test_same_pattern_rules_custom_converter():
+    class RestConverter(r.BaseConverter):
+        regex = ".+"
+
+    class SegmentConverter(r.BaseConverter):
+        regex = "[^/]+"
+
+    class DeclaredConverter(r.BaseConverter):
+        regex = "[^/]+"
+        part_isolating = True
+
+    m = r.Map(
+        [
+            r.Rule("/foo/<rest:r>", endpoint="a", methods=["GET"]),
+            r.Rule("/foo/<rest:r>/x", endpoint="b", methods=["POST"]),
+            r.Rule("/seg/<seg:s>", endpoint="seg"),
+            r.Rule("/seg/<seg:s>/x", endpoint="seg_x"),
+            r.Rule("/declared/<declared:d>", endpoint="declared"),
+            r.Rule("/declared/<declared:d>/x", endpoint="declared_x"),
+        ],
+        converters={
+            "rest": RestConverter,
+            "seg": SegmentConverter,
+            "declared": DeclaredConverter,
+        },
+    )
+    a = m.bind("example.org")
+
+    with pytest.raises(r.MethodNotAllowed) as exc_info:
+        a.match("/foo/bar/x", method="PUT")
+
+    assert sorted(exc_info.value.valid_methods) == ["GET", "HEAD", "POST"]
+    assert sorted(a.allowed_methods("/foo/bar/x")) == ["GET", "HEAD", "POST"]
+    # the inferred part_isolating of converters isn't trusted
+    seg, declared = (m._rules_by_endpoint[e][0] for e in ("seg", "declared"))
+    assert m._snapshot.same_pattern_rules(seg) is None
+    assert m._snapshot.same_pattern_rules(declared) == [declared]
+
+
+def test_match_cache():
+    m = r.Map(
+        [
+            r.Rule("/", endpoint="index"),
+            r.Rule("/docs/", endpoint="docs"),
+            r.Rule("/user/<int:id>", endpoint="user", methods=["GET"]),
+        ],
+        match_cache_size=2,
+    )
+    assert m.match_cache_info() == (0, 0, 2, 0)
+    a = m.bind("example.org")
+    assert a.match("/user/1") == ("user", {"id": 1})
+    endpoint, values = a.match("/user/1")
+    assert endpoint == "user"
+    assert m.match_cache_info() == (1, 1, 2, 1)
+    # the cached values are not shared with the caller
+    values["id"] = 2
+    assert a.match("/user/1") == ("user", {"id": 1})
+
+    for _ in range(2):
+        with pytest.raises(r.MethodNotAllowed) as exc_info:
+            a.match("/user/1", method="POST")
+
+        assert sorted(exc_info.value.valid_methods) == ["GET", "HEAD"]
+
+    # the cache key includes the method, "/user/1" GET was evicted
+    assert m.match_cache_info().currsize == 2
+
+    for _ in range(2):
+        with pytest.raises(r.RequestRedirect) as exc_info:
+            a.match("/docs", query_args="q=1")
+
+        assert exc_info.value.new_url == "http://example.org/docs/?q=1"
+
+    # redirects are built by the adapter, not cached
+    b = m.bind("example.com", "/app")
+    with pytest.raises(r.RequestRedirect) as exc_info:
+        b.match("/docs")
+    assert exc_info.value.new_url == "http://example.com/app/docs/"
+    pytest.raises(r.NotFound, a.match, "/missing")
+    pytest.raises(r.NotFound, a.match, "/missing")
+
+    # adding a rule clears the cache but keeps the statistics
+    hits = m.match_cache_info().hits
+    m.add(r.Rule("/missing", endpoint="missing"))
+    assert a.match("/missing") == ("missing", {})
+    assert m.match_cache_info().hits == hits
+    assert m.match_cache_info().currsize == 1
+
+
+def test_match_cache_mutable_values():
+    calls = []
+
+    class ListConverter(r.BaseConverter):
+        def to_python(self, value):
+            calls.append(value)
+            return value.split(",")
+
+    m = r.Map(
+        [r.Rule("/l/<list:xs>", endpoint="list")],
+        converters={"list": ListConverter},
+        match_cache_size=2,
+    )
+    a = m.bind("example.org")
+    _, values = a.match("/l/a,b")
+    values["xs"].append("c")
+    # lists could be changed by the caller, the match isn't cached
+    assert a.match("/l/a,b") == ("list", {"xs": ["a", "b"]})
+    assert calls == ["a,b", "a,b"]
+    assert m.match_cache_info().currsize == 0
+
+
+def test_match_cache_disabled():
+    m = r.Map([r.Rule("/", endpoint="index")])
+    assert m.bind("example.org").match("/") == ("index", {})
+    assert m.match_cache_info() is None
+
+
+def test_combined_regex_matcher_rejected_alternative():
+    m = r.Map(
+        [
+            r.Rule("/<int(max=10):value>", endpoint="small"),
+            r.Rule("/<int:value>", endpoint="int"),
+            r.Rule("/<value>", endpoint="other"),
+        ],
+        matcher_class=r.CombinedRegexMatcher,
+    )
+    a = m.bind("example.org")
+    assert a.match("/5") == ("small", {"value": 5})
+    # the converter of the first matching alternative rejects the value
+    assert a.match("/50") == ("int", {"value": 50})
+    assert a.match("/x") == ("other", {"value": "x"})
+
+
+def test_combined_regex_matcher_reuses_batches():
+    m = r.Map(
+        [r.Rule(f"/items{i}/<int:id>", endpoint=f"item{i}") for i in range(1000)],
+        matcher_class=r.CombinedRegexMatcher,
+    )
+    m.update()
+    old = {id(regex) for regex, _ in m._snapshot.matcher._batches}
+    m.add(r.Rule("/added", endpoint="added"))
+    a = m.bind("example.org")
+    assert a.match("/added") == ("added", {})
+    assert a.match("/items150/3") == ("item150", {"id": 3})
+    new = [regex for regex, _ in m._snapshot.matcher._batches]
+    # only the batch the rule was added to is compiled again, and the
+    # next one if the batch had the maximum size
+    assert len(new) > 10
+    assert len([regex for regex in new if id(regex) not in old]) <= 3
+
+
+def _make_compile_cache_rules():
+    return [
+        r.Rule("/", endpoint="index"),
+        r.Rule("/user/<int:id>", endpoint="user"),
+        r.Rule("/page/", defaults={"page": 1}, endpoint="page"),
+        r.Rule("/page/<int:page>", endpoint="page"),
+        r.Rule("/files/<path:name>", endpoint="files"),
+        r.Rule("/<any(a, b):kind>/", endpoint="kind", subdomain="api"),
+    ]
+
+
+def test_compile_cache(tmp_path, monkeypatch):
+    path = str(tmp_path / "routes.cache")
+    m = r.Map(_make_compile_cache_rules(), compile_cache=path)
+    assert (tmp_path / "routes.cache").exists()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("rule was compiled")
+
+    with monkeypatch.context() as mp:
+        mp.setattr(r.Rule, "_compile_builder", fail)
+        cached = r.Map(_make_compile_cache_rules(), compile_cache=path)
+
+    for url_map in m, cached:
+        a = url_map.bind("example.org")
+        assert a.match("/user/3") == ("user", {"id": 3})
+        assert a.match("/page/") == ("page", {"page": 1})
+        assert a.match("/files/a/b.txt") == ("files", {"name": "a/b.txt"})
+        pytest.raises(r.NotFound, a.match, "/a/")
+        api = url_map.bind("example.org", subdomain="api")
+        assert api.match("/a/") == ("kind", {"kind": "a"})
+        pytest.raises(r.NotFound, api.match, "/c/")
+        assert a.build("page", {"page": 1}) == "/page/"
+        assert a.build("page", {"page": 2, "q": "x"}) == "/page/2?q=x"
+        assert a.build("user", {"id": 3}) == "/user/3"
+        assert url_map.is_endpoint_expecting("user", "id")
+
+    # a changed rule is compiled again and the cache is updated
+    compiled = []
+    real_compile_builder = r.Rule._compile_builder
+
+    def compile_builder(self, *args, **kwargs):
+        compiled.append(self.rule)
+        return real_compile_builder(self, *args, **kwargs)
+
+    def make_rules():
+        rules = _make_compile_cache_rules()
+        rules[1] = r.Rule("/user/<int:id>", endpoint="user", strict_slashes=False)
+        rules.append(r.Rule("/about", endpoint="about"))
+        return rules
+
+    monkeypatch.setattr(r.Rule, "_compile_builder", compile_builder)
+    r.Map(make_rules(), compile_cache=path)
+    assert compiled == ["/user/<int:id>"] * 2 + ["/about"] * 2
+    del compiled[:]
+    r.Map(make_rules(), compile_cache=path)
+    assert compiled == []
+    # a different configuration doesn't use the cache
+    r.Map(make_rules(), compile_cache=path, charset="latin1")
+    assert len(compiled) == 2 * len(make_rules())
+
+
+def test_compile_cache_converter_changed(tmp_path, monkeypatch):
+    path = str(tmp_path / "routes.cache")
+
+    class C(r.BaseConverter):
+        regex = "[a-z]+"
+
+    def make_map():
+        return r.Map(
+            [r.Rule("/p/<c:v>", endpoint="p")],
+            converters={"c": C},
+            compile_cache=path,
+        )
+
+    assert make_map().bind("example.org").match("/p/abc") == ("p", {"v": "abc"})
+    # a deploy changed the regex of the converter
+    monkeypatch.setattr(C, "regex", r"\d+")
+    a = make_map().bind("example.org")
+    assert a.match("/p/123") == ("p", {"v": "123"})
+    pytest.raises(r.NotFound, a.match, "/p/abc")
+    # the weight is part of the order of the rules
+    monkeypatch.setattr(C, "weight", 50)
+    assert make_map()._rules[0]._argument_weights == [50]
+
+
+def test_compile_cache_invalid(tmp_path):
+    path = tmp_path / "routes.cache"
+    path.write_bytes(b"not a cache")
+    m = r.Map(_make_compile_cache_rules(), compile_cache=str(path))
+    assert m.bind("example.org").match("/user/3") == ("user", {"id": 3})
+    # the invalid file was replaced
+    assert r.Map(compile_cache=str(path))._load_compile_cache(str(path))
+    # no rules needed compiling, the file isn't written
+    path.write_bytes(b"")
+    r.Map(compile_cache=str(path))
+    assert path.read_bytes() == b""
+
+
+def test_lazy_compile():
+    m = r.Map(
+        [
+            r.Rule("/", endpoint="index"),
+            r.Rule("/user/<int:id>", endpoint="user"),
+            r.Rule("/about", endpoint="about", build_only=True),
+        ],
+        lazy_compile=True,
+    )
+    index, user, about = (
+        m._rules_by_endpoint[endpoint][0] for endpoint in ("index", "user", "about")
+    )
+    assert all(rule._regex is None and rule._build is None for rule in m._rules)
+    a = m.bind("example.org")
+    assert a.match("/user/3") == ("user", {"id": 3})
+    assert user._regex is not None
+    assert index._build is None
+    assert a.build("user", {"id": 4}) == "/user/4"
+    assert user._build is not None
+    assert index._build is None
+    # build only rules are never matched and have no regex
+    assert about._regex_pattern is None
+    m.compile_all()
+    assert all(rule._build is not None for rule in m._rules)
+    assert index._regex is not None
+    assert about._regex is None
+    assert a.build("about") == "/about"
+
+
+def test_build_cache():
+    m = r.Map(
+        [
+            r.Rule("/", endpoint="index"),
+            r.Rule("/page/", defaults={"page": 1}, endpoint="page"),
+            r.Rule("/page/<int:page>", endpoint="page"),
+            r.Rule("/flag/<int:value>", endpoint="flag"),
+        ],
+        build_cache_size=10,
+    )
+    a = m.bind("example.org")
+    assert a.build("page", {"page": 1}) == "/page/"
+    assert a.build("page", {"page": 1}) == "/page/"
+    assert m.build_cache_info() == (1, 1, 10, 1)
+    assert a.build("page", {"page": 2}) == "/page/2"
+    # values that are equal but have a different type are cached separately
+    assert a.build("page", {"page": 1.0}) == "/page/"
+    assert a.build("page", {"page": True}) == "/page/"
+    assert m.build_cache_info().currsize == 4
+    # the key includes the bound adapter and the build arguments
+    b = m.bind("example.com", "/app")
+    assert b.build("page", {"page": 1}) == "/app/page/"
+    assert b.build("page", {"page": 1}, force_external=True) == (
+        "http://example.com/app/page/"
+    )
+    assert a.build("index", {"q": "x"}) == "/?q=x"
+    assert a.build("index", {"q": "x"}, append_unknown=False) == "/"
+    # values that may change aren't cached
+    currsize = m.build_cache_info().currsize
+    assert a.build("index", {"q": ["x", "y"]}) == "/?q=x&q=y"
+    assert m.build_cache_info().currsize == currsize
+    # errors aren't cached
+    pytest.raises(r.BuildError, a.build, "flag", {})
+    pytest.raises(r.BuildError, a.build, "flag", {})
+    assert m.build_cache_info().currsize == currsize
+    # adding a rule clears the cache
+    m.add(r.Rule("/start", endpoint="start"))
+    assert a.build("start") == "/start"
+    assert m.build_cache_info().currsize == 1
+
+
+def test_build_cache_default_method():
+    m = r.Map(
+        [
+            r.Rule("/a", endpoint="x", methods=["POST"]),
+            r.Rule("/b", endpoint="x", methods=["GET"]),
+        ],
+        build_cache_size=10,
+    )
+    get = m.bind("example.org", default_method="GET")
+    post = m.bind("example.org", default_method="POST")
+    assert get.build("x") == "/b"
+    assert post.build("x") == "/a"
+    assert get.build("x") == "/b"
+    assert get.build("x", method="POST") == "/a"
+
+
+def test_build_cache_disabled():
+    m = r.Map([r.Rule("/", endpoint="index")])
+    assert m.bind("example.org").build("index") == "/"
+    assert m.build_cache_info() is None
+
+
+def test_build_dispatch():
+    m = r.Map(
+        [
+            r.Rule("/", endpoint="index", methods=["GET"]),
+            r.Rule("/<lang>/", endpoint="index"),
+            r.Rule("/<lang>/<int:page>", endpoint="index"),
+            r.Rule("/new", endpoint="index", methods=["POST"]),
+        ]
+    )
+    a = m.bind("example.org")
+    assert a.build("index", {"q": "x"}) == "/?q=x"
+    assert a.build("index", {"lang": "en", "q": "x"}) == "/en/?q=x"
+    assert a.build("index", {"lang": "en", "page": 2}) == "/en/2"
+    assert a.build("index", method="POST") == "/new"
+    names, by_keys = m._snapshot.build_dispatch["index"]
+    assert names == {"lang", "page"}
+    # only the names of arguments are part of the key
+    assert [rule.rule for rule in by_keys[("GET", frozenset({"lang"}))]] == [
+        "/<lang>/",
+        "/",
+    ]
+    assert [rule.rule for rule in by_keys[("POST", frozenset())]] == ["/new"]
+
+
+@pytest.mark.parametrize("host_matching", [False, True])
+def test_build_many(host_matching):
+    host = {"host": "example.org"} if host_matching else {}
+    m = r.Map(
+        [
+            r.Rule("/page/", defaults={"page": 1}, endpoint="page", **host),
+            r.Rule("/page/<int:page>", endpoint="page", **host),
+            r.Rule("/<lang>/page/<int:page>", endpoint="page", **host),
+            r.Rule("/page/<int:page>", endpoint="page", methods=["POST"], **host),
+            r.Rule("/ws/<int:page>", endpoint="page", websocket=True, **host),
+            r.Rule("/item/<int:id>", endpoint="item", **host),
+        ],
+        host_matching=host_matching,
+    )
+    a = m.bind("example.org", "/app")
+    values = [
+        {"page": 1},
+        {"page": 2},
+        {"page": 2, "lang": "en"},
+        {"page": 3, "lang": None},
+        MultiDict([("page", 4), ("q", "a"), ("q", "b")]),
+        {"page": 5, "q": "x"},
+    ]
+
+    for kwargs in (
+        {},
+        {"force_external": True},
+        {"append_unknown": False},
+        {"url_scheme": "https"},
+        {"method": "POST"},
+    ):
+        expect = [a.build("page", v, **kwargs) for v in values]
+        assert list(a.build_many("page", values, **kwargs)) == expect
+
+    assert list(a.build_many("page", [])) == []
+    urls = a.build_many("item", [{"id": 1}, {"id": 2}, {}])
+    assert next(urls) == "/app/item/1"
+    assert next(urls) == "/app/item/2"
+
+    with pytest.raises(r.BuildError):
+        next(urls)
+
+
+def test_add_keeps_rules_sorted():
+    def make_rules():
+        return [
+            r.Rule("/<name>", endpoint="page"),
+            r.Rule("/about", endpoint="about"),
+            r.Rule("/page/", defaults={"page": 1}, endpoint="page"),
+            r.Rule("/<name>/<int:id>", endpoint="page"),
+            r.Rule("/about", endpoint="about2"),
+            r.Rule("/page/<int:page>", endpoint="page"),
+        ]
+
+    rules = make_rules()
+    m = r.Map(rules)
+    # equal keys keep the order the rules were added in
+    assert m._rules == sorted(rules, key=lambda rule: rule.match_compare_key())
+    assert [rule.endpoint for rule in m._rules[:2]] == ["about", "about2"]
+    assert [rule.rule for rule in m._rules_by_endpoint["page"]] == [
+        "/<name>/<int:id>",
+        "/page/",
+        "/<name>",
+        "/page/<int:page>",
+    ]
+
+    one_by_one = r.Map()
+
+    for rule in make_rules():
+        one_by_one.add(rule)
+
+    merged = r.Map(make_rules()[:3])
+    merged.add_many(make_rules()[3:])
+
+    for url_map in one_by_one, merged:
+        assert [rule.endpoint for rule in url_map._rules] == [
+            rule.endpoint for rule in m._rules
+        ]
+        assert url_map._rules_by_endpoint == m._rules_by_endpoint
+        assert url_map.bind("example.org").match("/about") == ("about", {})
+
+
+def test_add_many_error():
+    bound = r.Rule("/bound", endpoint="bound")
+    r.Map([bound])
+    m = r.Map()
+
+    with pytest.raises(RuntimeError):
+        m.add_many([r.Rule("/a", endpoint="a"), bound, r.Rule("/b", endpoint="b")])
+
+    # rules bound before the error are added, like with add
+    assert [rule.endpoint for rule in m.iter_rules()] == ["a"]
+    assert m.bind("example.org").match("/a") == ("a", {})
+
+
+def test_snapshot():
+    m = r.Map([r.Rule("/", endpoint="index")])
+    a = m.bind("example.org")
+    assert a.match("/") == ("index", {})
+    snapshot = m._snapshot
+    m.add(r.Rule("/a", endpoint="a"))
+    # the snapshot in use is replaced on the next match, not changed
+    assert m._snapshot is snapshot
+    assert a.match("/a") == ("a", {})
+    assert m._snapshot.version == snapshot.version + 1
+    assert [rule.endpoint for rule in snapshot.rules] == ["index"]
+    assert list(snapshot.rules_by_endpoint) == ["index"]
+
+
+def test_add_while_matching():
+    m = r.Map([r.Rule("/", endpoint="index")])
+    errors = []
+
+    def add_rules():
+        try:
+            for i in range(200):
+                m.add(r.Rule(f"/page{i}/<int:id>", endpoint=f"page{i}"))
+                m.bind("example.org").build(f"page{i}", {"id": 1})
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=add_rules)
+    thread.start()
+    a = m.bind("example.org")
+
+    while thread.is_alive():
+        assert a.match("/") == ("index", {})
+        pytest.raises(r.NotFound, a.match, "/missing")
+
+    thread.join()
+    assert not errors
+    assert a.match("/page199/1") == ("page199", {"id": 1})
+
+
+def test_routing_stats():
+    assert r.Map().stats is None
+    m = r.Map(
+        [
+            r.Rule("/", endpoint="index", methods=["GET"]),
+            r.Rule("/page/<int:page>", endpoint="page"),
+            r.Rule("/dir/", endpoint="dir"),
+            r.Rule("/unused", endpoint="unused"),
+        ],
+        collect_stats=True,
+        matcher_class=_ScanMatcher,
+    )
+    adapter = m.bind("localhost")
+    assert adapter.match("/") == ("index", {})
+    assert adapter.match("/page/2") == ("page", {"page": 2})
+
+    with pytest.raises(r.RequestRedirect):
+        adapter.match("/dir")
+
+    with pytest.raises(r.NotFound):
+        adapter.match("/missing")
+
+    with pytest.raises(r.MethodNotAllowed):
+        adapter.match("/", method="POST")
+
+    assert adapter.build("page", {"page": 3}) == "/page/3"
+    assert list(adapter.build_many("page", [{"page": 1}, {"page": 2}])) == [
+        "/page/1",
+        "/page/2",
+    ]
+
+    with pytest.raises(r.BuildError):
+        adapter.build("missing")
+
+    data = m.stats.as_dict()
+    assert data["match"]["count"] == 5
+    assert data["match"]["outcomes"] == {
+        "match": 2,
+        "redirect": 1,
+        "not_found": 1,
+        "method_not_allowed": 1,
+    }
+    assert data["match"]["rules_tried"]["max"] == 4
+    assert data["match"]["seconds"]["count"] == 5
+    assert sum(count for _, count in data["match"]["seconds"]["buckets"]) == 5
+    assert data["match"]["seconds"]["buckets"][-1][0] is None
+    assert data["build"]["count"] == 4
+    assert data["build"]["errors"] == 1
+    rules = {item["endpoint"]: item for item in data["rules"]}
+    assert rules["index"]["hits"] == 1
+    assert rules["index"]["methods"] == ["GET", "HEAD"]
+    assert rules["index"]["subdomain"] == ""
+    assert rules["page"]["hits"] == 1
+    assert rules["unused"]["hits"] == 0
+    assert rules["unused"]["tried"] > 0
+    m.stats.reset()
+    assert m.stats.as_dict()["match"]["count"] == 0
+    # only rules of maps that collect stats record that they were tried
+    assert "match" in vars(m._rules[0])
+    assert "match" not in vars(r.Map([r.Rule("/", endpoint="index")])._rules[0])
+
+
+def test_closest_match_in_large_map():
+    m = r.Map(
+        [r.Rule(f"/item{i}/<int:id>", endpoint=f"item_{i}") for i in range(500)]
+        + [r.Rule("/settings", endpoint="account.settings")]
+    )
+    adapter = m.bind("example.com")
+    error = r.BuildError("acount.settings", {}, None, adapter)
+    assert error.suggested.endpoint == "account.settings"
+    assert "Did you mean 'account.settings' instead?" in str(error)
+    assert len(m._snapshot.similar_endpoints("item_1")) == 10
+    assert m._snapshot.similar_endpoints("item_1")[0] == "item_1"
+    assert len(m._snapshot.similar_endpoints("zzz")) == 10
+
+
+@pytest.mark.parametrize(
+    ("converter", "args"),
+    [
+        (r.UnicodeConverter, {}),
+        (r.UnicodeConverter, {"minlength": 0}),
+        (r.UnicodeConverter, {"minlength": 2, "maxlength": 3}),
+        (r.UnicodeConverter, {"length": 2}),
+        (r.AnyConverter, {}),
+        (r.IntegerConverter, {}),
+    ],
+)
+def test_converter_part_matcher(converter, args):
+    if converter is r.AnyConverter:
+        c = converter(r.Map(), "a", "bc", "d.e")
+    else:
+        c = converter(r.Map(), **args)
+
+    test = c.part_matcher()
+    assert test is not None
+    values = [
+        "",
+        "a",
+        "bc",
+        "d.e",
+        "dxe",
+        "abcd",
+        "0",
+        "42",
+        "-42",
+        "--4",
+        "-",
+        "4a",
+        "²",
+        "٣",
+        "1.5",
+        "-1.5",
+        "1.",
+        ".5",
+        "1.2.3",
+        "12345678-1234-5678-1234-567812345678",
+        "12345678-1234-5678-1234-56781234567g",
+        "12345678-1234-5678-1234-5678123456-8",
+        "123456781-234-5678-1234-567812345678",
+    ]
+
+    for value in values:
+        expect = re.fullmatch(c.regex, value) is not None
+        assert bool(test(value)) == expect, value
+
+
+def test_converter_part_matcher_changed_regex():
+    class EvenConverter(r.IntegerConverter):
+        regex = r"\d*[02468]"
+
+    class LowerConverter(r.UnicodeConverter):
+        def __init__(self, map):
+            super().__init__(map)
+            self.regex = "[a-z]+"
+
+    assert EvenConverter(r.Map()).part_matcher() is None
+    assert r.IntegerConverter(r.Map(), signed=True).part_matcher() is None
+    assert LowerConverter(r.Map()).part_matcher() is None
+    m = r.Map(
+        [r.Rule("/<even:value>", endpoint="even")],
+        converters={"even": EvenConverter},
+        matcher_class=r.StateMachineMatcher,
+    )
+    adapter = m.bind("localhost")
+    assert adapter.match("/42") == ("even", {"value": 42})
+
+    with pytest.raises(r.NotFound):
+        adapter.match("/43")
+
+
+@pytest.mark.parametrize("base", [r.UnicodeConverter, r.AnyConverter])
+def test_converter_part_matcher_without_init(base):
+    class CodeConverter(base):
+        def __init__(self, map):
+            self.map = map
+            self.regex = "[a-z]{2}"
+
+    assert CodeConverter(r.Map()).part_matcher() is None
+    m = r.Map(
+        [r.Rule("/<code:lang>", endpoint="lang")],
+        converters={"code": CodeConverter},
+        matcher_class=r.StateMachineMatcher,
+    )
+    adapter = m.bind("localhost")
+    assert adapter.match("/en") == ("lang", {"lang": "en"})
+
+    with pytest.raises(r.NotFound):
+        adapter.match("/eng")
@@ -97,6 +97,31 @@ def test_url_decoding():
     assert x["Üh"] == "Hänsel"
 
 
+@pytest.mark.parametrize(
+    ("data", "kwargs", "expect"),
+    [
+        (b"a=1&b=x+y&&c&d=", {}, [("a", "1"), ("b", "x y"), ("c", ""), ("d", "")]),
+        (b"a=1&&c&d=", {"include_empty": False}, [("a", "1"), ("d", "")]),
+        (b"a=%26%3D&b=%2B+%zz", {}, [("a", "&="), ("b", "+ %zz")]),
+        (b"a=\xe2\x98\x83&b=\xe2", {}, [("a", "\N{SNOWMAN}"), ("b", "\ufffd")]),
+        (b"a=\xe4&b=%E4", {"charset": "latin1"}, [("a", "\xe4"), ("b", "\xe4")]),
+        (b"a=\xff&b", {"errors": "ignore"}, [("a", ""), ("b", "")]),
+        (b"a=\xff&b", {"errors": "ignore", "include_empty": False}, [("a", "")]),
+        (b"a=x+y;b=1", {"separator": b";"}, [("a", "x y"), ("b", "1")]),
+        (b"a=x+%41", {"charset": None}, [(b"a", b"x A")]),
+    ],
+)
+def test_url_decoding_fast_paths(data, kwargs, expect):
+    assert list(urls.url_decode(data, **kwargs).items(multi=True)) == expect
+
+
+@pytest.mark.parametrize("errors", ["strict", "ignore"])
+def test_url_decoding_skipped_pairs(errors):
+    # pairs without "=" aren't decoded if they are skipped
+    x = urls.url_decode(b"a=1&\xff", include_empty=False, errors=errors)
+    assert list(x.items(multi=True)) == [("a", "1")]
+
+
 def test_url_bytes_decoding():
     x = urls.url_decode(b"foo=42&bar=23&uni=H%C3%A4nsel", charset=None)
     assert x[b"foo"] == b"42"
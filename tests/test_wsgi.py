@@ -195,6 +195,37 @@ def test_limited_stream():
     assert list(stream) == ["123\n", "456\n"]
 
 
+@pytest.mark.parametrize("wrapped", [io.BytesIO, io.BufferedReader])
+def test_limited_stream_readinto(wrapped):
+    class RaisingLimitedStream(wsgi.LimitedStream):
+        def on_exhausted(self):
+            raise BadRequest("input stream exhausted")
+
+    if wrapped is io.BufferedReader:
+        io_ = io.BufferedReader(wsgi.LimitedStream(io.BytesIO(b"123456"), 6))
+    else:
+        io_ = io.BytesIO(b"123456")
+
+    stream = RaisingLimitedStream(io_, 5)
+    buffer = bytearray(2)
+    assert stream.readinto(buffer) == 2
+    assert buffer == b"12"
+    assert stream.readinto(memoryview(buffer)[:1]) == 1
+    assert buffer == b"32"
+    buffer = bytearray(4)
+    assert stream.readinto(buffer) == 2
+    assert buffer[:2] == b"45"
+    assert stream.tell() == 5
+    pytest.raises(BadRequest, stream.readinto, buffer)
+
+    stream = wsgi.LimitedStream(io.BytesIO(b"123"), 3)
+    stream.read()
+    assert stream.readinto(buffer) == 0
+
+    with pytest.raises(ClientDisconnected):
+        wsgi.LimitedStream(io.BytesIO(b"123"), 5).readinto(buffer)
+
+
 def test_limited_stream_json_load():
     stream = wsgi.LimitedStream(io.BytesIO(b'{"hello": "test"}'), 17)
     # flask.json adapts bytes to text with TextIOWrapper